@@ -6,6 +6,8 @@ class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ['username', 'email', 'user_type', 'is_staff', 'is_active']
     list_filter = ['user_type', 'is_staff', 'is_active']
+    # Also what the cashier and created-by autocompletes search
+    search_fields = ['username', 'first_name', 'last_name', 'email']
     fieldsets = UserAdmin.fieldsets + (
         (None, {'fields': ('user_type',)}),
     )
@@ -0,0 +1,103 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .tokens import TOKEN_VERSION_CLAIM
+
+VERSION_KEY = 'auth:user:{}:token-version'
+
+
+def publish_version(user_id, version):
+    """Record a user's current token version in the cache every worker shares."""
+    cache.set(VERSION_KEY.format(user_id), version, None)
+
+
+def forget_version(user_id):
+    cache.delete(VERSION_KEY.format(user_id))
+
+
+class UserCache:
+    """
+    Small per-process cache of authenticated users, keyed by user id and
+    token version.
+
+    Entries live for ``AUTH_USER_CACHE_TTL`` seconds, but an entry is only
+    served while the user's current token version, published to the shared
+    cache whenever a user is saved (see ``accounts.signals``), still matches.
+    A password, activation or role change in any worker therefore takes
+    effect in every worker on its next request. The check relies on the
+    default cache being shared between workers, which is why the TTL is 0
+    (caching off) unless ``CACHE_URL`` configures one.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ttl(self):
+        return getattr(settings, 'AUTH_USER_CACHE_TTL', 0)
+
+    def get(self, user_id, version):
+        entry = self._entries.get(str(user_id))
+        if entry is None:
+            return None
+        cached_version, expires_at, user = entry
+        if cached_version != version or expires_at < time.monotonic():
+            return None
+        if cache.get(VERSION_KEY.format(user_id)) != version:
+            return None
+        return user
+
+    def set(self, user_id, version, user):
+        if self.ttl <= 0:
+            return
+        # Never overwrites a newer version published by a concurrent save
+        cache.add(VERSION_KEY.format(user_id), version, None)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[str(user_id)] = (version, time.monotonic() + self.ttl, user)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that serves the user from ``user_cache`` instead of
+    loading the ``CustomUser`` row on every request.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        version = validated_token.get(TOKEN_VERSION_CLAIM, 0)
+
+        user = user_cache.get(user_id, version)
+        if user is None:
+            user = super().get_user(validated_token)
+            if user.token_version != version:
+                raise AuthenticationFailed(_('Token is no longer valid for this user'), code='token_version_mismatch')
+            user_cache.set(user_id, version, user)
+
+        # Hand each request its own instance so per-request state never leaks
+        return copy.copy(user)
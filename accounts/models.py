@@ -7,9 +7,28 @@ class CustomUser(AbstractUser):
         ('worker', 'Worker'),
     )
     
+    # Changes to any of these make previously issued tokens stale
+    TOKEN_VERSION_FIELDS = ('password', 'is_active', 'user_type')
+    
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES, default='worker')
+    token_version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        tracked = self.TOKEN_VERSION_FIELDS
+        if update_fields is not None:
+            tracked = [field for field in tracked if field in update_fields]
+        
+        if self.pk is not None and tracked:
+            stored = type(self).objects.filter(pk=self.pk).values(*tracked).first()
+            if stored and any(stored[field] != getattr(self, field) for field in tracked):
+                self.token_version += 1
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'token_version'}
+        
+        super().save(*args, **kwargs)
+    
     def __str__(self):
-        return f"{self.username} ({self.user_type})"
\ No newline at end of file
+        return f"{self.username} ({self.user_type})"
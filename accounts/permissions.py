@@ -0,0 +1,21 @@
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+def is_admin(user):
+    return bool(user and user.is_authenticated and (user.user_type == 'admin' or user.is_superuser))
+
+
+class IsAdmin(BasePermission):
+    """Allows access only to users with the admin user type (or superusers)."""
+
+    def has_permission(self, request, view):
+        return is_admin(request.user)
+
+
+class IsAdminOrReadOnly(BasePermission):
+    """Any authenticated user may read; only admins may write."""
+
+    def has_permission(self, request, view):
+        if request.method in SAFE_METHODS:
+            return bool(request.user and request.user.is_authenticated)
+        return is_admin(request.user)
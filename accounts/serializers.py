@@ -1,7 +1,25 @@
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 from .models import CustomUser
+from .tokens import TOKEN_VERSION_CLAIM, VersionedRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'email', 'user_type', 'first_name', 'last_name']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'user_type', 'first_name', 'last_name']
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses refresh tokens issued before the user's last password, activation or role change."""
+    token_class = VersionedRefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        version = CustomUser.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).values_list('token_version', flat=True).first()
+        if version is None or version != refresh.payload.get(TOKEN_VERSION_CLAIM, 0):
+            raise AuthenticationFailed(_('Token is no longer valid for this user'), code='token_version_mismatch')
+        return super().validate(attrs)
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_version, publish_version, user_cache
+from .models import CustomUser
+
+
+@receiver(post_save, sender=CustomUser)
+def publish_saved_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    # Other workers see the new version once the row they would reload has it
+    pk, version = instance.pk, instance.token_version
+    transaction.on_commit(lambda: publish_version(pk, version))
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+    pk = instance.pk
+    transaction.on_commit(lambda: forget_version(pk))
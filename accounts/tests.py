@@ -1,3 +1,111 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.db.models import F
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from inventory_backend.testing import PASSWORD, Endpoint, QueryBudgetMixin
+from .authentication import VERSION_KEY, publish_version, user_cache
+from .models import CustomUser
+from .tokens import VersionedRefreshToken
+
+
+class AuthQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('login', 'login', budget=1, method='POST', authenticated=False,
+                 data={'username': 'budget', 'password': PASSWORD}),
+        Endpoint('me', 'get_current_user', budget=0),
+        Endpoint('token-refresh', 'token_refresh', budget=2, method='POST', authenticated=False,
+                 data=lambda case: {'refresh': str(VersionedRefreshToken.for_user(case.user))}),
+    ]
+
+
+class TokenVersionTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('till', password='till-password')
+
+    def test_password_activation_and_role_changes_bump_the_version(self):
+        for change in (
+            lambda user: user.set_password('new-password'),
+            lambda user: setattr(user, 'is_active', False),
+            lambda user: setattr(user, 'user_type', 'admin'),
+        ):
+            user = CustomUser.objects.get(pk=self.user.pk)
+            before = user.token_version
+            change(user)
+            user.save()
+            self.assertEqual(CustomUser.objects.get(pk=user.pk).token_version, before + 1)
+
+    def test_other_fields_leave_the_version_alone(self):
+        self.user.first_name = 'Till'
+        self.user.save()
+        self.user.is_active = False
+        self.user.save(update_fields=['first_name'])
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).token_version, 0)
+
+    def test_update_fields_still_bump_the_version(self):
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).token_version, 1)
+
+
+@override_settings(AUTH_USER_CACHE_TTL=30)
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user('till', password='till-password')
+        self.refresh = VersionedRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def me(self):
+        return self.client.get(reverse('get_current_user'))
+
+    def test_cached_user_is_served_without_a_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.me().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().status_code, 200)
+
+    def test_role_change_rejects_the_old_token_at_once(self):
+        self.me()
+        self.user.user_type = 'admin'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(cache.get(VERSION_KEY.format(self.user.pk)), 1)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_change_made_by_another_worker_is_seen_through_the_shared_version(self):
+        self.me()
+        # Another worker's save: the row and the shared version move, this
+        # process's cache entry is left behind
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False, token_version=F('token_version') + 1)
+        publish_version(self.user.pk, self.user.token_version + 1)
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_deleted_user_is_not_served_from_the_cache(self):
+        self.me()
+        self.user.delete()
+        self.assertEqual(self.me().status_code, 401)
+
+    def test_fresh_login_works_after_a_change(self):
+        self.user.set_password('new-password')
+        self.user.save()
+        self.client.credentials()
+        response = self.client.post(reverse('login'), {'username': 'till', 'password': 'new-password'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.me().status_code, 200)
+
+    def test_refresh_tokens_from_before_a_change_are_refused(self):
+        refresh = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(refresh.status_code, 200)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        refresh = self.client.post(reverse('token_refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(refresh.status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_cache_can_be_turned_off(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.me()
@@ -0,0 +1,19 @@
+from rest_framework_simplejwt.tokens import RefreshToken
+
+TOKEN_VERSION_CLAIM = 'token_version'
+
+
+class VersionedRefreshToken(RefreshToken):
+    """
+    Refresh token that carries the user's ``token_version``.
+
+    Access tokens minted from it (at login or via the refresh endpoint) copy
+    the claim, which lets authentication tell tokens issued before a password,
+    activation or role change apart from current ones.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
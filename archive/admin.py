@@ -0,0 +1,48 @@
+from django.contrib import admin
+from inventory_backend.admin import LargeTableAdmin
+from .models import ArchiveRun, ArchivedSale, ArchivedSaleItem, ArchivedStockTransaction, StockCheckpoint
+
+class ArchivedSaleItemInline(admin.TabularInline):
+    model = ArchivedSaleItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['product', 'quantity', 'unit_price', 'total_price']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+@admin.register(ArchiveRun)
+class ArchiveRunAdmin(admin.ModelAdmin):
+    list_display = ['cutoff', 'started_at', 'finished_at', 'sales', 'sale_items', 'stock_transactions']
+    readonly_fields = ['cutoff', 'started_at', 'finished_at', 'sales', 'sale_items', 'stock_transactions']
+
+@admin.register(ArchivedSale)
+class ArchivedSaleAdmin(LargeTableAdmin):
+    list_display = ['sale_number', 'final_amount', 'cashier', 'created_at', 'archived_at']
+    list_select_related = ['cashier']
+    date_hierarchy = 'created_at'
+    search_fields = ['sale_number']
+    autocomplete_fields = ['cashier', 'location']
+    inlines = [ArchivedSaleItemInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(sale_number=search_term), False
+
+@admin.register(ArchivedStockTransaction)
+class ArchivedStockTransactionAdmin(LargeTableAdmin):
+    list_display = ['product', 'transaction_type', 'quantity', 'new_stock', 'created_at']
+    list_select_related = ['product']
+    list_filter = ['transaction_type']
+    date_hierarchy = 'created_at'
+    autocomplete_fields = ['product', 'location', 'created_by']
+    search_fields = ['product__name', 'product__sku']
+
+@admin.register(StockCheckpoint)
+class StockCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['product', 'location', 'as_of', 'stock']
+    list_select_related = ['product', 'location']
+    autocomplete_fields = ['product', 'location']
+    search_fields = ['product__name', 'product__sku']
@@ -0,0 +1,154 @@
+"""
+Move old sales and ledger rows out of the hot tables.
+
+``HistoryArchiver`` copies every sale (with its items) and every stock
+transaction created before a cutoff into the archive tables, keeping their
+ids, and deletes them from the hot tables. Rows move in batches, each in its
+own transaction, so a run can be interrupted and resumed and never holds
+locks for long. Alongside the copies it maintains per-product daily rollups
+of the archived ledger. Once every row has moved, it writes a stock
+checkpoint per product and location at the cutoff. The checkpoint is read
+from the newest archived row, so it covers rows archived by earlier or
+interrupted runs. The product report uses checkpoints for the opening stock
+of windows that start after the archive horizon. Refunds stay in the hot tables with their sale number; the
+archived sales keep their status and refunded amount.
+
+The run is recorded in ``ArchiveRun`` before any row moves, which makes the
+cutoff visible to the reports as the archive horizon straight away.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from pos.models import Sale, SaleItem
+from products.models import StockTransaction
+from .models import (
+    ArchiveRun, ArchivedSale, ArchivedSaleItem, ArchivedStockTransaction, ProductDailyRollup,
+    StockCheckpoint,
+)
+
+SALE_FIELDS = (
+    'id', 'sale_number', 'total_amount', 'tax_amount', 'discount_amount', 'final_amount',
+    'cashier_id', 'location_id', 'notes', 'status', 'refunded_amount', 'created_at', 'updated_at',
+)
+SALE_ITEM_FIELDS = (
+    'id', 'sale_id', 'product_id', 'quantity', 'unit_price', 'total_price', 'discount_amount', 'returned_quantity',
+)
+TRANSACTION_FIELDS = (
+    'id', 'product_id', 'location_id', 'transaction_type', 'quantity', 'previous_stock', 'new_stock',
+    'notes', 'unit_price', 'total_amount', 'created_by_id', 'created_at',
+)
+
+
+class HistoryArchiver:
+    def __init__(self, cutoff, batch_size=500, log=None):
+        self.cutoff = cutoff
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.counts = {'sales': 0, 'sale_items': 0, 'stock_transactions': 0}
+
+    def run(self):
+        run = ArchiveRun.objects.create(cutoff=self.cutoff)
+        while self.archive_sales():
+            pass
+        while self.archive_transactions():
+            pass
+        self.write_checkpoints()
+
+        run.finished_at = timezone.now()
+        for name, value in self.counts.items():
+            setattr(run, name, value)
+        run.save()
+        return dict(self.counts)
+
+    def archive_sales(self):
+        with transaction.atomic():
+            sales = list(
+                Sale.objects.filter(created_at__lt=self.cutoff).order_by('id').values(*SALE_FIELDS)[:self.batch_size]
+            )
+            if not sales:
+                return False
+            # Every sale before the cutoff up to the last id is in this batch
+            batch = {'created_at__lt': self.cutoff, 'id__lte': sales[-1]['id']}
+            items = list(
+                SaleItem.objects.filter(**{f'sale__{key}': value for key, value in batch.items()})
+                .values(*SALE_ITEM_FIELDS)
+            )
+            ArchivedSale.objects.bulk_create(ArchivedSale(**row) for row in sales)
+            ArchivedSaleItem.objects.bulk_create(ArchivedSaleItem(**row) for row in items)
+            SaleItem.objects.filter(**{f'sale__{key}': value for key, value in batch.items()}).delete()
+            Sale.objects.filter(**batch).delete()
+
+        self.counts['sales'] += len(sales)
+        self.counts['sale_items'] += len(items)
+        self.log(f'Archived {self.counts["sales"]} sales')
+        return True
+
+    def archive_transactions(self):
+        with transaction.atomic():
+            rows = list(
+                StockTransaction.objects.filter(created_at__lt=self.cutoff).order_by('id')
+                .values(*TRANSACTION_FIELDS)[:self.batch_size]
+            )
+            if not rows:
+                return False
+            ArchivedStockTransaction.objects.bulk_create(ArchivedStockTransaction(**row) for row in rows)
+            self.add_to_rollups(rows)
+            StockTransaction.objects.filter(created_at__lt=self.cutoff, id__lte=rows[-1]['id']).delete()
+
+        self.counts['stock_transactions'] += len(rows)
+        self.log(f'Archived {self.counts["stock_transactions"]} stock transactions')
+        return True
+
+    def add_to_rollups(self, rows):
+        totals = defaultdict(lambda: defaultdict(int))
+        for row in rows:
+            key = (row['product_id'], timezone.localdate(row['created_at']))
+            totals[key][ProductDailyRollup.TYPE_FIELDS[row['transaction_type']]] += row['quantity']
+            totals[key]['transaction_count'] += 1
+
+        days = [day for _, day in totals]
+        existing = {
+            (rollup.product_id, rollup.day): rollup
+            for rollup in ProductDailyRollup.objects.select_for_update().filter(
+                product_id__in={product_id for product_id, _ in totals},
+                day__gte=min(days), day__lte=max(days),
+            )
+        }
+        created, updated = [], []
+        for (product_id, day), amounts in totals.items():
+            rollup = existing.get((product_id, day))
+            if rollup is None:
+                created.append(ProductDailyRollup(product_id=product_id, day=day, **amounts))
+                continue
+            for field, amount in amounts.items():
+                setattr(rollup, field, getattr(rollup, field) + amount)
+            updated.append(rollup)
+        ProductDailyRollup.objects.bulk_create(created)
+        ProductDailyRollup.objects.bulk_update(
+            updated, [*ProductDailyRollup.TYPE_FIELDS.values(), 'transaction_count'],
+        )
+
+    def write_checkpoints(self):
+        archived = ArchivedStockTransaction.objects.filter(created_at__lt=self.cutoff, location__isnull=False)
+        newest = archived.filter(product=OuterRef('product_id'), location=OuterRef('location_id')).order_by(
+            '-created_at', '-id',
+        ).values('new_stock')[:1]
+        levels = archived.order_by().values('product_id', 'location_id').distinct().annotate(stock=Subquery(newest))
+        batch = []
+        for level in levels.iterator(chunk_size=self.batch_size):
+            batch.append(StockCheckpoint(as_of=self.cutoff, **level))
+            if len(batch) == self.batch_size:
+                self.save_checkpoints(batch)
+                batch = []
+        self.save_checkpoints(batch)
+
+    def save_checkpoints(self, checkpoints):
+        StockCheckpoint.objects.bulk_create(
+            checkpoints,
+            update_conflicts=True,
+            unique_fields=['product', 'location', 'as_of'],
+            update_fields=['stock'],
+        )
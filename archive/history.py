@@ -0,0 +1,44 @@
+"""
+Read helpers for reports that span the hot tables and the archive.
+
+Every archived row is older than the archive horizon, the newest
+``ArchiveRun`` cutoff. A report whose date window starts before the horizon
+(or has no start) reads the archive as well as the hot tables; a window that
+starts after it never touches the archive.
+"""
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from .models import ArchiveRun, ProductDailyRollup
+
+
+def archive_horizon():
+    """The newest archive cutoff, or ``None`` when nothing was archived."""
+    return ArchiveRun.objects.aggregate(horizon=Max('cutoff'))['horizon']
+
+
+def reaches_archive(start, horizon):
+    return horizon is not None and (start is None or start < horizon)
+
+
+def filter_rollups(queryset, start, end):
+    """Restrict rollups to a ``date_window()``; its bounds fall on local midnights."""
+    if start is not None:
+        queryset = queryset.filter(day__gte=timezone.localdate(start))
+    if end is not None:
+        queryset = queryset.filter(day__lt=timezone.localdate(end))
+    return queryset
+
+
+def rollup_totals(start, end, **filters):
+    """Archived purchases, sales, returns and transaction counts in the window, per product."""
+    rollups = filter_rollups(ProductDailyRollup.objects.filter(**filters), start, end)
+    return {
+        row['product_id']: row
+        for row in rollups.values('product_id').annotate(
+            total_purchased=Sum('purchased', default=0),
+            total_sold=Sum('sold', default=0),
+            total_returned=Sum('returned', default=0),
+            transaction_count=Sum('transaction_count', default=0),
+        )
+    }
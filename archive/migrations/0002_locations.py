@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_default_location(apps, schema_editor):
+    Location = apps.get_model('products', 'Location')
+    location = Location.objects.filter(code=settings.DEFAULT_LOCATION_CODE).first()
+    if location is None:
+        return
+    for name in ('ArchivedSale', 'ArchivedStockTransaction', 'StockCheckpoint'):
+        apps.get_model('archive', name).objects.filter(location__isnull=True).update(location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0001_initial'),
+        ('products', '0004_locations'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='stockcheckpoint',
+            name='checkpoint_product_asof_uniq',
+        ),
+        migrations.AddField(
+            model_name='archivedsale',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='products.location'),
+        ),
+        migrations.AddField(
+            model_name='archivedstocktransaction',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='products.location'),
+        ),
+        migrations.AddField(
+            model_name='productdailyrollup',
+            name='transferred_in',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productdailyrollup',
+            name='transferred_out',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='stockcheckpoint',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='products.location'),
+        ),
+        migrations.AlterField(
+            model_name='archivedstocktransaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale'), ('adjustment', 'Adjustment'), ('return', 'Return'), ('transfer_out', 'Transfer out'), ('transfer_in', 'Transfer in')], max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('product', 'location', 'as_of'), name='checkpoint_product_loc_asof_uniq'),
+        ),
+        migrations.RunPython(set_default_location, migrations.RunPython.noop),
+    ]
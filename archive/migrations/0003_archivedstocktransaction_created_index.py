@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0002_locations'),
+        ('products', '0005_stocktransaction_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedstocktransaction',
+            index=models.Index(fields=['created_at'], name='archtx_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0003_archivedstocktransaction_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsale',
+            name='refunded_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='archivedsale',
+            name='status',
+            field=models.CharField(default='completed', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='archivedsaleitem',
+            name='returned_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
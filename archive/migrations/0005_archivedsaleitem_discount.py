@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archive', '0004_returns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsaleitem',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,118 @@
+from django.db import models
+from products.models import Location, Product, StockTransaction
+from accounts.models import CustomUser
+
+class ArchiveRun(models.Model):
+    """One run of ``archive_history``; the newest cutoff is the archive horizon."""
+    cutoff = models.DateTimeField()
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    sales = models.PositiveIntegerField(default=0)
+    sale_items = models.PositiveIntegerField(default=0)
+    stock_transactions = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"Archive before {self.cutoff:%Y-%m-%d}"
+
+class ArchivedSale(models.Model):
+    # Ids are carried over from pos.Sale
+    id = models.BigIntegerField(primary_key=True)
+    sale_number = models.CharField(max_length=50, unique=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    final_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    cashier = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='+')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='+')
+    notes = models.TextField(blank=True)
+    status = models.CharField(max_length=20, default='completed')
+    refunded_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='archsale_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Sale #{self.sale_number} (archived)"
+
+class ArchivedSaleItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sale = models.ForeignKey(ArchivedSale, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    returned_quantity = models.PositiveIntegerField(default=0)
+
+class ArchivedStockTransaction(models.Model):
+    # Ids are carried over from products.StockTransaction
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='archived_transactions')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='+')
+    transaction_type = models.CharField(max_length=20, choices=StockTransaction.TRANSACTION_TYPES)
+    quantity = models.IntegerField()
+    previous_stock = models.IntegerField()
+    new_stock = models.IntegerField()
+    notes = models.TextField(blank=True)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='archtx_product_created_idx'),
+            models.Index(fields=['transaction_type', 'created_at'], name='archtx_type_created_idx'),
+            models.Index(fields=['created_at'], name='archtx_created_idx'),
+        ]
+
+class ProductDailyRollup(models.Model):
+    """Archived stock movement per product and local day, by transaction type."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    purchased = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    adjusted = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    transferred_out = models.IntegerField(default=0)
+    transferred_in = models.IntegerField(default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    
+    # transaction_type -> rollup field
+    TYPE_FIELDS = {
+        'purchase': 'purchased',
+        'sale': 'sold',
+        'adjustment': 'adjusted',
+        'return': 'returned',
+        'transfer_out': 'transferred_out',
+        'transfer_in': 'transferred_in',
+    }
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='rollup_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='rollup_day_idx'),
+        ]
+
+class StockCheckpoint(models.Model):
+    """A product's stock level at a location as of an archive cutoff."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_checkpoints')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='+')
+    as_of = models.DateTimeField()
+    stock = models.IntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location', 'as_of'], name='checkpoint_product_loc_asof_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product} @ {self.location} - {self.stock} as of {self.as_of:%Y-%m-%d}"
@@ -0,0 +1,153 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from inventory_backend.dates import day_start
+from pos.models import Sale, SaleItem
+from pos.returns import reverse_sale
+from pos.seeding import DataSeeder
+from products.models import Product, StockTransaction
+from .archiver import HistoryArchiver
+from .models import (
+    ArchiveRun, ArchivedSale, ArchivedSaleItem, ArchivedStockTransaction, ProductDailyRollup,
+    StockCheckpoint,
+)
+
+
+class HistoryArchiverTests(APITestCase):
+    def setUp(self):
+        DataSeeder(categories=2, products=6, sales=60, years=10 / 365, max_items=3, cashiers=2, seed=7,
+                   prefix='ARC').run()
+        self.client.force_authenticate(CustomUser.objects.create_user('clerk'))
+        self.cutoff = day_start(timezone.localdate() - timedelta(days=4))
+        self.product = Product.objects.order_by('id').first()
+
+    def archive(self, batch_size=7):
+        return HistoryArchiver(self.cutoff, batch_size=batch_size).run()
+
+    def ledger(self, **query):
+        """Every page of the product report, following the cursor."""
+        url = reverse('single_product_report', kwargs={'product_id': self.product.id})
+        response = self.client.get(url, {'page_size': 5, **query})
+        summary, rows = response.data['summary'], list(response.data['transactions'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            rows.extend(response.data['transactions'])
+        return summary, rows
+
+    def reports(self):
+        window = {
+            'start_date': (timezone.localdate() - timedelta(days=6)).isoformat(),
+            'end_date': timezone.localdate().isoformat(),
+        }
+        return {
+            'all': self.client.get(reverse('product_reports')).data,
+            'all-window': self.client.get(reverse('product_reports'), window).data,
+            'ledger': self.ledger(),
+            'ledger-window': self.ledger(**window),
+            'ledger-recent': self.ledger(start_date=timezone.localdate().isoformat()),
+        }
+
+    def test_reports_are_unchanged_by_archiving(self):
+        before = self.reports()
+        counts = self.archive()
+        self.assertGreater(counts['stock_transactions'], 0)
+        self.assertEqual(self.reports(), before)
+
+    def test_refunds_outlive_their_archived_sale(self):
+        sale = Sale.objects.filter(created_at__lt=self.cutoff).order_by('id').first()
+        refund = reverse_sale(sale.id, kind='void')
+        self.archive()
+
+        archived = ArchivedSale.objects.get(id=sale.id)
+        self.assertEqual((archived.status, archived.refunded_amount), ('voided', sale.final_amount))
+        self.assertEqual(
+            [item.returned_quantity for item in archived.items.order_by('id')],
+            [item.quantity for item in archived.items.order_by('id')],
+        )
+        refund.refresh_from_db()
+        self.assertIsNone(refund.sale_id)
+        self.assertEqual(refund.sale_number, sale.sale_number)
+        self.assertFalse(refund.items.filter(sale_item__isnull=False).exists())
+
+    def test_rows_move_with_their_ids(self):
+        sale_ids = set(Sale.objects.filter(created_at__lt=self.cutoff).values_list('id', flat=True))
+        item_count = SaleItem.objects.filter(sale__created_at__lt=self.cutoff).count()
+        transaction_ids = set(
+            StockTransaction.objects.filter(created_at__lt=self.cutoff).values_list('id', flat=True)
+        )
+        counts = self.archive()
+
+        self.assertEqual(counts, {
+            'sales': len(sale_ids), 'sale_items': item_count, 'stock_transactions': len(transaction_ids),
+        })
+        self.assertFalse(Sale.objects.filter(created_at__lt=self.cutoff).exists())
+        self.assertFalse(StockTransaction.objects.filter(created_at__lt=self.cutoff).exists())
+        self.assertEqual(set(ArchivedSale.objects.values_list('id', flat=True)), sale_ids)
+        self.assertEqual(ArchivedSaleItem.objects.count(), item_count)
+        self.assertEqual(set(ArchivedStockTransaction.objects.values_list('id', flat=True)), transaction_ids)
+        run = ArchiveRun.objects.get()
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.stock_transactions, len(transaction_ids))
+
+    def test_rollups_and_checkpoints_match_the_archived_ledger(self):
+        self.archive()
+        archived = ArchivedStockTransaction.objects.filter(product=self.product)
+        rollups = ProductDailyRollup.objects.filter(product=self.product).aggregate(
+            sold=Sum('sold'), purchased=Sum('purchased'), count=Sum('transaction_count'),
+        )
+        self.assertEqual(rollups, {
+            'sold': archived.filter(transaction_type='sale').aggregate(total=Sum('quantity'))['total'],
+            'purchased': archived.filter(transaction_type='purchase').aggregate(total=Sum('quantity'))['total'],
+            'count': archived.count(),
+        })
+        last = archived.order_by('-created_at', '-id').first()
+        checkpoint = StockCheckpoint.objects.get(product=self.product)
+        self.assertEqual((checkpoint.as_of, checkpoint.stock), (self.cutoff, last.new_stock))
+
+    def test_a_resumed_run_checkpoints_every_archived_product(self):
+        # The first run stops one row short of the cutoff
+        remaining = StockTransaction.objects.filter(created_at__lt=self.cutoff).count()
+        HistoryArchiver(self.cutoff, batch_size=remaining - 1).archive_transactions()
+        self.archive()
+
+        archived = ArchivedStockTransaction.objects.all()
+        expected = {}
+        for row in archived.order_by('created_at', 'id'):
+            expected[(row.product_id, row.location_id)] = row.new_stock
+        self.assertEqual(
+            {(checkpoint.product_id, checkpoint.location_id): checkpoint.stock
+             for checkpoint in StockCheckpoint.objects.filter(as_of=self.cutoff)},
+            expected,
+        )
+
+    def test_a_second_run_with_the_same_cutoff_moves_nothing(self):
+        self.archive()
+        self.assertEqual(self.archive(), {'sales': 0, 'sale_items': 0, 'stock_transactions': 0})
+        self.assertEqual(ArchiveRun.objects.count(), 2)
+
+    def test_windows_after_the_horizon_do_not_read_the_archive(self):
+        self.archive()
+        url = reverse('single_product_report', kwargs={'product_id': self.product.id})
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url, {'start_date': timezone.localdate().isoformat()})
+        self.assertEqual(len(captured), 5)
+        self.assertFalse([query for query in captured if 'archive_archivedstocktransaction' in query['sql']])
+        self.assertGreater(response.data['summary']['opening_stock'], 0)
+        with self.assertNumQueries(6):
+            self.client.get(url)
+
+    def test_command_archives_before_a_day(self):
+        out = StringIO()
+        call_command('archive_history', older_than_days=4, batch_size=10, stdout=out)
+        self.assertIn('Archived', out.getvalue())
+        self.assertEqual(ArchiveRun.objects.get().cutoff, self.cutoff)
+        self.assertFalse(StockTransaction.objects.filter(created_at__lt=self.cutoff).exists())
@@ -0,0 +1,10 @@
+"""
+Performance benchmarks for the inventory backend.
+
+Each module is runnable on its own, e.g.::
+
+    python -m benchmarks.query_plans --sales 100000 --check
+
+Benchmarks run against a throwaway test database created from the project's
+migrations, so they never touch ``db.sqlite3``.
+"""
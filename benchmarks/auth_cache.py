@@ -0,0 +1,81 @@
+"""
+Compare per-request cost of plain and cached JWT user resolution.
+
+Authenticates the same bearer token repeatedly with simplejwt's
+``JWTAuthentication`` and with ``CachedJWTAuthentication``, recording the
+database queries issued per request and the latency of each, and then does
+the same end to end through ``/api/auth/me/``. The cache is switched on for
+the run; each hit checks the user's token version in the default cache, so
+set ``CACHE_URL`` to measure against the shared cache a deployment uses.
+
+    python -m benchmarks.auth_cache --requests 2000
+"""
+import sys
+
+from benchmarks.harness import QueryRecorder, base_parser, measure, setup_django, test_database, write_results
+
+
+def queries_per_call(connection, func, calls):
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        for _ in range(calls):
+            func()
+    return len(recorder.queries) / calls
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help='Authentications per timed run.')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+    from django.test import RequestFactory, override_settings
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from accounts.authentication import CachedJWTAuthentication, user_cache
+    from accounts.models import CustomUser
+    from accounts.tokens import VersionedRefreshToken
+
+    with test_database(), override_settings(AUTH_USER_CACHE_TTL=30):
+        user = CustomUser.objects.create_user('bench', password='bench', user_type='worker')
+        access = str(VersionedRefreshToken.for_user(user).access_token)
+        request = RequestFactory().get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        results = {}
+        for name, authenticator in (('jwt', JWTAuthentication()), ('cached_jwt', CachedJWTAuthentication())):
+            user_cache.clear()
+
+            def authenticate():
+                for _ in range(args.requests):
+                    authenticator.authenticate(request)
+
+            timing = measure(authenticate, repeat=args.repeat)
+            results[name] = {
+                'queries_per_request': queries_per_call(connection, lambda: authenticator.authenticate(request), 100),
+                'us_per_request': round(timing['median_ms'] * 1000 / args.requests, 2),
+                'timing': timing,
+            }
+
+        def me():
+            for _ in range(args.requests // 10 or 1):
+                client.get('/api/auth/me/')
+
+        user_cache.clear()
+        timing = measure(me, repeat=args.repeat)
+        results['me_endpoint'] = {
+            'queries_per_request': queries_per_call(connection, lambda: client.get('/api/auth/me/'), 20),
+            'us_per_request': round(timing['median_ms'] * 1000 / (args.requests // 10 or 1), 2),
+            'timing': timing,
+        }
+
+        saved = results['jwt']['us_per_request'] - results['cached_jwt']['us_per_request']
+        results['saved_us_per_request'] = round(saved, 2)
+        write_results('auth_cache', results, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
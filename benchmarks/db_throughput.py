@@ -0,0 +1,160 @@
+"""
+Compare checkout throughput across database profiles.
+
+Each profile runs in its own process with the ``DB_*`` environment that
+selects it (see ``inventory_backend/database.py``). Writer threads record
+sale stock transactions while reader threads list products, with connections
+recycled between operations the way request boundaries recycle them. The
+run records operations per second, write latency and "database is locked"
+failures for each profile.
+
+    python -m benchmarks.db_throughput --threads 8 --duration 10
+    DB_NAME=inventory DB_USER=... python -m benchmarks.db_throughput --postgresql
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import base_parser, setup_django, test_database, write_results
+
+PROFILES = {
+    'sqlite_default': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': '0', 'DB_CONN_MAX_AGE': '0'},
+    'sqlite_tuned': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': '1', 'DB_CONN_MAX_AGE': '600'},
+    'postgresql_pooled': {'DB_ENGINE': 'postgresql', 'DB_POOL': '1'},
+    'postgresql_unpooled': {'DB_ENGINE': 'postgresql', 'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'},
+}
+
+
+def run_load(threads, readers, duration, products):
+    from django.db import OperationalError, close_old_connections, connection, transaction
+    from django.db.models import F
+    from accounts.models import CustomUser
+    from products.models import Product, StockTransaction
+
+    user = CustomUser.objects.create_user('bench', password='bench')
+    Product.objects.bulk_create(
+        Product(name=f'Product {i}', sku=f'TP-{i:05d}', current_stock=10 ** 9, price=1, cost_price=1)
+        for i in range(products)
+    )
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    connection.close()
+
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+    stats = {'writes': 0, 'reads': 0, 'errors': 0, 'write_ms': []}
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    StockTransaction.objects.create(
+                        product_id=rng.choice(product_ids), transaction_type='sale',
+                        quantity=1, created_by=user,
+                    )
+            except OperationalError:
+                with lock:
+                    stats['errors'] += 1
+                continue
+            with lock:
+                stats['writes'] += 1
+                stats['write_ms'].append((time.perf_counter() - started) * 1000)
+        connection.close()
+
+    def reader(seed):
+        while time.perf_counter() < deadline:
+            close_old_connections()
+            try:
+                list(Product.objects.filter(current_stock__gt=F('low_stock_threshold'))[:20])
+            except OperationalError:
+                with lock:
+                    stats['errors'] += 1
+                continue
+            with lock:
+                stats['reads'] += 1
+        connection.close()
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    workers += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    write_ms = sorted(stats.pop('write_ms')) or [0]
+    return {
+        **stats,
+        'writes_per_s': round(stats['writes'] / duration, 1),
+        'reads_per_s': round(stats['reads'] / duration, 1),
+        'write_p50_ms': round(statistics.median(write_ms), 3),
+        'write_p95_ms': round(write_ms[int(len(write_ms) * 0.95) - 1 if len(write_ms) > 1 else 0], 3),
+    }
+
+
+def worker_main(args):
+    """Run one profile in this process; the parent set its environment."""
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+
+    if connection.vendor == 'sqlite':
+        call_command('migrate', verbosity=0)
+        result = run_load(args.threads, args.readers, args.duration, args.products)
+    else:
+        with test_database():
+            result = run_load(args.threads, args.readers, args.duration, args.products)
+    print(json.dumps(result))
+    return 0
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent writer threads.')
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per profile.')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--postgresql', action='store_true',
+                        help='Also run the PostgreSQL profiles using the DB_* connection settings from the environment.')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return worker_main(args)
+
+    names = ['sqlite_default', 'sqlite_tuned']
+    if args.postgresql:
+        names += ['postgresql_pooled', 'postgresql_unpooled']
+
+    results = {}
+    passthrough = ['--threads', str(args.threads), '--readers', str(args.readers),
+                   '--duration', str(args.duration), '--products', str(args.products)]
+    for name in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            child_env = {**os.environ, **PROFILES[name]}
+            if child_env['DB_ENGINE'] == 'sqlite':
+                child_env['DB_NAME'] = os.path.join(tmp, 'throughput.sqlite3')
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.db_throughput', '--worker', *passthrough],
+                env=child_env, capture_output=True, text=True,
+            )
+        if completed.returncode != 0:
+            results[name] = {'failed': completed.stderr.strip().splitlines()[-1:]}
+            continue
+        results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    setup_django()
+    write_results('db_throughput', results, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
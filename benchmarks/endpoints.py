@@ -0,0 +1,295 @@
+"""
+Drive every API endpoint against seeded data and record a comparable baseline.
+
+For each endpoint the run records latency percentiles, database queries per
+request, peak Python memory allocated while serving one request, response
+size and status. Named API routes that no case covers are listed in the
+output, so new endpoints do not silently escape the suite.
+
+    python -m benchmarks.endpoints --sales 20000 --output baseline.json
+    python -m benchmarks.endpoints --sales 20000 --compare baseline.json
+"""
+import itertools
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.harness import QueryRecorder, base_parser, setup_django, test_database, write_results
+from benchmarks.pricing import seed_rules
+
+PASSWORD = 'bench-password'
+
+
+class Case:
+    """
+    One endpoint to drive. ``kwargs`` may be a callable returning fresh URL
+    kwargs for every request, for one-shot actions such as voiding a sale;
+    it runs outside the timed and recorded part.
+    """
+
+    def __init__(self, name, route, method='GET', kwargs=None, query=None, data=None, authenticated=True):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.query = query or {}
+        self.data = data
+        self.authenticated = authenticated
+
+
+def build_cases(ids, refresh_token):
+    window = {'start_date': ids['window_start'], 'end_date': ids['window_end']}
+    product = {'pk': ids['product']}
+    return [
+        Case('auth-login', 'login', 'POST', data={'username': 'bench', 'password': PASSWORD}, authenticated=False),
+        Case('auth-me', 'get_current_user'),
+        Case('auth-token-refresh', 'token_refresh', 'POST', data={'refresh': refresh_token}, authenticated=False),
+        Case('category-list', 'category-list'),
+        Case('category-detail', 'category-detail', kwargs={'pk': ids['category']}),
+        Case('product-list', 'product-list'),
+        Case('product-list-low-stock', 'product-list', query={'low_stock': 'true'}),
+        Case('product-detail', 'product-detail', kwargs=product),
+        Case('product-restock', 'product-restock', 'POST',
+             data={'product_id': ids['product'], 'quantity': 5, 'unit_price': '1.00'}),
+        Case('stocktransaction-list', 'stocktransaction-list'),
+        Case('stocktransaction-list-product', 'stocktransaction-list', query={'product': ids['product']}),
+        Case('stocktransaction-detail', 'stocktransaction-detail', kwargs={'pk': ids['transaction']}),
+        Case('location-list', 'location-list'),
+        Case('location-detail', 'location-detail', kwargs={'pk': ids['location']}),
+        Case('stocktransfer-list', 'stocktransfer-list'),
+        Case('stocktransfer-detail', 'stocktransfer-detail', kwargs={'pk': ids['transfer']}),
+        Case('stocktransfer-create', 'stocktransfer-list', 'POST', data={
+            'product': ids['product'], 'from_location': ids['location'], 'to_location': ids['warehouse'],
+            'quantity': 1,
+        }),
+        Case('sale-list', 'sale-list'),
+        Case('sale-list-window', 'sale-list', query=window),
+        Case('sale-detail', 'sale-detail', kwargs={'pk': ids['sale']}),
+        Case('sale-create', 'sale-create-sale', 'POST',
+             data={'items': [{'product_id': ids['product'], 'quantity': 1}]}),
+        Case('sale-receipt', 'sale-receipt', kwargs={'pk': ids['sale']}, query={'format': 'txt'}),
+        Case('sale-receipt-pdf', 'sale-receipt', kwargs={'pk': ids['sale']}, query={'format': 'pdf'}),
+        Case('sale-return', 'sale-return', 'POST', kwargs=ids['fresh_sale'], data={'reason': 'Benchmark'}),
+        Case('sale-void', 'sale-void', 'POST', kwargs=ids['fresh_sale'], data={'reason': 'Benchmark'}),
+        Case('reservation-create', 'reservation-list', 'POST', data={
+            'cart': 'bench-till', 'items': [{'product_id': product_id, 'quantity': 1} for product_id in ids['basket']],
+        }),
+        Case('reservation-detail', 'reservation-detail', kwargs={'cart': 'bench-till'}),
+        Case('reservation-release', 'reservation-detail', 'DELETE', kwargs={'cart': 'bench-till'}),
+        Case('promotion-list', 'promotion-list'),
+        Case('promotion-detail', 'promotion-detail', kwargs={'pk': ids['promotion']}),
+        Case('promotion-quote', 'promotion-quote', 'POST',
+             data={'items': [{'product_id': product_id, 'quantity': 3} for product_id in ids['basket']]}),
+        Case('report-products', 'product_reports'),
+        Case('report-products-window', 'product_reports', query=window),
+        Case('report-single-product', 'single_product_report', kwargs={'product_id': ids['product']}),
+        Case('report-single-product-window', 'single_product_report',
+             kwargs={'product_id': ids['product']}, query=window),
+        Case('download-product', 'download_report', kwargs={'report_type': 'product'},
+             query={'product_id': ids['product']}),
+        Case('download-all-products', 'download_report', kwargs={'report_type': 'product'}),
+        Case('download-sales-window', 'download_report', kwargs={'report_type': 'sales'}, query=window),
+        Case('download-inventory', 'download_report', kwargs={'report_type': 'inventory'}),
+        Case('batch-startup', 'batch', 'POST', data={'requests': [
+            {'url': '/api/auth/me/'}, {'url': '/api/categories/'}, {'url': '/api/products/'},
+            {'url': '/api/products/?low_stock=true'}, {'url': '/api/sales/'},
+        ]}),
+        Case('changefeed-poll', 'changefeed_poll', query={'after': 0, 'timeout': 0}),
+        Case('changefeed-stream', 'changefeed_stream', query={'after': 0}),
+        Case('profile-list', 'profile_list'),
+        Case('profile-detail', 'profile_detail', kwargs={'profile_id': ids['profile']}),
+        Case('profile-download', 'profile_download', kwargs={'profile_id': ids['profile']}),
+    ]
+
+
+def request_once(client, case, url):
+    if case.method == 'GET':
+        response = client.get(url, case.query)
+    else:
+        response = client.generic(case.method, url, json.dumps(case.data), content_type='application/json')
+    if response.streaming:
+        from inventory_backend.testing import read_stream
+
+        size = len(read_stream(response))
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def case_url(case):
+    from django.urls import reverse
+
+    return reverse(case.route, kwargs=case.kwargs() if callable(case.kwargs) else case.kwargs)
+
+
+def run_case(client, case, repeat):
+    from django.db import connections
+
+    request_once(client, case, case_url(case))  # warm caches and lazy imports
+
+    url = case_url(case)
+    recorder = QueryRecorder()
+    wrappers = [connections[alias].execute_wrapper(recorder) for alias in connections]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        status, size = request_once(client, case, url)
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+    url = case_url(case)
+    tracemalloc.start()
+    request_once(client, case, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        url = case_url(case)
+        started = time.perf_counter()
+        request_once(client, case, url)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    return {
+        'route': case.route,
+        'method': case.method,
+        'status': status,
+        'queries': len(recorder.queries),
+        'response_bytes': size,
+        'peak_memory_kib': round(peak / 1024, 1),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(0, int(len(timings) * 0.95) - 1)], 3),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)['results']['endpoints']
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f'{name}: queries {previous["queries"]} -> {current["queries"]}')
+        if previous['p50_ms'] and current['p50_ms'] > previous['p50_ms'] * tolerance:
+            regressions.append(f'{name}: p50 {previous["p50_ms"]}ms -> {current["p50_ms"]}ms')
+    return regressions
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--sales', type=int, default=5000)
+    parser.add_argument('--years', type=float, default=1)
+    parser.add_argument('--rules', type=int, default=1000, help='Promotions to seed (default: 1000).')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', nargs='*', help='Run only the named cases.')
+    parser.add_argument('--compare', help='Baseline JSON to compare against; exits 1 on regressions.')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='Allowed p50 slowdown factor against the baseline (default: 1.5).')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    # Over-budget requests are what this suite reports on; skip the log noise
+    logging.getLogger('inventory_backend.metrics').setLevel(logging.ERROR)
+    from datetime import timedelta
+    from django.test import override_settings
+    from django.urls import get_resolver, reverse
+    from inventory_backend.testing import UNBUDGETED_ROUTES, named_routes
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from accounts.models import CustomUser
+    from accounts.tokens import VersionedRefreshToken
+    from pos.models import Sale, SaleItem
+    from pos.seeding import DataSeeder
+    from products.models import Category, Location, Product, StockTransaction
+    from products.stock import default_location, record_movements, transfer_stock
+    from promotions.models import Promotion
+
+    # Change feed streams end after one read instead of staying open
+    feed = override_settings(CHANGEFEED_STREAM_SECONDS=0)
+    with test_database(), tempfile.TemporaryDirectory() as profiles, override_settings(PROFILER_DIR=profiles), feed:
+        DataSeeder(products=args.products, sales=args.sales, years=args.years, seed=args.seed, prefix='BENCH').run()
+        seed_rules(args.rules, random.Random(args.seed))
+        user = CustomUser.objects.create_user('bench', password=PASSWORD, user_type='admin')
+        refresh = VersionedRefreshToken.for_user(user)
+        today = timezone.localdate()
+        location = default_location()
+        warehouse = Location.objects.create(name='Bench warehouse', code='BENCH-WH', kind='warehouse')
+        product = Product.objects.order_by('id').first()
+        basket = list(Product.objects.order_by('id')[:5])
+        record_movements(location, [(item, 'purchase', 10000, None, 'Benchmark stock') for item in basket])
+        sale_numbers = itertools.count(1)
+
+        def fresh_sale():
+            """A new five-line sale for the one-shot return and void cases."""
+            sale = Sale.objects.create(
+                sale_number=f'BENCH-RETURN-{next(sale_numbers)}', total_amount=sum(item.price for item in basket),
+                final_amount=sum(item.price for item in basket), cashier=user, location=location,
+            )
+            SaleItem.objects.bulk_create(
+                SaleItem(sale=sale, product=item, quantity=1, unit_price=item.price, total_price=item.price)
+                for item in basket
+            )
+            record_movements(location, [(item, 'sale', 1, item.price, 'Benchmark sale') for item in basket], user)
+            return {'pk': sale.id}
+
+        ids = {
+            'location': location.id,
+            'warehouse': warehouse.id,
+            'transfer': transfer_stock(product, location, warehouse, 1).id,
+            'category': Category.objects.order_by('id').values_list('id', flat=True).first(),
+            'product': Product.objects.order_by('id').values_list('id', flat=True).first(),
+            'transaction': StockTransaction.objects.order_by('-id').values_list('id', flat=True).first(),
+            'sale': Sale.objects.order_by('-id').values_list('id', flat=True).first(),
+            'window_start': (today - timedelta(days=6)).isoformat(),
+            'window_end': today.isoformat(),
+            'fresh_sale': fresh_sale,
+            'basket': [item.id for item in basket],
+            'promotion': Promotion.objects.order_by('id').values_list('id', flat=True).first(),
+        }
+
+        authenticated = APIClient()
+        authenticated.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+        anonymous = APIClient()
+        ids['profile'] = authenticated.get(reverse('product-list'), HTTP_X_PROFILE='cprofile')['X-Profile-Id']
+
+        cases = build_cases(ids, str(refresh))
+        if args.only:
+            cases = [case for case in cases if case.name in args.only]
+        endpoints = {
+            case.name: run_case(authenticated if case.authenticated else anonymous, case, args.repeat)
+            for case in cases
+        }
+
+        covered = {case.route for case in build_cases(ids, str(refresh))}
+        uncovered = sorted(named_routes(get_resolver().url_patterns) - covered - UNBUDGETED_ROUTES)
+        results = {
+            'dataset': {
+                'products': args.products, 'sales': args.sales, 'years': args.years, 'rules': args.rules,
+                'seed': args.seed,
+            },
+            'endpoints': endpoints,
+            'uncovered_routes': uncovered,
+        }
+        write_results('endpoints', results, args.output)
+
+    if args.compare:
+        regressions = compare(endpoints, args.compare, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone as dt_timezone
+
+
+def setup_django():
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_backend.settings')
+    import django
+    django.setup()
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--output', help='Write results as JSON to this path instead of stdout.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (default: 5).')
+    return parser
+
+
+@contextlib.contextmanager
+def test_database():
+    """Create throwaway databases from migrations for the duration of the block."""
+    from django.test.utils import (
+        setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+    )
+
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook that keeps the raw SQL and params of each query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(connection, sql, params):
+    """Return the database's query plan for ``sql`` as text."""
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+
+def measure(func, repeat=5, warmup=1):
+    """Run ``func`` ``warmup + repeat`` times and summarise the timed runs in ms."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def write_results(name, results, output=None):
+    from django.db import connection
+
+    payload = {
+        'benchmark': name,
+        'recorded_at': datetime.now(dt_timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'results': results,
+    }
+    text = json.dumps(payload, indent=2, default=str)
+    if output:
+        with open(output, 'w') as fh:
+            fh.write(text + '\n')
+    else:
+        print(text)
+    return payload
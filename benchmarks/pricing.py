@@ -0,0 +1,101 @@
+"""
+Time the promotions engine on large carts against many rules.
+
+Seeds ``--rules`` promotions spread over products, categories and the whole
+store, some of them time-windowed, then times compiling them and pricing a
+``--lines`` cart with the compiled rules. Exits 1 when the median cart takes
+longer than ``--max-ms``.
+
+    python -m benchmarks.pricing --rules 5000 --lines 100 --max-ms 1
+"""
+import random
+import sys
+from datetime import time as dt_time, timedelta
+
+from benchmarks.harness import base_parser, measure, setup_django, test_database, write_results
+
+
+def seed_rules(count, rng):
+    from django.utils import timezone
+    from products.models import Category, Product
+    from promotions.models import Promotion
+
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    now = timezone.now()
+    promotions = []
+    for index in range(count):
+        kind = rng.choice(('percentage', 'fixed', 'buy_x_get_y'))
+        windowed = index % 4 == 0
+        promotions.append(Promotion(
+            name=f'Rule {index}', kind=kind,
+            value=rng.choice((5, 10, 15, 100)) if kind != 'fixed' else rng.choice((0.1, 0.25, 0.5)),
+            buy_quantity=2 if kind == 'buy_x_get_y' else 0, get_quantity=1 if kind == 'buy_x_get_y' else 0,
+            starts_at=now - timedelta(days=1) if windowed else None,
+            ends_at=now + timedelta(days=rng.randint(1, 30)) if windowed else None,
+            daily_start=dt_time(0) if index % 8 == 0 else None, daily_end=dt_time(23, 59) if index % 8 == 0 else None,
+            priority=rng.randint(0, 5),
+        ))
+    promotions = Promotion.objects.bulk_create(promotions)
+
+    product_links, category_links = [], []
+    for index, promotion in enumerate(promotions):
+        if index % 50 == 0:
+            continue  # storewide
+        if index % 5 == 0:
+            category_links.append(Promotion.categories.through(
+                promotion_id=promotion.id, category_id=rng.choice(category_ids),
+            ))
+        else:
+            product_links.extend(
+                Promotion.products.through(promotion_id=promotion.id, product_id=product_id)
+                for product_id in rng.sample(product_ids, min(3, len(product_ids)))
+            )
+    Promotion.products.through.objects.bulk_create(product_links, batch_size=5000)
+    Promotion.categories.through.objects.bulk_create(category_links, batch_size=5000)
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--rules', type=int, default=5000)
+    parser.add_argument('--lines', type=int, default=100, help='Lines in the priced cart (default: 100).')
+    parser.add_argument('--max-ms', type=float, default=1.0,
+                        help='Budget for the median time to price the cart (default: 1).')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from pos.seeding import DataSeeder
+    from products.models import Product
+    from promotions.engine import compile_rules, price_lines
+
+    rng = random.Random(args.seed)
+    with test_database():
+        DataSeeder(products=args.products, sales=0, seed=args.seed, prefix='BENCH').run()
+        seed_rules(args.rules, rng)
+        products = list(Product.objects.all())
+        cart = [(product, rng.randint(1, 6)) for product in rng.sample(products, min(args.lines, len(products)))]
+
+        rules = compile_rules()
+        compile_timing = measure(compile_rules, repeat=args.repeat)
+        cart_timing = measure(lambda: price_lines(cart, rules=rules), repeat=max(args.repeat, 50))
+        discounted = sum(1 for line in price_lines(cart, rules=rules) if line.discount_amount)
+
+        failures = []
+        if cart_timing['median_ms'] > args.max_ms:
+            failures.append(f'median cart {cart_timing["median_ms"]}ms is over the {args.max_ms}ms budget')
+        write_results('pricing', {
+            'dataset': {'products': args.products, 'rules': args.rules, 'lines': len(cart)},
+            'compile': compile_timing,
+            'cart': cart_timing,
+            'discounted_lines': discounted,
+            'failures': failures,
+        }, args.output)
+    for failure in failures:
+        print(f'OVER BUDGET {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
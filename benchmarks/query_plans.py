@@ -0,0 +1,127 @@
+"""
+Record query plans and timings for the date-windowed report and sales queries.
+
+Seeds a synthetic sale history and ledger, runs each query through the same helpers the views
+use, captures the SQL they execute and stores ``EXPLAIN`` output next to the
+timings. With ``--check`` the run fails when a query stops using the index it
+is expected to use, which is how plan regressions are caught.
+
+    python -m benchmarks.query_plans --sales 100000 --check
+"""
+import sys
+from datetime import timedelta
+
+from benchmarks.harness import (
+    QueryRecorder, base_parser, explain, measure, setup_django, test_database, write_results,
+)
+
+
+def seed(products, sales, days, seed):
+    from pos.seeding import DataSeeder
+    from products.models import Product
+
+    DataSeeder(products=products, sales=sales, years=days / 365, seed=seed, prefix='BENCH').run()
+    # Popularity is long-tailed by creation order, so the first product is the bestseller
+    return list(Product.objects.order_by('id').values_list('id', flat=True))
+
+
+def build_cases(product_id, start_date, end_date):
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+    from inventory_backend.dates import filter_by_date_window
+    from pos.models import Sale
+    from products.models import StockTransaction
+    from reports.pagination import LedgerCursorPagination
+    from reports.views import LEDGER_VALUES, ledger_summary
+
+    window = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+    request = Request(RequestFactory().get('/', window))
+    ledger = StockTransaction.objects.filter(product_id=product_id)
+
+    return [
+        {
+            'name': 'sales_list_window',
+            'expected_index': 'sale_created_idx',
+            'run': lambda: list(filter_by_date_window(Sale.objects.all(), request).order_by('-created_at')[:20]),
+        },
+        {
+            'name': 'sales_list_window_legacy_date_lookup',
+            'expected_index': None,
+            'run': lambda: list(
+                Sale.objects.filter(created_at__date__range=[start_date, end_date]).order_by('-created_at')[:20]
+            ),
+        },
+        {
+            'name': 'product_ledger_page',
+            'expected_index': 'stocktx_product_created_idx',
+            'run': lambda: LedgerCursorPagination().paginate_queryset(
+                filter_by_date_window(ledger, request).values(*LEDGER_VALUES), request
+            ),
+        },
+        {
+            'name': 'product_ledger_summary',
+            'expected_index': 'stocktx_product_created_idx',
+            'run': lambda: ledger_summary(filter_by_date_window(ledger, request)),
+        },
+        {
+            'name': 'ledger_window_by_type',
+            'expected_index': 'stocktx_type_created_idx',
+            'run': lambda: list(
+                filter_by_date_window(StockTransaction.objects.filter(transaction_type='purchase'), request)
+                .values_list('product_id', 'quantity')
+            ),
+        },
+    ]
+
+
+def run_case(connection, case, repeat):
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        case['run']()
+    plans = [explain(connection, sql, params) for sql, params in recorder.queries]
+
+    result = {
+        'queries': len(recorder.queries),
+        'timing': measure(case['run'], repeat=repeat),
+        'expected_index': case['expected_index'],
+        'plans': plans,
+    }
+    if case['expected_index']:
+        result['uses_expected_index'] = any(case['expected_index'] in plan for plan in plans)
+    return result
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--sales', type=int, default=50000, help='Sales to seed; each adds 1-5 ledger rows.')
+    parser.add_argument('--days', type=int, default=730, help='Span of history to spread rows over.')
+    parser.add_argument('--window-days', type=int, default=7, help='Width of the queried date window.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='Exit non-zero if an expected index is not used.')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+    from django.utils import timezone
+
+    with test_database():
+        product_ids = seed(args.products, args.sales, args.days, args.seed)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=args.window_days - 1)
+        cases = build_cases(product_ids[0], start_date, end_date)
+        results = {case['name']: run_case(connection, case, args.repeat) for case in cases}
+        write_results('query_plans', results, args.output)
+
+    regressions = [name for name, result in results.items() if result.get('uses_expected_index') is False]
+    if args.check and regressions:
+        print(f'Expected index not used by: {", ".join(regressions)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
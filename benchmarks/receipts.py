@@ -0,0 +1,76 @@
+"""
+Time bulk reprints of a day's receipts.
+
+Seeds ``--sales`` sales on one day, then renders every one of them in each
+receipt format the way a reprint run would: the day's sales fetched with
+their lines in a few queries, the store layout compiled once. Also times the
+first receipt of a process, which compiles the templates, against the warm
+path. Exits 1 when the warm median per receipt is over ``--max-ms``.
+
+    python -m benchmarks.receipts --sales 2000 --max-ms 2
+"""
+import sys
+from datetime import datetime, time, timedelta
+
+from benchmarks.harness import base_parser, measure, setup_django, test_database, write_results
+
+FORMATS = ('text', 'html', 'pdf', 'escpos')
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--sales', type=int, default=1000, help="Sales in the day (default: 1000).")
+    parser.add_argument('--max-ms', type=float, default=2.0,
+                        help='Budget for the median time to render one receipt (default: 2).')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from pos import receipts
+    from pos.seeding import DataSeeder
+
+    with test_database():
+        DataSeeder(products=200, sales=args.sales, years=1 / 365, seed=args.seed, prefix='BENCH').run()
+        day = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(day - timedelta(days=1), time.min))
+
+        def day_sales():
+            return list(receipts.receipt_queryset().filter(created_at__gte=start).order_by('created_at'))
+
+        with CaptureQueriesContext(connection) as captured:
+            sales = day_sales()
+        fetch_queries = len(captured)
+
+        def cold():
+            receipts._layouts.clear()
+            return receipts.Receipt(sales[0]).text()
+
+        results = {
+            'dataset': {'sales': len(sales), 'lines': sum(len(sale.items.all()) for sale in sales)},
+            'fetch': {'queries': fetch_queries, **measure(day_sales, repeat=args.repeat)},
+            'first_receipt': measure(cold, repeat=args.repeat),
+            'formats': {},
+        }
+        failures = []
+        for name in FORMATS:
+            def reprint():
+                layout = receipts.layout_for(sales[0].location)
+                return [getattr(receipts.Receipt(sale, layout), name)() for sale in sales]
+
+            timing = measure(reprint, repeat=args.repeat)
+            per_receipt = round(timing['median_ms'] / max(len(sales), 1), 3)
+            results['formats'][name] = {**timing, 'median_ms_per_receipt': per_receipt}
+            if per_receipt > args.max_ms:
+                failures.append(f'{name} receipts take {per_receipt}ms each, over the {args.max_ms}ms budget')
+        results['failures'] = failures
+        write_results('receipts', results, args.output)
+    for failure in failures:
+        print(f'OVER BUDGET {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
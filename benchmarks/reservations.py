@@ -0,0 +1,134 @@
+"""
+Time cart reservations and the expiry sweeper against many open holds.
+
+Seeds ``--holds`` reservations spread over carts of a few lines each, then
+times reserving a cart and reading a product's available stock, which should
+not depend on how many holds are open; summing the holds instead is timed
+alongside for comparison. Half the holds are then expired and swept in
+``--batch-size`` batches, and every stock row's ``reserved`` is checked
+against its remaining holds. Exits 1 when reserving a cart takes longer than
+``--max-ms`` or the counters do not match.
+
+    python -m benchmarks.reservations --holds 50000 --max-ms 20
+"""
+import random
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks.harness import base_parser, measure, setup_django, test_database, write_results
+
+LINES_PER_CART = 5
+
+
+def seed_holds(count, location, rng):
+    """``count`` holds of one unit on ``location``'s stock, with ``reserved`` set to match."""
+    from django.db.models import OuterRef, Subquery, Sum
+    from django.utils import timezone
+    from products.models import LocationStock, StockReservation
+
+    stock_ids = list(LocationStock.objects.filter(location=location).values_list('id', flat=True))
+    now = timezone.now()
+    holds = []
+    for cart in range(count // LINES_PER_CART):
+        for stock_id in rng.sample(stock_ids, LINES_PER_CART):
+            holds.append(StockReservation(
+                cart=f'bench-{cart}', stock_id=stock_id, quantity=1,
+                expires_at=now + timedelta(seconds=rng.randint(60, 900)),
+            ))
+    StockReservation.objects.bulk_create(holds, batch_size=5000)
+    held = StockReservation.objects.filter(stock=OuterRef('pk')).values('stock').annotate(total=Sum('quantity'))
+    LocationStock.objects.filter(location=location).update(reserved=Subquery(held.values('total')[:1]))
+    LocationStock.objects.filter(location=location, reserved__isnull=True).update(reserved=0)
+    return len(holds)
+
+
+def mismatched_levels(location):
+    from django.db.models import F, Sum
+    from django.db.models.functions import Coalesce
+    from products.models import LocationStock
+
+    return LocationStock.objects.filter(location=location).annotate(
+        held=Coalesce(Sum('reservations__quantity'), 0),
+    ).exclude(held=F('reserved')).count()
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--holds', type=int, default=20000, help='Open holds to seed (default: 20000).')
+    parser.add_argument('--batch-size', type=int, default=500, help='Sweeper batch size (default: 500).')
+    parser.add_argument('--max-ms', type=float, default=20.0,
+                        help='Budget for the median time to reserve a cart (default: 20).')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.db import connection
+    from django.db.models import Sum
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from pos.seeding import DataSeeder
+    from products.models import LocationStock, Product, StockReservation
+    from products.reservations import release_expired, reserve
+    from products.stock import default_location, record_movements
+
+    rng = random.Random(args.seed)
+    with test_database():
+        DataSeeder(products=args.products, sales=0, years=1 / 365, seed=args.seed, prefix='BENCH').run()
+        location = default_location()
+        products = list(Product.objects.order_by('id'))
+        record_movements(location, [(product, 'purchase', 100000, None, 'Benchmark stock') for product in products])
+        seeded = seed_holds(args.holds, location, rng)
+        basket = [product.id for product in products[:LINES_PER_CART]]
+        carts = iter(range(10 ** 9))
+
+        def reserve_cart():
+            reserve(location, f'till-{next(carts)}', {product_id: 1 for product_id in basket})
+
+        def counter():
+            return LocationStock.objects.get(location=location, product_id=basket[0]).available
+
+        def summed():
+            level = LocationStock.objects.get(location=location, product_id=basket[0])
+            held = StockReservation.objects.filter(stock=level).aggregate(total=Sum('quantity'))['total']
+            return level.quantity - (held or 0)
+
+        with CaptureQueriesContext(connection) as captured:
+            reserve_cart()
+        results = {
+            'dataset': {'products': len(products), 'holds': seeded},
+            'reserve': {'queries': len(captured), **measure(reserve_cart, repeat=args.repeat)},
+            'available_from_counter': measure(counter, repeat=args.repeat),
+            'available_from_sum': measure(summed, repeat=args.repeat),
+        }
+
+        # Holds last 1-15 minutes; sweeping as of 8 minutes on releases about half
+        cutoff = timezone.now() + timedelta(seconds=480)
+        expired = StockReservation.objects.filter(expires_at__lte=cutoff).count()
+        started = time.perf_counter()
+        released = release_expired(batch_size=args.batch_size, now=cutoff)
+        elapsed = time.perf_counter() - started
+        results['sweep'] = {
+            'expired': expired,
+            'released': released,
+            'seconds': round(elapsed, 3),
+            'holds_per_second': round(released / elapsed) if elapsed else None,
+        }
+        mismatched = mismatched_levels(location)
+        results['mismatched_levels'] = mismatched
+
+        failures = []
+        if results['reserve']['median_ms'] > args.max_ms:
+            failures.append(f"reserving a cart takes {results['reserve']['median_ms']}ms, over {args.max_ms}ms")
+        if mismatched or released != expired:
+            failures.append(f'{mismatched} stock rows disagree with their holds after the sweep')
+        results['failures'] = failures
+        write_results('reservations', results, args.output)
+    for failure in failures:
+        print(f'OVER BUDGET {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Compare CPU time of the ModelSerializer and values() fast-path list paths.
+
+For products, stock transactions and sales, times fetching ``--rows`` rows,
+serializing them and rendering them to JSON a page at a time, once through the
+ModelSerializer and DRF's JSONRenderer and once through the values() fast
+path and ORJSONRenderer. Times are process CPU milliseconds per 1000 rows.
+The run also checks that both paths render identical bytes.
+
+    python -m benchmarks.serializers --rows 5000
+"""
+import statistics
+import sys
+import time
+
+from benchmarks.harness import base_parser, setup_django, test_database, write_results
+
+
+def cpu_ms(func, repeat):
+    func()  # warm up lazy imports and plans
+    timings = []
+    for _ in range(repeat):
+        started = time.process_time()
+        func()
+        timings.append((time.process_time() - started) * 1000)
+    return statistics.median(timings)
+
+
+def compare(fast, queryset, rows, page_size, repeat):
+    from rest_framework.renderers import JSONRenderer
+    from inventory_backend.renderers import ORJSONRenderer
+
+    pages = [queryset[start:start + page_size] for start in range(0, rows, page_size)]
+    instances = [list(page) for page in pages]
+    values = [list(fast.values(page)) for page in pages]
+    model_data = [fast.serializer_class(page, many=True).data for page in instances]
+    fast_data = [fast.serialize(page) for page in values]
+    per_1000 = 1000 / max(sum(len(page) for page in instances), 1)
+
+    model = {
+        'fetch': cpu_ms(lambda: [list(page.all()) for page in pages], repeat),
+        'serialize': cpu_ms(lambda: [fast.serializer_class(page, many=True).data for page in instances], repeat),
+        'render': cpu_ms(lambda: [JSONRenderer().render(data) for data in model_data], repeat),
+    }
+    fast_path = {
+        'fetch': cpu_ms(lambda: [list(fast.values(page.all())) for page in pages], repeat),
+        'serialize': cpu_ms(lambda: [fast.serialize(page) for page in values], repeat),
+        'render': cpu_ms(lambda: [ORJSONRenderer().render(data) for data in fast_data], repeat),
+    }
+    result = {'rows': sum(len(page) for page in instances)}
+    for name, phases in (('model_serializer', model), ('fast_path', fast_path)):
+        phases['total'] = sum(phases.values())
+        result[name] = {f'{phase}_ms_per_1000': round(ms * per_1000, 3) for phase, ms in phases.items()}
+    result['speedup'] = round(model['total'] / fast_path['total'], 2) if fast_path['total'] else None
+    result['identical'] = all(
+        JSONRenderer().render(expected) == ORJSONRenderer().render(actual)
+        for expected, actual in zip(model_data, fast_data)
+    )
+    return result
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000, help='Rows per list (default: 2000).')
+    parser.add_argument('--page-size', type=int, default=500, help='Rows per page (default: 500).')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from pos.models import Sale
+    from pos.seeding import DataSeeder
+    from pos.serializers import SaleListSerializer
+    from products.models import Product, StockTransaction
+    from products.serializers import ProductListSerializer, StockTransactionListSerializer
+
+    with test_database():
+        DataSeeder(products=args.rows, sales=args.rows, years=0.5, seed=args.seed, prefix='BENCH').run()
+        cases = {
+            'products': (ProductListSerializer, Product.objects.select_related('category').order_by('id')),
+            'stock_transactions': (
+                StockTransactionListSerializer,
+                StockTransaction.objects.select_related('product', 'created_by').order_by('-created_at'),
+            ),
+            'sales': (
+                SaleListSerializer,
+                Sale.objects.select_related('cashier').prefetch_related('items__product').order_by('-created_at'),
+            ),
+        }
+        results = {
+            name: compare(fast, queryset, args.rows, args.page_size, args.repeat)
+            for name, (fast, queryset) in cases.items()
+        }
+        write_results('serializers', results, args.output)
+    return 0 if all(result['identical'] for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Check worker cold-start cost against an import-time and memory budget.
+
+Each run starts a fresh interpreter that calls ``django.setup()``, loads the
+URLconf and resolves a URL, the work a worker does before serving its first
+request. The run records wall time and peak RSS, and lists the slowest
+top-level imports. It exits 1 when the median time or the peak RSS is over
+budget, or when a module that should load lazily (pandas, openpyxl) was
+imported during startup.
+
+    python -m benchmarks.startup --max-ms 1000 --max-rss-mib 75
+    PRELOAD_REPORT_LIBS=1 python -m benchmarks.startup --allow-heavy
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import base_parser, setup_django, write_results
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, os, resource, sys, time
+sys.path.insert(0, {repo!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_backend.settings')
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver, resolve
+get_resolver().url_patterns
+resolve('/api/products/')
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'ms': elapsed * 1000,
+    'rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': sorted(sys.modules),
+}}))
+'''
+
+
+def slowest_imports(stderr, limit):
+    """Top-level entries of ``-X importtime`` output by cumulative time."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('  '):  # nested under another import
+            continue
+        imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in imports[:limit]]
+
+
+def run_once(importtime=False):
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', CHILD.format(repo=REPO)]
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=REPO, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-ms', type=float, default=1000,
+                        help='Budget for the median startup time in ms (default: 1000).')
+    parser.add_argument('--max-rss-mib', type=float, default=75,
+                        help='Budget for peak RSS in MiB (default: 75).')
+    parser.add_argument('--allow-heavy', action='store_true',
+                        help='Do not fail when report libraries load at startup (preloading workers).')
+    args = parser.parse_args(argv)
+
+    from reports.apps import HEAVY_MODULES
+
+    runs = [run_once()[0] for _ in range(args.repeat)]
+    _, stderr = run_once(importtime=True)
+    timings = sorted(run['ms'] for run in runs)
+    rss = max(run['rss_mib'] for run in runs)
+    loaded = sorted(name for name in HEAVY_MODULES if name in runs[0]['modules'])
+
+    failures = []
+    if statistics.median(timings) > args.max_ms:
+        failures.append(f'median startup {statistics.median(timings):.0f}ms is over the {args.max_ms:.0f}ms budget')
+    if rss > args.max_rss_mib:
+        failures.append(f'peak RSS {rss:.1f}MiB is over the {args.max_rss_mib:.0f}MiB budget')
+    if loaded and not args.allow_heavy:
+        failures.append(f'imported at startup: {", ".join(loaded)}')
+
+    setup_django()
+    write_results('startup', {
+        'budget': {'max_ms': args.max_ms, 'max_rss_mib': args.max_rss_mib},
+        'median_ms': round(statistics.median(timings), 1),
+        'min_ms': round(timings[0], 1),
+        'max_ms': round(timings[-1], 1),
+        'peak_rss_mib': round(rss, 1),
+        'module_count': len(runs[0]['modules']),
+        'heavy_modules_loaded': loaded,
+        'slowest_imports': slowest_imports(stderr, 10),
+        'failures': failures,
+    }, args.output)
+    for failure in failures:
+        print(f'OVER BUDGET {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
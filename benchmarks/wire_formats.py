@@ -0,0 +1,97 @@
+"""
+Compare payload size and encode/decode time of the API's wire formats.
+
+Serializes a ``--page-size`` page of products and of sales through the
+values() fast path, then for each body format (JSON, and MessagePack when
+msgpack is installed) records its size and the time to encode it on the
+server and decode it on a till, alone and under every compression the
+server can negotiate (gzip, plus brotli and zstd when installed). Formats
+whose package is missing are listed under ``unavailable``.
+
+    python -m benchmarks.wire_formats --page-size 500
+"""
+import gzip
+import json
+import sys
+
+from benchmarks.harness import base_parser, measure, setup_django, test_database, write_results
+
+
+def body_formats():
+    from inventory_backend.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+
+    formats = {'json': (ORJSONRenderer().render, orjson.loads if orjson else json.loads)}
+    if msgpack is not None:
+        formats['msgpack'] = (MessagePackRenderer().render, lambda body: msgpack.unpackb(body, raw=False))
+    return formats
+
+
+def decompressors():
+    from inventory_backend.compression import brotli, zstandard
+
+    decompress = {'gzip': gzip.decompress}
+    if brotli is not None:
+        decompress['br'] = brotli.decompress
+    if zstandard is not None:
+        decompress['zstd'] = lambda body: zstandard.ZstdDecompressor().decompress(body)
+    return decompress
+
+
+def compare(data, repeat):
+    from inventory_backend.compression import available_encodings
+
+    decompress = decompressors()
+    result = {}
+    for name, (encode, decode) in body_formats().items():
+        body = encode(data)
+        entry = {
+            'bytes': len(body),
+            'encode': measure(lambda: encode(data), repeat),
+            'decode': measure(lambda: decode(body), repeat),
+            'compressed': {},
+        }
+        for encoding, compress in available_encodings():
+            packed = compress(body)
+            entry['compressed'][encoding] = {
+                'bytes': len(packed),
+                'ratio': round(len(body) / len(packed), 2),
+                'compress': measure(lambda: compress(body), repeat),
+                'decompress': measure(lambda: decompress[encoding](packed), repeat),
+            }
+        result[name] = entry
+    return result
+
+
+def main(argv=None):
+    parser = base_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument('--page-size', type=int, default=500, help='Rows per page (default: 500).')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from inventory_backend.compression import available_encodings
+    from pos.models import Sale
+    from pos.seeding import DataSeeder
+    from pos.serializers import SaleListSerializer
+    from products.models import Product
+    from products.serializers import ProductListSerializer
+
+    with test_database():
+        DataSeeder(products=args.page_size, sales=args.page_size, years=0.5, seed=args.seed, prefix='BENCH').run()
+        pages = {
+            'products': ProductListSerializer.serialize(ProductListSerializer.values(
+                Product.objects.select_related('category').order_by('id')[:args.page_size]
+            )),
+            'sales': SaleListSerializer.serialize(SaleListSerializer.values(
+                Sale.objects.order_by('-created_at')[:args.page_size]
+            )),
+        }
+        results = {name: compare(data, args.repeat) for name, data in pages.items()}
+        offered = set(body_formats()) | {name for name, _ in available_encodings()}
+        results['unavailable'] = sorted({'msgpack', 'br', 'zstd'} - offered)
+        write_results('wire_formats', results, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from inventory_backend.admin import LargeTableAdmin
+from .models import ChangeEvent
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(LargeTableAdmin):
+    list_display = ['id', 'sequence', 'topic', 'created_at']
+    list_filter = ['topic']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['topic', 'payload', 'sequence', 'created_at']
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from changefeed.models import ChangeEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed events older than a retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=float, default=24,
+                            help='Keep events newer than this (default: 24).')
+
+    def handle(self, *args, **options):
+        if options['older_than_hours'] <= 0:
+            raise CommandError('--older-than-hours must be positive.')
+        cutoff = timezone.now() - timedelta(hours=options['older_than_hours'])
+        deleted, _ = ChangeEvent.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change events'))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:45
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_events(apps, schema_editor):
+    """Existing events keep their ids as sequences, so clients resume where they were."""
+    ChangeEvent = apps.get_model('changefeed', 'ChangeEvent')
+    FeedSequence = apps.get_model('changefeed', 'FeedSequence')
+
+    ChangeEvent.objects.update(sequence=F('id'))
+    last = ChangeEvent.objects.aggregate(last=Max('id'))['last'] or 0
+    FeedSequence.objects.create(pk=1, last=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changefeed', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='changeevent',
+            name='sequence',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(condition=models.Q(('sequence__isnull', True)), fields=['id'], name='changeevent_pending_idx'),
+        ),
+        migrations.RunPython(number_existing_events, migrations.RunPython.noop),
+    ]
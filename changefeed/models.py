@@ -0,0 +1,31 @@
+from django.db import models
+
+class ChangeEvent(models.Model):
+    """
+    One stock or catalog change, written in the transaction that made it.
+    ``sequence`` is numbered once the event is committed (see outbox.py); it
+    orders the feed and is what clients resume from.
+    """
+    TOPICS = (
+        ('stock', 'Stock'),
+        ('product', 'Product'),
+        ('product_deleted', 'Product deleted'),
+    )
+    
+    topic = models.CharField(max_length=20, choices=TOPICS)
+    payload = models.JSONField()
+    sequence = models.BigIntegerField(null=True, blank=True, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='changeevent_created_idx'),
+            models.Index(fields=['id'], condition=models.Q(sequence__isnull=True), name='changeevent_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.id} {self.topic}"
+
+class FeedSequence(models.Model):
+    """Single row holding the last sequence handed out; locked while numbering."""
+    last = models.BigIntegerField(default=0)
@@ -0,0 +1,107 @@
+"""
+Transactional outbox for stock and catalog changes.
+
+Writers call ``record_stock()`` and ``record_product()`` inside the
+transaction that changes the rows, so an event exists exactly when its
+change committed. Readers page through events by sequence with
+``events_after()``.
+
+Ids are handed out when a row is inserted, not when its transaction
+commits, so on PostgreSQL a reader could see id 11 before a slower
+transaction commits id 10, and skip 10 for good if it paged by id. Events
+are therefore written without a sequence, and ``publish()`` numbers them
+after the fact: holding the ``FeedSequence`` row lock, it gives every
+committed event without a sequence the next numbers, in id order. An event
+still in flight is not visible to it and gets a higher number once it has
+committed, and the lock makes each batch of numbers visible only after the
+previous batch, so no reader ever skips an event. The feed endpoints
+publish before each read, which keeps writers free of the shared lock.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import ChangeEvent, FeedSequence
+
+BATCH_SIZE = 100
+# Events numbered per publish() transaction
+PUBLISH_BATCH_SIZE = 1000
+
+
+def record_stock(levels, totals):
+    """
+    One ``stock`` event per changed ``LocationStock`` row; ``totals`` maps
+    product ids to their new ``current_stock``.
+    """
+    ChangeEvent.objects.bulk_create(
+        ChangeEvent(topic='stock', payload={
+            'product': level.product_id,
+            'location': level.location_id,
+            'location_quantity': level.quantity,
+            'current_stock': totals.get(level.product_id),
+        })
+        for level in levels
+    )
+
+
+def record_product(product):
+    ChangeEvent.objects.create(topic='product', payload={
+        'product': product.id,
+        'name': product.name,
+        'sku': product.sku,
+        'category': product.category_id,
+        'price': str(product.price),
+        'low_stock_threshold': product.low_stock_threshold,
+        'is_active': product.is_active,
+    })
+
+
+def record_product_deleted(product_id):
+    ChangeEvent.objects.create(topic='product_deleted', payload={'product': product_id})
+
+
+def publish(batch_size=PUBLISH_BATCH_SIZE):
+    """Number the committed events that have none yet; returns how many were numbered."""
+    pending = ChangeEvent.objects.filter(sequence__isnull=True)
+    if not pending.exists():
+        return 0
+    published = 0
+    while True:
+        with transaction.atomic():
+            counter, _ = FeedSequence.objects.select_for_update().get_or_create(pk=1)
+            ids = list(pending.order_by('id').values_list('id', flat=True)[:batch_size])
+            if ids:
+                # Keeps id order; numbers may skip where ids do
+                offset = counter.last + 1 - ids[0]
+                ChangeEvent.objects.filter(id__in=ids).update(sequence=F('id') + offset)
+                counter.last = ids[-1] + offset
+                counter.save(update_fields=['last'])
+        published += len(ids)
+        if len(ids) < batch_size:
+            return published
+
+
+def published(events):
+    return events.filter(sequence__isnull=False)
+
+
+def latest_event_id():
+    """Sequence of the newest published event, the position of a client that is up to date."""
+    return published(ChangeEvent.objects).order_by('-sequence').values_list('sequence', flat=True).first() or 0
+
+
+def events_after(after, limit=BATCH_SIZE):
+    """Published events with sequences above ``after``, oldest first; ``id`` is the sequence."""
+    events = ChangeEvent.objects.filter(sequence__gt=after).order_by('sequence')
+    return [
+        {'id': event.pop('sequence'), **event}
+        for event in events.values('sequence', 'topic', 'payload', 'created_at')[:limit]
+    ]
+
+
+def missed_events(after):
+    """
+    Whether events after ``after`` were pruned before the client read them;
+    such a client has to reload its state instead of applying deltas.
+    """
+    oldest = published(ChangeEvent.objects).order_by('sequence').values_list('sequence', flat=True).first()
+    return oldest is not None and after < oldest - 1
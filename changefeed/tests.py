@@ -0,0 +1,126 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from inventory_backend.testing import Endpoint, QueryBudgetMixin, read_stream
+from products.models import Product, StockTransaction
+from .models import ChangeEvent, FeedSequence
+from .outbox import publish
+
+FAST_FEED = override_settings(CHANGEFEED_STREAM_SECONDS=0, CHANGEFEED_POLL_INTERVAL=0)
+
+
+@FAST_FEED
+class ChangefeedQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('changefeed-poll', 'changefeed_poll', budget=3, query={'after': 0, 'timeout': 0}),
+        Endpoint('changefeed-poll-start', 'changefeed_poll', budget=2),
+        Endpoint('changefeed-stream', 'changefeed_stream', budget=3, query={'after': 0}),
+    ]
+
+
+@FAST_FEED
+class ChangefeedTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('till')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+        self.start = self.client.get(reverse('changefeed_poll')).json()['last_id']
+
+    def poll(self, after, **query):
+        return self.client.get(reverse('changefeed_poll'), {'after': after, 'timeout': 0, **query}).json()
+
+    def test_stock_movements_publish_location_and_total(self):
+        StockTransaction.objects.create(product=self.product, transaction_type='purchase', quantity=8)
+        response = self.client.post(reverse('sale-create-sale'), {
+            'items': [{'product_id': self.product.id, 'quantity': 3}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        feed = self.poll(self.start)
+        self.assertEqual(
+            [(event['topic'], event['data']['location_quantity'], event['data']['current_stock'])
+             for event in feed['events']],
+            [('stock', 8, 8), ('stock', 5, 5)],
+        )
+        self.assertEqual(feed['last_id'], feed['events'][-1]['id'])
+        self.assertEqual(self.poll(feed['last_id'])['events'], [])
+
+    def test_product_changes_publish_the_new_values(self):
+        self.product.price = '1.75'
+        self.product.save()
+        product_id = self.product.id
+        self.product.delete()
+        events = [(event['topic'], event['data']) for event in self.poll(self.start)['events']]
+        self.assertEqual(events[0][0], 'product')
+        self.assertEqual(events[0][1]['price'], '1.75')
+        self.assertEqual(events[1], ('product_deleted', {'product': product_id}))
+
+    def test_rolled_back_changes_publish_nothing(self):
+        response = self.client.post(reverse('sale-create-sale'), {
+            'items': [{'product_id': self.product.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.poll(self.start)['events'], [])
+
+    def test_poll_without_a_position_returns_the_newest_id(self):
+        self.assertEqual(
+            self.client.get(reverse('changefeed_poll')).json(), {'events': [], 'last_id': self.start}
+        )
+
+    def test_stream_resumes_after_the_last_event_id(self):
+        for price in ('1.60', '1.70', '1.80'):
+            self.product.price = price
+            self.product.save()
+        response = self.client.get(reverse('changefeed_stream'), HTTP_LAST_EVENT_ID=str(self.start + 1))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = read_stream(response).decode()
+        self.assertTrue(body.startswith('retry: '))
+        self.assertNotIn(f'id: {self.start + 1}\n', body)
+        self.assertIn(f'id: {self.start + 2}\nevent: product\ndata: ', body)
+        self.assertIn('"price": "1.80"', body)
+
+    def test_events_committing_out_of_id_order_are_not_skipped(self):
+        self.product.save()
+        slow = ChangeEvent.objects.latest('id')
+        slow.delete()
+        self.product.price = '1.60'
+        self.product.save()
+        feed = self.poll(self.start)
+        self.assertEqual([event['data']['price'] for event in feed['events']], ['1.60'])
+
+        # The transaction holding the lower id commits only now
+        ChangeEvent.objects.create(id=slow.id, topic='product', payload={**slow.payload, 'price': '1.55'})
+        events = self.poll(feed['last_id'])['events']
+        self.assertEqual([event['data']['price'] for event in events], ['1.55'])
+        self.assertGreater(events[0]['id'], feed['last_id'])
+
+    def test_publishing_numbers_each_event_once(self):
+        for price in ('1.60', '1.70'):
+            self.product.price = price
+            self.product.save()
+        self.assertEqual(publish(), 2)
+        self.assertEqual(publish(), 0)
+        sequences = list(ChangeEvent.objects.order_by('id').values_list('sequence', flat=True))
+        self.assertEqual(sequences, sorted(sequences))
+        self.assertEqual(FeedSequence.objects.get().last, sequences[-1])
+
+    def test_pruned_positions_get_a_reset(self):
+        self.product.save()
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.product.save()
+        call_command('prune_changefeed', older_than_hours=24, stdout=StringIO())
+        feed = self.poll(self.start - 1)
+        self.assertTrue(feed['reset'])
+        self.assertEqual(feed['last_id'], ChangeEvent.objects.latest('id').sequence)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('changefeed_poll')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('changefeed_stream')).status_code, 401)
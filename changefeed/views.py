@@ -0,0 +1,130 @@
+"""
+Change feed endpoints, served asynchronously so a waiting client holds no
+worker thread.
+
+``stream`` is a server-sent events stream. Each event carries its id, so a
+reconnecting ``EventSource`` resumes from ``Last-Event-ID`` on its own. The
+stream closes after ``CHANGEFEED_STREAM_SECONDS`` and the client reconnects.
+``poll`` is the long-poll fallback for clients without SSE: it answers as
+soon as there are events after ``?after=`` or when ``?timeout=`` runs out.
+
+Both start from the newest event when the client gives no position, and
+both send a ``reset`` when the client's position was pruned from the
+outbox, telling it to reload products before applying deltas again. Event
+ids are feed sequences, and both publish newly committed events before
+every read (see outbox.py).
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .outbox import BATCH_SIZE, events_after, latest_event_id, missed_events, publish
+
+
+def authenticated_user(request):
+    """
+    Authenticate a plain Django request the way the API does, including a
+    test client's ``force_authenticate()``.
+    """
+    api_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        user = api_request.user
+    except APIException:
+        return None
+    return user if user is not None and user.is_authenticated else None
+
+
+def position(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+def sse(event_id, event, data):
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def stream(request):
+    if await sync_to_async(authenticated_user)(request) is None:
+        return unauthorized()
+    after = position(request.headers.get('Last-Event-ID') or request.GET.get('after'))
+    response = StreamingHttpResponse(event_stream(after), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def event_stream(after):
+    interval = settings.CHANGEFEED_POLL_INTERVAL
+    deadline = time.monotonic() + settings.CHANGEFEED_STREAM_SECONDS
+    heartbeat = time.monotonic() + settings.CHANGEFEED_HEARTBEAT_SECONDS
+
+    yield f'retry: {int(settings.CHANGEFEED_RETRY_SECONDS * 1000)}\n\n'
+    await sync_to_async(publish)()
+    if after is None:
+        after = await sync_to_async(latest_event_id)()
+    elif await sync_to_async(missed_events)(after):
+        after = await sync_to_async(latest_event_id)()
+        yield sse(after, 'reset', {'last_id': after})
+
+    while True:
+        events = await sync_to_async(events_after)(after)
+        for event in events:
+            yield sse(event['id'], event['topic'], event['payload'])
+        if events:
+            after = events[-1]['id']
+            heartbeat = time.monotonic() + settings.CHANGEFEED_HEARTBEAT_SECONDS
+        if time.monotonic() >= deadline:
+            return
+        if time.monotonic() >= heartbeat:
+            # Comment line; keeps proxies from closing an idle connection
+            yield ': keep-alive\n\n'
+            heartbeat = time.monotonic() + settings.CHANGEFEED_HEARTBEAT_SECONDS
+        if len(events) < BATCH_SIZE:
+            await asyncio.sleep(interval)
+            await sync_to_async(publish)()
+
+
+async def poll(request):
+    if await sync_to_async(authenticated_user)(request) is None:
+        return unauthorized()
+    after = position(request.GET.get('after'))
+    await sync_to_async(publish)()
+    if after is None:
+        return JsonResponse({'events': [], 'last_id': await sync_to_async(latest_event_id)()})
+    if await sync_to_async(missed_events)(after):
+        return JsonResponse({'events': [], 'reset': True, 'last_id': await sync_to_async(latest_event_id)()})
+
+    limit = settings.CHANGEFEED_LONG_POLL_SECONDS
+    try:
+        timeout = min(max(float(request.GET.get('timeout', limit)), 0), limit)
+    except ValueError:
+        timeout = limit
+    deadline = time.monotonic() + timeout
+    while True:
+        events = await sync_to_async(events_after)(after)
+        if events or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(settings.CHANGEFEED_POLL_INTERVAL)
+        await sync_to_async(publish)()
+
+    return JsonResponse({
+        'events': [{'id': event['id'], 'topic': event['topic'], 'data': event['payload']} for event in events],
+        'last_id': events[-1]['id'] if events else after,
+    })
@@ -0,0 +1,179 @@
+"""
+Several API calls in one round trip.
+
+``POST /api/batch/`` takes ``{"requests": [{"method", "url", "body",
+"headers", "id"}, ...]}`` and answers ``{"responses": [{"id", "status",
+"headers", "body"}, ...]}`` in the same order. Each sub-request is resolved
+against the API routes and handed straight to its view in this process,
+authenticated as the batch's user, so a till pays one round trip, one token
+check and one database connection for its whole startup. A sub-request that
+fails only fails its own entry.
+
+Sub-requests run in order on the request's thread and connection, so a
+write is visible to the reads after it; once an entry has written, the
+entries after it carry a replica pin (see ``routers.py``) so their report
+reads stay on the primary too. With ``BATCH_READ_WORKERS`` above zero,
+consecutive GETs run concurrently on that many threads instead; each worker
+thread uses its own database connection and closes it when done, and any
+other method still waits for the reads before it and runs alone.
+
+Sub-responses are JSON already; their bytes are spliced into the payload
+rather than parsed and encoded again. Streams, long polls and file
+downloads cannot be batched and come back as a 400 entry.
+"""
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+
+from .routers import pin_after_write
+
+logger = logging.getLogger(__name__)
+
+# Request headers a sub-request does not inherit from the batch
+OWN_HEADERS = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+# Response headers passed back with each entry
+RETURNED_HEADERS = ('ETag', 'Last-Modified', 'Location')
+
+
+class BatchItemSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False)
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'], default='GET')
+    url = serializers.CharField()
+    body = serializers.JSONField(required=False)
+    headers = serializers.DictField(child=serializers.CharField(), required=False, default=dict)
+
+    def validate_url(self, value):
+        path = urlsplit(value).path
+        if not path.startswith('/api/') or path.rstrip('/') == '/api/batch':
+            raise serializers.ValidationError("Only API URLs other than the batch endpoint can be batched.")
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        limit = settings.BATCH_MAX_REQUESTS
+        if len(value) > limit:
+            raise serializers.ValidationError(f"A batch can hold at most {limit} requests.")
+        return value
+
+
+def sub_request(request, item, pin=None):
+    """
+    A ``WSGIRequest`` for ``item`` carrying the batch request's headers and
+    user, and ``pin`` as its replica pin when given.
+    """
+    url = urlsplit(item['url'])
+    body = json.dumps(item['body']).encode() if 'body' in item else b''
+    environ = {key: value for key, value in request.META.items() if key not in OWN_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': item['method'],
+        'PATH_INFO': url.path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        # Entries are spliced into a JSON payload whatever the batch itself accepts
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(body),
+    })
+    for name, value in item['headers'].items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    if pin:
+        environ['HTTP_X_REPLICA_PIN'] = pin
+    sub = WSGIRequest(environ)
+    sub.user = request.user
+    # DRF takes the user as given instead of checking the token again
+    sub._force_auth_user, sub._force_auth_token = request.user, request.auth
+    return sub
+
+
+def error_entry(status, message):
+    return status, {}, json.dumps({'error': message}).encode()
+
+
+def run_one(request, item, pin=None):
+    """Run one sub-request and return its status, headers and JSON body."""
+    sub = sub_request(request, item, pin)
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return error_entry(404, f"No API route matches {sub.path_info}.")
+    if iscoroutinefunction(match.func):
+        return error_entry(400, f"{sub.path_info} streams its response and cannot be batched.")
+
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception:
+        logger.exception('Batched %s %s failed', item['method'], item['url'])
+        return error_entry(500, 'Internal server error.')
+    headers = {name: response[name] for name in RETURNED_HEADERS if name in response}
+    if response.status_code == 304:
+        return 304, headers, b'null'
+    if response.streaming or not response.get('Content-Type', '').startswith('application/json'):
+        if hasattr(response, 'close'):
+            response.close()
+        return error_entry(400, f"{sub.path_info} does not answer with JSON and cannot be batched.")
+    return response.status_code, headers, response.content or b'null'
+
+
+def run_in_thread(request, item, pin):
+    try:
+        return run_one(request, item, pin)
+    finally:
+        connections.close_all()
+
+
+def run_all(request, items):
+    """Results for ``items`` in order, running consecutive GETs together when enabled."""
+    workers = settings.BATCH_READ_WORKERS
+    if workers <= 0:
+        return [run_one(request, item, pin_after_write(request.user)) for item in items]
+
+    results, reads = [], []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as pool:
+        def flush():
+            # Writes only run on this thread, so the pin is decided here
+            pin = pin_after_write(request.user)
+            results.extend(pool.map(lambda item: run_in_thread(request, item, pin), reads))
+            reads.clear()
+
+        for item in items:
+            if item['method'] == 'GET':
+                reads.append(item)
+                continue
+            flush()
+            results.append(run_one(request, item, pin_after_write(request.user)))
+        flush()
+    return results
+
+
+def entry(item, index, status, headers, body):
+    head = json.dumps({'id': item.get('id', str(index)), 'status': status, 'headers': headers})
+    return head[:-1].encode() + b',"body":' + body + b'}'
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def batch(request):
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    items = serializer.validated_data['requests']
+    results = run_all(request, items)
+    payload = b','.join(entry(item, index, *result) for index, (item, result) in enumerate(zip(items, results)))
+    return HttpResponse(b'{"responses":[' + payload + b']}', content_type='application/json')
@@ -0,0 +1,137 @@
+"""
+Conditional GET and a versioned cache of serialized pages for read-mostly
+viewsets.
+
+``ConditionalListMixin`` derives a validator for a list request from one
+aggregate over the filtered queryset: the row count and the newest value of
+each ``conditional_fields`` timestamp. The validator becomes the ETag, so
+a client whose copy is current gets a 304 before any row is fetched or
+serialized. Otherwise the serialized page is cached under the namespace
+version and the validator. Lists carry no ``Last-Modified``: deleting or
+deactivating a row takes its timestamp out of the list, so the newest one
+left never moves past a client's copy; only the count in the ETag notices.
+Single objects carry both validators.
+
+The validator comes from the database, so every process agrees on it even
+with a per-process cache. ``bump_version()`` drops every cached page for a
+namespace at once, for writes that bypass the timestamps (``update()``,
+``bulk_update()``).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+VERSION_KEY = '{}:version'
+
+
+def get_version(namespace):
+    version = cache.get(VERSION_KEY.format(namespace))
+    if version is None:
+        cache.add(VERSION_KEY.format(namespace), 1, None)
+        version = cache.get(VERSION_KEY.format(namespace), 1)
+    return version
+
+
+def bump_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+class ConditionalListMixin:
+    """
+    For ``ModelViewSet``s whose rows carry ``updated_at`` timestamps. Set
+    ``cache_namespace`` and list every timestamp the representation depends
+    on in ``conditional_fields`` (e.g. ``category__updated_at`` when a
+    related name is serialized, or ``location_stocks__location__updated_at``
+    across a to-many relation).
+    """
+
+    cache_namespace = None
+    conditional_fields = ('updated_at',)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        aggregates = queryset.aggregate(
+            # A to-many field in conditional_fields joins several rows per object
+            count=Count('pk', distinct=True),
+            **{f'max_{index}': Max(field) for index, field in enumerate(self.conditional_fields)},
+        )
+        count = aggregates.pop('count')
+
+        validator = '|'.join([
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            str(count),
+            *(value.isoformat() if value else '' for value in aggregates.values()),
+        ])
+        etag = hashlib.md5(validator.encode()).hexdigest()
+
+        not_modified = self.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        key = f'{self.cache_namespace}:{get_version(self.cache_namespace)}:{etag}'
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+        else:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+        return self.add_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        timestamps = [self.timestamp(instance, field) for field in self.conditional_fields]
+        timestamps = [value for value in timestamps if value is not None]
+        last_modified = max(timestamps) if timestamps else None
+        validator = '|'.join([
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            *(value.isoformat() for value in timestamps),
+        ])
+        etag = hashlib.md5(validator.encode()).hexdigest()
+
+        not_modified = self.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = Response(self.get_serializer(instance).data)
+        return self.add_validators(response, etag, last_modified)
+
+    @classmethod
+    def timestamp(cls, instance, field):
+        part, _, rest = field.partition('__')
+        value = getattr(instance, part, None)
+        if value is None or not rest:
+            return value
+        if hasattr(value, 'all'):
+            # A related manager; prefetch it so this reads no rows
+            values = [cls.timestamp(related, rest) for related in value.all()]
+            return max((value for value in values if value is not None), default=None)
+        return cls.timestamp(value, rest)
+
+    def not_modified(self, request, etag, last_modified=None):
+        response = get_conditional_response(
+            request,
+            etag=quote_etag(etag),
+            last_modified=int(last_modified.timestamp()) if last_modified else None,
+        )
+        if response is not None:
+            return self.add_validators(response, etag, last_modified)
+        return None
+
+    def add_validators(self, response, etag, last_modified=None):
+        response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        # Clients may keep a copy but must revalidate it on every poll
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
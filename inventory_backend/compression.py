@@ -0,0 +1,123 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+``CompressionMiddleware`` compresses responses of at least
+``COMPRESSION_MIN_BYTES`` with the encoding the client weights highest,
+preferring zstd, then brotli, then gzip when weights tie. zstd and brotli are
+offered only when the zstandard and brotli packages are installed; gzip
+always is. Levels favour speed over ratio, since every response is
+compressed as it is served: on API payloads they get most of the size
+reduction of the maximum levels for a fraction of the CPU.
+
+Streaming responses (change feed streams, profile and report downloads)
+and formats that are compressed already pass through untouched, and a
+compressed body is only used when it is actually smaller. Like Django's
+``GZipMiddleware``, a strong ETag is weakened on compressed responses,
+since the bytes no longer match the ones it was computed for.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Media types that gain nothing from another round of compression
+INCOMPRESSIBLE = (
+    'text/event-stream', 'image/', 'audio/', 'video/', 'application/zip', 'application/gzip',
+    'application/vnd.openxmlformats',
+)
+
+
+def gzip_compress(content):
+    return gzip.compress(content, compresslevel=6, mtime=0)
+
+
+def brotli_compress(content):
+    return brotli.compress(content, quality=4)
+
+
+def zstd_compress(content):
+    # Compressor objects are not safe to share between threads
+    return zstandard.ZstdCompressor(level=3).compress(content)
+
+
+def available_encodings():
+    """Supported encodings in order of preference."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append(('zstd', zstd_compress))
+    if brotli is not None:
+        encodings.append(('br', brotli_compress))
+    encodings.append(('gzip', gzip_compress))
+    return encodings
+
+
+def accepted_weights(header):
+    """``Accept-Encoding`` as a mapping of coding to its q-value."""
+    weights = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+def choose_encoding(header, encodings):
+    """The ``(name, compress)`` pair the client weights highest, or ``None``."""
+    weights = accepted_weights(header)
+    best, best_weight = None, 0.0
+    for name, compress in encodings:
+        weight = weights.get(name, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = (name, compress), weight
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.encodings = available_encodings()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if content_type.startswith(INCOMPRESSIBLE) or len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        # The body now depends on the request's Accept-Encoding, compressed or not
+        patch_vary_headers(response, ('Accept-Encoding',))
+        chosen = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if chosen is None:
+            return response
+        name, compress = chosen
+        compressed = compress(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = name
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
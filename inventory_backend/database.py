@@ -0,0 +1,102 @@
+"""
+Build ``DATABASES`` entries from environment variables.
+
+``DB_ENGINE`` selects the profile (``sqlite``, the default, or
+``postgresql``); the remaining ``DB_*`` variables tune it. Every variable can
+be given a different prefix, so the same helper describes more than one alias.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Applied to every new SQLite connection. WAL lets readers proceed while a
+# checkout is writing; NORMAL sync is safe under WAL and avoids an fsync per
+# commit; mmap and a larger page cache keep hot report pages in memory.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size={mmap_size}',
+    'PRAGMA cache_size=-{cache_kib}',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def env(name, default=None):
+    return os.environ.get(name, default)
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be an integer, got {value!r}')
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def sqlite_config(prefix, default_name):
+    config = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env(f'{prefix}_NAME', default_name),
+        'CONN_MAX_AGE': env_int(f'{prefix}_CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if env_bool(f'{prefix}_SQLITE_TUNING', True):
+        pragmas = ';'.join(SQLITE_PRAGMAS).format(
+            mmap_size=env_int(f'{prefix}_SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+            cache_kib=env_int(f'{prefix}_SQLITE_CACHE_KIB', 64 * 1024),
+        )
+        config['OPTIONS'] = {
+            # Seconds a writer waits for the lock before "database is locked"
+            'timeout': env_int(f'{prefix}_SQLITE_BUSY_TIMEOUT', 20),
+            # Take the write lock at BEGIN so concurrent checkouts queue on the
+            # busy timeout instead of failing when upgrading a read lock
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': pragmas,
+        }
+    return config
+
+
+def postgresql_config(prefix):
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env(f'{prefix}_NAME', 'inventory'),
+        'USER': env(f'{prefix}_USER', ''),
+        'PASSWORD': env(f'{prefix}_PASSWORD', ''),
+        'HOST': env(f'{prefix}_HOST', ''),
+        'PORT': env(f'{prefix}_PORT', ''),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
+    }
+    if env_bool(f'{prefix}_POOL', True):
+        # Pooled connections are handed back at the end of each request, so
+        # persistent connections must be off (Django rejects both together)
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {
+            'min_size': env_int(f'{prefix}_POOL_MIN_SIZE', 2),
+            'max_size': env_int(f'{prefix}_POOL_MAX_SIZE', 20),
+            'timeout': env_int(f'{prefix}_POOL_TIMEOUT', 10),
+        }
+    else:
+        config['CONN_MAX_AGE'] = env_int(f'{prefix}_CONN_MAX_AGE', 600)
+    return config
+
+
+def database_config(prefix='DB', default_name=None):
+    """Return a ``DATABASES`` entry for the profile selected by ``<prefix>_ENGINE``."""
+    engine = env(f'{prefix}_ENGINE', 'sqlite').strip().lower()
+
+    if engine in ('sqlite', 'sqlite3'):
+        return sqlite_config(prefix, default_name)
+    if engine in ('postgres', 'postgresql'):
+        return postgresql_config(prefix)
+    raise ImproperlyConfigured(f'{prefix}_ENGINE must be "sqlite" or "postgresql", got {engine!r}')
@@ -0,0 +1,53 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def parse_query_date(value, param):
+    """Parse a ``YYYY-MM-DD`` query parameter, raising a 400 on bad input."""
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({param: 'Enter a valid date in YYYY-MM-DD format.'})
+    return parsed
+
+
+def day_start(day):
+    """The aware datetime at which ``day`` begins in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_window(request):
+    """
+    Turn the request's ``start_date``/``end_date`` parameters into a half-open
+    ``[start, end)`` pair of aware datetimes covering whole local days.
+
+    Either bound may be ``None`` when the parameter is absent.
+    """
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+
+    start = day_start(parse_query_date(start_date, 'start_date')) if start_date else None
+    end = day_start(parse_query_date(end_date, 'end_date') + timedelta(days=1)) if end_date else None
+    return start, end
+
+
+def filter_by_date_window(queryset, request, field='created_at'):
+    """
+    Restrict ``queryset`` to the request's date window.
+
+    Compares the raw timestamp column against the window bounds instead of
+    using a ``__date`` lookup, so an index on ``field`` can serve the range.
+    """
+    start, end = date_window(request)
+
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+
+    return queryset
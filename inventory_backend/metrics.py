@@ -0,0 +1,326 @@
+"""
+Per-route request metrics exposed in Prometheus text format at ``/metrics``.
+
+``RequestMetricsMiddleware`` records latency, DB query count, DB time and
+response size for a ``METRICS_SAMPLE_RATE`` fraction of requests, keyed by
+URL route name, and counts requests that exceed their query budget
+(``METRICS_QUERY_BUDGET``, overridable per route in ``METRICS_QUERY_BUDGETS``).
+
+Each process aggregates in memory. When ``METRICS_MULTIPROC_DIR`` is set,
+processes also write snapshots there every ``METRICS_FLUSH_INTERVAL``
+seconds and ``/metrics`` sums the snapshots of all workers. A process
+starting up takes over the snapshots of workers that have exited, so the
+totals never go backwards when workers are recycled: it adds them to its own
+counts and lists their pids as absorbed in its snapshot before deleting
+their files.
+
+``/metrics`` answers clients in ``METRICS_ALLOWED_IPS`` or sending
+``Authorization: Bearer <METRICS_TOKEN>``, and is forbidden to everyone else.
+"""
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by route.', LATENCY_BUCKETS),
+    'http_request_db_queries': ('histogram', 'Database queries per request by route.', QUERY_BUCKETS),
+    'http_request_db_seconds_total': ('counter', 'Time spent in database queries by route.', None),
+    'http_response_size_bytes_total': ('counter', 'Response body bytes by route.', None),
+    'http_requests_total': ('counter', 'Sampled requests by route, method and status.', None),
+    'http_requests_over_query_budget_total': ('counter', 'Requests that ran more queries than their budget.', None),
+}
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store of counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.absorbed = set()
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def merge(self, snapshot):
+        """Add the counts of another registry's ``snapshot()`` to this one."""
+        with self._lock:
+            for name, labels, value in snapshot['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, data in snapshot['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                merged = self.histograms.setdefault(key, {'buckets': [0] * len(data['buckets']), 'sum': 0, 'count': 0})
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], data['buckets'])]
+                merged['sum'] += data['sum']
+                merged['count'] += data['count']
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), {**data, 'buckets': list(data['buckets'])}]
+                    for (name, labels), data in self.histograms.items()
+                ],
+                'absorbed': sorted(self.absorbed),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.absorbed.clear()
+            self.last_flush = 0.0
+
+
+registry = MetricsRegistry()
+
+
+def multiproc_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+
+def pid_alive(pid):
+    # Signal 0 only probes on POSIX; on Windows os.kill() terminates
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_files(directory):
+    """``(pid, path)`` of every snapshot in ``directory``."""
+    for filename in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(filename)
+        if extension == '.json' and stem.isdigit():
+            yield int(stem), os.path.join(directory, filename)
+
+
+def write_snapshot(directory):
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    with open(f'{path}.tmp', 'w') as fh:
+        json.dump(registry.snapshot(), fh)
+    os.replace(f'{path}.tmp', path)
+
+
+def absorb_exited(directory):
+    """
+    Take over the snapshots of exited workers, including one left under this
+    process's own (reused) pid. A ``.claim`` file created exclusively keeps
+    two starting workers from both counting the same snapshot.
+    """
+    pid = os.getpid()
+    for owner, path in snapshot_files(directory):
+        if owner != pid and pid_alive(owner):
+            continue
+        claim = f'{path}.claim'
+        try:
+            os.close(os.open(claim, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        try:
+            snapshot = load_snapshot(path)
+            if snapshot is None:
+                continue
+            registry.merge(snapshot)
+            if owner != pid:
+                # Listed until the file is gone, so a scrape never counts it twice
+                registry.absorbed.add(owner)
+                write_snapshot(directory)
+                os.remove(path)
+                registry.absorbed.discard(owner)
+        finally:
+            os.remove(claim)
+
+
+def flush(force=False):
+    """Write this process's snapshot to the multiprocess directory."""
+    directory = multiproc_dir()
+    if not directory:
+        return
+    now = time.monotonic()
+    if not force and now - registry.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+        return
+    os.makedirs(directory, exist_ok=True)
+    if not registry.last_flush:
+        absorb_exited(directory)
+    registry.last_flush = now
+    write_snapshot(directory)
+
+
+def collect():
+    """Merge the snapshots of every process (or just this one) into one view."""
+    snapshots = [registry.snapshot()]
+    directory = multiproc_dir()
+    if directory:
+        flush(force=True)
+        snapshots = {pid: load_snapshot(path) for pid, path in snapshot_files(directory)}
+        absorbed = {pid for snapshot in snapshots.values() if snapshot for pid in snapshot.get('absorbed', ())}
+        snapshots = [snapshot for pid, snapshot in snapshots.items() if snapshot and pid not in absorbed]
+
+    merged = MetricsRegistry()
+    for snapshot in snapshots:
+        merged.merge(snapshot)
+    return merged.counters, merged.histograms
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in pairs) + '}'
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            continue
+        for (metric, labels), data in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, data['buckets']):
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {data["count"]}')
+            lines.append(f'{name}_sum{format_labels(labels)} {data["sum"]}')
+            lines.append(f'{name}_count{format_labels(labels)} {data["count"]}')
+    lines.append('# HELP metrics_sample_rate Fraction of requests recorded.')
+    lines.append('# TYPE metrics_sample_rate gauge')
+    lines.append(f'metrics_sample_rate {getattr(settings, "METRICS_SAMPLE_RATE", 1.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    if not scrape_allowed(request):
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryRecorder:
+    """``execute_wrapper`` hook counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def query_budget(route):
+    budgets = getattr(settings, 'METRICS_QUERY_BUDGETS', {})
+    return budgets.get(route, getattr(settings, 'METRICS_QUERY_BUDGET', 50))
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unresolved'
+        if route == 'metrics':
+            return response
+
+        labels = (('route', route),)
+        registry.observe('http_request_duration_seconds', labels, elapsed)
+        registry.observe('http_request_db_queries', labels, recorder.count)
+        registry.inc('http_request_db_seconds_total', labels, recorder.duration)
+        if response.streaming:
+            size = int(response.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        registry.inc('http_response_size_bytes_total', labels, size)
+        registry.inc(
+            'http_requests_total',
+            (('route', route), ('method', request.method), ('status', str(response.status_code))),
+        )
+
+        budget = query_budget(route)
+        if recorder.count > budget:
+            registry.inc('http_requests_over_query_budget_total', labels)
+            logger.warning(
+                '%s %s ran %d queries, over its budget of %d', request.method, request.path, recorder.count, budget
+            )
+
+        flush()
+        return response
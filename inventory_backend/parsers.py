@@ -0,0 +1,18 @@
+"""
+MessagePack request bodies, for clients that send what they receive from
+``MessagePackRenderer``. Only installed as a parser when msgpack is.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .renderers import msgpack
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, strict_map_key=False)
+        except ValueError as exc:  # msgpack's unpack errors are ValueErrors
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,303 @@
+"""
+On-demand profiling of single requests.
+
+An admin asks for a profile by sending ``X-Profile: cprofile`` (or
+``sampling``), or by adding ``?_profile=cprofile`` to the URL.
+``ProfilerMiddleware`` then runs that one request under ``cProfile`` or a
+sampling profiler and records every SQL statement it ran. The profile is
+written to ``PROFILER_DIR`` and its id is returned in the ``X-Profile-Id``
+response header. Only the newest ``PROFILER_RETENTION`` profiles are kept.
+
+Requests that do not ask for a profile pay for one header lookup. With
+``PROFILER_ENABLED`` off the middleware removes itself entirely.
+
+    GET /api/profiles/                  recent profiles
+    GET /api/profiles/<id>/             metadata and SQL log
+    GET /api/profiles/<id>/download/    .prof (pstats) or .speedscope.json
+"""
+import cProfile
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+
+from accounts.authentication import CachedJWTAuthentication
+from accounts.permissions import IsAdmin, is_admin
+
+MODES = {
+    '': 'cprofile', '1': 'cprofile', 'true': 'cprofile', 'cprofile': 'cprofile',
+    'sampling': 'sampling', 'speedscope': 'sampling',
+}
+EXTENSIONS = {'cprofile': '.prof', 'sampling': '.speedscope.json'}
+META_SUFFIX = '.meta.json'
+PROFILE_ID = re.compile(r'[0-9a-f]{16}')
+
+
+def requested_mode(request):
+    value = request.META.get('HTTP_X_PROFILE')
+    if value is None:
+        if '_profile' not in request.META.get('QUERY_STRING', ''):
+            return None
+        value = request.GET.get('_profile')
+        if value is None:
+            return None
+    return MODES.get(value.strip().lower())
+
+
+def profiling_user(request):
+    """The admin asking for the profile, or ``None``."""
+    user = getattr(request, 'user', None)
+    if is_admin(user):
+        return user
+    try:
+        authenticated = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if authenticated and is_admin(authenticated[0]):
+        return authenticated[0]
+    return None
+
+
+class SQLLog:
+    """``execute_wrapper`` hook keeping the statements a request ran."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if len(self.queries) < self.limit:
+                self.queries.append({
+                    'alias': context['connection'].alias,
+                    'sql': sql,
+                    'params': None if many else [str(param)[:200] for param in params or ()],
+                    'many': many,
+                    'duration_ms': round(elapsed * 1000, 3),
+                })
+
+
+class SamplingProfiler:
+    """
+    Samples the request thread's stack from a background thread and exports
+    it in speedscope's sampled-profile format.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.frames = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_name, code.co_filename, code.co_firstlineno)
+                stack.append(self.frames.setdefault(key, len(self.frames)))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def write(self, path, name):
+        frames = sorted(self.frames.items(), key=lambda item: item[1])
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'inventory_backend.profiling',
+            'shared': {'frames': [{'name': n, 'file': f, 'line': line} for (n, f, line), _ in frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+        with open(path, 'w') as fh:
+            json.dump(document, fh)
+
+
+def profile_dir():
+    return settings.PROFILER_DIR
+
+
+def profile_paths(profile_id):
+    if not PROFILE_ID.fullmatch(profile_id):
+        raise Http404
+    meta_path = os.path.join(profile_dir(), profile_id + META_SUFFIX)
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+    except (OSError, ValueError):
+        raise Http404
+    return meta, os.path.join(profile_dir(), meta['file'])
+
+
+def saved_profiles():
+    """Metadata paths, newest first."""
+    directory = profile_dir()
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(META_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(directory, name) for name in names]
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+    return sorted(mtimes, key=mtimes.get, reverse=True)
+
+
+def prune():
+    """Drop profiles beyond the retention limit, oldest first."""
+    for meta_path in saved_profiles()[getattr(settings, 'PROFILER_RETENTION', 20):]:
+        profile_id = os.path.basename(meta_path)[:-len(META_SUFFIX)]
+        for suffix in (META_SUFFIX, *EXTENSIONS.values()):
+            try:
+                os.remove(os.path.join(profile_dir(), profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilerMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        user = profiling_user(request)
+        if user is None:
+            return self.get_response(request)
+        return self.profile(request, mode, user)
+
+    def profile(self, request, mode, user):
+        profile_id = secrets.token_hex(8)
+        sql = SQLLog(getattr(settings, 'PROFILER_MAX_QUERIES', 1000))
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+        else:
+            profiler = SamplingProfiler(getattr(settings, 'PROFILER_SAMPLE_INTERVAL', 0.001))
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(sql))
+            if mode == 'cprofile':
+                profiler.enable()
+                stack.callback(profiler.disable)
+            else:
+                profiler.start()
+                stack.callback(profiler.stop)
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        os.makedirs(profile_dir(), exist_ok=True)
+        filename = profile_id + EXTENSIONS[mode]
+        path = os.path.join(profile_dir(), filename)
+        if mode == 'cprofile':
+            profiler.dump_stats(path)
+        else:
+            profiler.write(path, f'{request.method} {request.path}')
+
+        meta = {
+            'id': profile_id,
+            'mode': mode,
+            'file': filename,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': user.username,
+            'created_at': timezone.now().isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'query_count': sql.count,
+            'query_ms': round(sql.duration * 1000, 3),
+            'queries': sql.queries,
+        }
+        meta_path = os.path.join(profile_dir(), profile_id + META_SUFFIX)
+        with open(f'{meta_path}.tmp', 'w') as fh:
+            json.dump(meta, fh)
+        os.replace(f'{meta_path}.tmp', meta_path)
+        prune()
+
+        response['X-Profile-Id'] = profile_id
+        return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_list(request):
+    profiles = []
+    for meta_path in saved_profiles():
+        try:
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        meta.pop('queries', None)
+        profiles.append(meta)
+    return Response({'profiles': profiles})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_detail(request, profile_id):
+    meta, _ = profile_paths(profile_id)
+    return Response(meta)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def profile_download(request, profile_id):
+    meta, path = profile_paths(profile_id)
+    try:
+        handle = open(path, 'rb')
+    except OSError:
+        raise Http404
+    content_type = 'application/json' if meta['mode'] == 'sampling' else 'application/octet-stream'
+    return FileResponse(handle, as_attachment=True, filename=meta['file'], content_type=content_type)
@@ -0,0 +1,62 @@
+"""
+JSON rendering through orjson when it is installed, and MessagePack
+rendering when msgpack is.
+
+``ORJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` with the
+default settings: compact separators, UTF-8 output, DRF's encoding of
+datetimes, decimals and other non-JSON types, and escaped U+2028/U+2029.
+Anything orjson cannot reproduce exactly (indented output, ASCII-only or
+non-compact settings, integers over 64 bits) goes through ``JSONRenderer``.
+The one remaining difference is floats in exponent notation (``1e16`` rather
+than ``1e+16``); API payloads carry decimals as strings.
+
+``MessagePackRenderer`` encodes the same values as the JSON renderers, with
+decimals and datetimes as the same strings, so a client can switch formats
+without changing how it reads fields. It is only offered by content
+negotiation when msgpack is installed (see ``settings.REST_FRAMEWORK``).
+"""
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+if orjson is not None:
+    # Datetimes go through DRF's encoder so they keep its "Z" suffix
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    ORJSON_ERRORS = (orjson.JSONEncodeError, TypeError)
+
+ENCODER = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=ENCODER.default, option=ORJSON_OPTIONS)
+        except ORJSON_ERRORS:
+            return super().render(data, accepted_media_type, renderer_context)
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=ENCODER.default, use_bin_type=True, datetime=False)
@@ -0,0 +1,144 @@
+"""
+Send report and analytics reads to a read replica.
+
+Reads only go to the replica inside a replica scope: a view using
+``ReplicaReadMixin`` or code wrapped in ``replica_reads()``. Everything else
+(checkout, restock, authentication) keeps using the primary. A user whose
+request wrote to the primary is pinned to it for ``REPLICA_PIN_SECONDS`` so
+the till that just sold something sees its own sale in the reports.
+
+The pin travels with the client rather than living in a worker: the
+response to a write carries a signed, timestamped pin for the user as a
+cookie and in the ``X-Replica-Pin`` header, and whichever worker serves the
+next request checks the signature and age of the one sent back. Clients
+that do not keep cookies echo the header.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_scope = ContextVar('replica_scope', default=False)
+_wrote_primary = ContextVar('wrote_primary', default=False)
+
+PIN_COOKIE = 'replica_pin'
+PIN_HEADER = 'X-Replica-Pin'
+_pin_signer = signing.TimestampSigner(salt='inventory_backend.routers.replica-pin')
+
+
+def replica_alias():
+    """The configured replica alias, or ``None`` when no replica is set up."""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', None)
+    if alias and alias in connections.settings:
+        return alias
+    return None
+
+
+@contextmanager
+def replica_reads():
+    """Route reads made inside the block to the replica."""
+    token = _replica_scope.set(True)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+
+def pin_to_primary(response, user_id):
+    """Hand the client a pin keeping ``user_id``'s reads on the primary for a while."""
+    pin = _pin_signer.sign(str(user_id))
+    response.set_cookie(PIN_COOKIE, pin, max_age=pin_seconds(), httponly=True, samesite='Lax')
+    response[PIN_HEADER] = pin
+
+
+def is_pinned(request, user_id):
+    """Whether ``request`` carries a current pin for ``user_id``."""
+    pin = request.META.get('HTTP_X_REPLICA_PIN') or request.COOKIES.get(PIN_COOKIE)
+    if user_id is None or not pin:
+        return False
+    try:
+        return _pin_signer.unsign(pin, max_age=pin_seconds()) == str(user_id)
+    except signing.BadSignature:
+        return False
+
+
+def pin_after_write(user):
+    """
+    A pin for ``user`` once the current request has written to the primary,
+    for work it runs itself (batched sub-requests); ``None`` before that or
+    without a replica.
+    """
+    if replica_alias() and _wrote_primary.get() and user is not None and user.is_authenticated:
+        return _pin_signer.sign(str(user.pk))
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_scope.get():
+            return None
+        # Reads inside an open transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        _wrote_primary.set(True)
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and never migrated directly
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Pin users to the primary for a short window after a request that wrote."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _wrote_primary.set(False)
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            if _wrote_primary.get() and replica_alias() and user is not None and user.is_authenticated:
+                pin_to_primary(response, user.pk)
+            return response
+        finally:
+            _wrote_primary.reset(token)
+
+
+class ReplicaReadMixin:
+    """
+    For DRF views whose reads can be served by the replica.
+
+    The scope opens after authentication, so the user lookup and the pin
+    check always hit the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if replica_alias() and not is_pinned(request, request.user.pk):
+            self._replica_token = _replica_scope.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _replica_scope.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
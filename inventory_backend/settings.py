@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_config
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -46,18 +49,25 @@ INSTALLED_APPS = [
     'products',
     'pos',
     'reports',
+    'archive',
+    'changefeed',
+    'promotions',
 
 ]
 
 MIDDLEWARE = [
+    'inventory_backend.metrics.RequestMetricsMiddleware',
+    'inventory_backend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory_backend.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'inventory_backend.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_backend.urls'
@@ -65,9 +75,12 @@ ROOT_URLCONF = 'inventory_backend.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'inventory_backend' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
+            'libraries': {
+                'large_tables': 'inventory_backend.templatetags.large_tables',
+            },
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -82,14 +95,27 @@ WSGI_APPLICATION = 'inventory_backend.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Selected with DB_ENGINE (sqlite or postgresql); see inventory_backend/database.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config('DB', default_name=BASE_DIR / 'db.sqlite3'),
 }
 
+# Optional read replica for reports and analytics, configured with the same
+# variables prefixed DB_REPLICA_ (e.g. DB_REPLICA_NAME=replica.sqlite3 locally)
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = database_config('DB_REPLICA')
+    # Read-only: never take the write lock up front
+    DATABASES['replica']['OPTIONS'].pop('transaction_mode', None)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+REPLICA_DATABASE_ALIAS = 'replica'
+DATABASE_ROUTERS = ['inventory_backend.routers.ReplicaRouter']
+
+# Seconds a user stays on the primary after a request that wrote; the pin
+# is a signed cookie / X-Replica-Pin header, so every worker honours it
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 15))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -133,13 +159,27 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework configuration
+# MessagePack bodies (Accept / Content-Type: application/msgpack) are only
+# negotiated when the msgpack package is installed
+MSGPACK_RENDERERS = ('inventory_backend.renderers.MessagePackRenderer',) if find_spec('msgpack') else ()
+MSGPACK_PARSERS = ('inventory_backend.parsers.MessagePackParser',) if find_spec('msgpack') else ()
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'inventory_backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ) + MSGPACK_RENDERERS,
+    'DEFAULT_PARSER_CLASSES': (
+        'rest_framework.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ) + MSGPACK_PARSERS,
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
@@ -150,12 +190,79 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.VersionedTokenRefreshSerializer',
 }
 
+# A cache every worker shares, e.g. redis://cache:6379/0 (needs the redis
+# package). Without one each process has its own in-memory cache.
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+
+# Seconds an authenticated user stays in the per-process cache; 0 disables it.
+# Cached users are checked against the token version in the shared cache, so
+# it is off by default unless CACHE_URL is set (see accounts/authentication.py)
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 30 if CACHE_URL else 0))
+
+# Request metrics (served at /metrics, see inventory_backend/metrics.py)
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+METRICS_QUERY_BUDGET = int(os.environ.get('METRICS_QUERY_BUDGET', 50))
+METRICS_QUERY_BUDGETS = {}
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = 5
+# Who may scrape /metrics: these client addresses (REMOTE_ADDR, so the
+# proxy's address behind one), or any client sending "Bearer <METRICS_TOKEN>"
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()
+]
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# On-demand profiling of single requests by admins (X-Profile header or
+# ?_profile=, see inventory_backend/profiling.py)
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '1') != '0'
+PROFILER_DIR = os.environ.get('PROFILER_DIR', BASE_DIR / 'profiles')
+PROFILER_RETENTION = int(os.environ.get('PROFILER_RETENTION', 20))
+PROFILER_SAMPLE_INTERVAL = 0.001
+PROFILER_MAX_QUERIES = 1000
+
+# Import pandas/openpyxl at startup instead of on the first export; for
+# workers that serve reports
+PRELOAD_REPORT_LIBS = os.environ.get('PRELOAD_REPORT_LIBS', '0') == '1'
+
+# Seconds a serialized catalog page stays in the cache (see inventory_backend/caching.py)
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
+# Location for sales, restocks and ledger rows that do not name one (see products/stock.py)
+DEFAULT_LOCATION_CODE = os.environ.get('DEFAULT_LOCATION_CODE', 'MAIN')
+
+# Seconds an open cart's stock reservations last after its last scan
+# (see products/reservations.py); run release_reservations to sweep them
+STOCK_RESERVATION_SECONDS = int(os.environ.get('STOCK_RESERVATION_SECONDS', 900))
+
+# Change feed (see changefeed/views.py). Streams close after
+# CHANGEFEED_STREAM_SECONDS and clients resume from their last event id.
+CHANGEFEED_POLL_INTERVAL = float(os.environ.get('CHANGEFEED_POLL_INTERVAL', 1.0))
+CHANGEFEED_STREAM_SECONDS = int(os.environ.get('CHANGEFEED_STREAM_SECONDS', 300))
+CHANGEFEED_HEARTBEAT_SECONDS = 15
+CHANGEFEED_RETRY_SECONDS = 3
+CHANGEFEED_LONG_POLL_SECONDS = 25
+
+# Batched API calls (see inventory_backend/batch.py). Sub-requests run in
+# order on one connection unless BATCH_READ_WORKERS allows concurrent GETs.
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+BATCH_READ_WORKERS = int(os.environ.get('BATCH_READ_WORKERS', 0))
+
+# Responses of at least COMPRESSION_MIN_BYTES are compressed with the best
+# encoding the client accepts: zstd and br when zstandard / brotli are
+# installed, gzip always (see inventory_backend/compression.py)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
 
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+# Read-your-writes pin handed out after writes (see inventory_backend/routers.py)
+CORS_EXPOSE_HEADERS = ['X-Replica-Pin']
\ No newline at end of file
@@ -0,0 +1,7 @@
+from django import template
+
+from inventory_backend.admin import indexed_date_hierarchy
+
+register = template.Library()
+
+register.inclusion_tag('admin/date_hierarchy.html')(indexed_date_hierarchy)
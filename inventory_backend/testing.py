@@ -0,0 +1,169 @@
+"""
+Query-budget checks for API endpoints.
+
+A test case mixing in ``QueryBudgetMixin`` declares its endpoints with
+``Endpoint``. The mixin seeds a small data set, requests every endpoint,
+grows the data set and requests them again. Each endpoint must run exactly
+its declared budget of queries at both sizes, so a change that adds a query
+and one that saves one both show up as a budget to update. When the count
+grows with the rows, the failure lists the SQL statements that repeated,
+which is what an N+1 looks like.
+"""
+import json
+import re
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from accounts.authentication import user_cache
+from accounts.models import CustomUser
+
+PASSWORD = 'budget-password'
+
+# Named routes no budget test covers: browsable-API root, one-off setup, /metrics
+UNBUDGETED_ROUTES = {'api-root', 'create_initial_users', 'metrics'}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'IN \((?:\?(?:, )?)+\)')
+
+
+def named_routes(patterns, namespace=None):
+    """Every named URL route outside the admin."""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name:
+                names.add(f'{namespace}:{pattern.name}' if namespace else pattern.name)
+        elif pattern.namespace != 'admin':
+            names |= named_routes(pattern.url_patterns, pattern.namespace or namespace)
+    return names
+
+
+def normalize_sql(sql):
+    """Collapse literals so statements that differ only in their values compare equal."""
+    sql = _LITERALS.sub('?', sql.replace('%s', '?'))
+    return _IN_LISTS.sub('IN (...)', sql)
+
+
+def repeated_queries(queries, limit=5):
+    counts = Counter(normalize_sql(query['sql']) for query in queries)
+    return [(count, sql) for sql, count in counts.most_common(limit) if count > 1]
+
+
+def read_stream(response):
+    """The body of a streaming response, sync or async."""
+    if not response.is_async:
+        return b''.join(response.streaming_content)
+
+    async def collect():
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    return async_to_sync(collect)()
+
+
+class Endpoint:
+    """
+    One request to check. ``kwargs``, ``query`` and ``data`` may be callables
+    taking the test case, for values that only exist once data is seeded.
+    """
+
+    def __init__(self, name, route, budget, method='GET', kwargs=None, query=None, data=None,
+                 authenticated=True, status=200):
+        self.name = name
+        self.route = route
+        self.budget = budget
+        self.method = method
+        self.kwargs = kwargs or {}
+        self.query = query or {}
+        self.data = data
+        self.authenticated = authenticated
+        self.status = status
+
+    def resolve(self, value, case):
+        return value(case) if callable(value) else value
+
+
+class QueryBudgetMixin:
+    """Mix into an ``APITestCase``; see the module docstring."""
+
+    endpoints = []
+    small = 3
+    large = 12
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user('budget', password=PASSWORD, user_type='admin')
+        self.seeded = 0
+
+    def seed(self, count):
+        """Add ``count`` more products, sales and ledger rows."""
+        from pos.seeding import DataSeeder
+
+        DataSeeder(
+            categories=2, products=count, sales=count * 2, years=7 / 365, max_items=3, cashiers=2,
+            seed=self.seeded + 1, prefix=f'QB{self.seeded}',
+        ).run()
+        self.seeded += count
+
+    def first_id(self, model):
+        return model.objects.order_by('id').values_list('id', flat=True).first()
+
+    def window(self):
+        today = timezone.localdate()
+        return {'start_date': (today - timedelta(days=6)).isoformat(), 'end_date': today.isoformat()}
+
+    def request(self, endpoint):
+        if endpoint.authenticated:
+            self.client.force_authenticate(self.user)
+        else:
+            self.client.force_authenticate(None)
+        url = reverse(endpoint.route, kwargs=endpoint.resolve(endpoint.kwargs, self))
+        query = endpoint.resolve(endpoint.query, self)
+        data = endpoint.resolve(endpoint.data, self)
+
+        # Commit hooks (stock totals) count towards the request
+        with CaptureQueriesContext(connection) as captured, self.captureOnCommitCallbacks(execute=True):
+            if endpoint.method == 'GET':
+                response = self.client.get(url, query)
+            else:
+                response = self.client.generic(
+                    endpoint.method, url, json.dumps(data), content_type='application/json'
+                )
+            if response.streaming:
+                read_stream(response)
+        self.assertEqual(
+            response.status_code, endpoint.status,
+            f'{endpoint.name}: unexpected status {response.status_code}',
+        )
+        return captured.captured_queries
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        if not self.endpoints:
+            return
+        self.seed(self.small)
+        small = {endpoint.name: self.request(endpoint) for endpoint in self.endpoints}
+        self.seed(self.large - self.small)
+        large = {endpoint.name: self.request(endpoint) for endpoint in self.endpoints}
+
+        for endpoint in self.endpoints:
+            with self.subTest(endpoint=endpoint.name):
+                before, after = small[endpoint.name], large[endpoint.name]
+                if len(before) == len(after) == endpoint.budget:
+                    continue
+                lines = [
+                    f'{endpoint.name} ran {len(before)} queries with {self.small} rows and '
+                    f'{len(after)} with {self.large} rows (budget {endpoint.budget}).'
+                ]
+                repeated = repeated_queries(after)
+                if repeated:
+                    lines.append('Repeated queries:')
+                    lines.extend(f'  {count}x {sql}' for count, sql in repeated)
+                self.fail('\n'.join(lines))
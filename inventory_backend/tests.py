@@ -0,0 +1,742 @@
+import gzip
+import json
+import os
+import pstats
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf, skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from accounts.authentication import user_cache
+from accounts.models import CustomUser
+from accounts.tests import AuthQueryBudgetTests
+from accounts.tokens import VersionedRefreshToken
+from changefeed.tests import ChangefeedQueryBudgetTests
+from pos.models import Sale, SaleItem
+from pos.seeding import DataSeeder
+from pos.serializers import SaleListSerializer
+from pos.tests import SaleQueryBudgetTests
+from products.tests import ProductQueryBudgetTests
+from promotions.tests import PromotionQueryBudgetTests
+from reports.tests import ReportQueryBudgetTests
+from products.models import Category, Product, StockTransaction
+from products.serializers import ProductListSerializer, StockTransactionListSerializer
+from . import routers
+from .admin import EstimatedCountPaginator
+from .database import database_config
+from .dates import day_start
+from .metrics import MetricsRegistry, collect, registry, render
+from .compression import accepted_weights, available_encodings, choose_encoding
+from .renderers import ORJSONRenderer, msgpack
+from .routers import PIN_COOKIE, PIN_HEADER, ReplicaRouter, is_pinned, pin_to_primary, replica_reads
+from .testing import UNBUDGETED_ROUTES, Endpoint, QueryBudgetMixin, named_routes
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def config(self, environ, **kwargs):
+        with mock.patch.dict(os.environ, environ, clear=True):
+            return database_config(**kwargs)
+
+    def test_sqlite_is_the_tuned_default(self):
+        config = self.config({}, default_name='app.sqlite3')
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual((config['NAME'], config['CONN_MAX_AGE']), ('app.sqlite3', 600))
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(config['OPTIONS']['timeout'], 20)
+        pragmas = config['OPTIONS']['init_command'].split(';')
+        self.assertIn('PRAGMA journal_mode=WAL', pragmas)
+        self.assertIn(f'PRAGMA mmap_size={256 * 1024 * 1024}', pragmas)
+        self.assertIn(f'PRAGMA cache_size=-{64 * 1024}', pragmas)
+
+    def test_sqlite_pragmas_apply_to_a_real_connection(self):
+        config = self.config({'DB_SQLITE_CACHE_KIB': '1024'})
+        with tempfile.TemporaryDirectory() as directory:
+            raw = sqlite3.connect(os.path.join(directory, 'tuned.sqlite3'))
+            try:
+                raw.executescript(config['OPTIONS']['init_command'])
+                self.assertEqual(raw.execute('PRAGMA journal_mode').fetchone(), ('wal',))
+                self.assertEqual(raw.execute('PRAGMA cache_size').fetchone(), (-1024,))
+            finally:
+                raw.close()
+
+    def test_sqlite_tuning_can_be_turned_off_and_overridden(self):
+        config = self.config({'DB_SQLITE_TUNING': 'off', 'DB_CONN_MAX_AGE': '0', 'DB_NAME': 'other.sqlite3'})
+        self.assertEqual(config['OPTIONS'], {})
+        self.assertEqual((config['NAME'], config['CONN_MAX_AGE']), ('other.sqlite3', 0))
+        config = self.config({'DB_SQLITE_BUSY_TIMEOUT': '5'})
+        self.assertEqual(config['OPTIONS']['timeout'], 5)
+
+    def test_postgresql_pools_connections_by_default(self):
+        config = self.config({
+            'DB_ENGINE': 'PostgreSQL', 'DB_NAME': 'shop', 'DB_USER': 'pos', 'DB_HOST': 'db', 'DB_PORT': '5432',
+            'DB_POOL_MAX_SIZE': '50',
+        })
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            (config['NAME'], config['USER'], config['HOST'], config['PORT']), ('shop', 'pos', 'db', '5432'),
+        )
+        # Django refuses pooling together with persistent connections
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 50, 'timeout': 10})
+
+    def test_postgresql_without_pool_keeps_connections(self):
+        config = self.config({'DB_ENGINE': 'postgres', 'DB_POOL': 'false', 'DB_CONN_MAX_AGE': '60'})
+        self.assertEqual(config['OPTIONS'], {})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+
+    def test_prefix_selects_another_alias(self):
+        config = self.config({'DB_REPLICA_ENGINE': 'postgresql', 'DB_REPLICA_NAME': 'replica'}, prefix='DB_REPLICA')
+        self.assertEqual((config['ENGINE'], config['NAME']), ('django.db.backends.postgresql', 'replica'))
+
+    def test_bad_values_are_configuration_errors(self):
+        for environ in (
+            {'DB_ENGINE': 'mysql'}, {'DB_CONN_MAX_AGE': 'forever'},
+            {'DB_ENGINE': 'postgresql', 'DB_POOL_MAX_SIZE': 'x'},
+        ):
+            with self.subTest(environ), self.assertRaises(ImproperlyConfigured):
+                self.config(environ)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('inventory_backend.routers.replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ReplicaRouter()
+
+    def test_reads_use_the_replica_only_inside_a_replica_scope(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_reads_stay_on_the_primary_without_a_replica(self):
+        with mock.patch('inventory_backend.routers.replica_alias', return_value=None), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_reads_in_an_open_transaction_stay_on_the_primary(self):
+        with mock.patch.object(connection, 'in_atomic_block', True), replica_reads():
+            self.assertIsNone(self.router.db_for_read(Product))
+
+    def test_the_replica_is_never_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica', 'products'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'products'))
+
+
+class ReplicaPinTests(SimpleTestCase):
+    def pin(self, user_id):
+        response = HttpResponse()
+        pin_to_primary(response, user_id)
+        return response
+
+    def test_a_pin_is_handed_out_as_a_cookie_and_a_header(self):
+        response = self.pin(7)
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie.value, response[PIN_HEADER])
+        self.assertEqual(cookie['max-age'], 15)
+        self.assertTrue(cookie['httponly'])
+
+    def test_the_pin_is_honoured_from_either_carrier(self):
+        pin = self.pin(7)[PIN_HEADER]
+        factory = RequestFactory()
+        self.assertTrue(is_pinned(factory.get('/', HTTP_X_REPLICA_PIN=pin), 7))
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = pin
+        self.assertTrue(is_pinned(request, 7))
+        self.assertFalse(is_pinned(factory.get('/'), 7))
+
+    def test_pins_are_per_user_and_tamper_proof(self):
+        pin = self.pin(7)[PIN_HEADER]
+        factory = RequestFactory()
+        self.assertFalse(is_pinned(factory.get('/', HTTP_X_REPLICA_PIN=pin), 8))
+        self.assertFalse(is_pinned(factory.get('/', HTTP_X_REPLICA_PIN=pin), None))
+        forged = pin.replace('7:', '8:', 1)
+        self.assertFalse(is_pinned(factory.get('/', HTTP_X_REPLICA_PIN=forged), 8))
+
+    @override_settings(REPLICA_PIN_SECONDS=15)
+    def test_pins_expire(self):
+        pin = self.pin(7)[PIN_HEADER]
+        request = RequestFactory().get('/', HTTP_X_REPLICA_PIN=pin)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 16):
+            self.assertFalse(is_pinned(request, 7))
+
+
+class ReplicaPinningTests(APITestCase):
+    """Requests routed with a replica configured; which reads opened a replica scope is recorded."""
+
+    def setUp(self):
+        patcher = mock.patch('inventory_backend.routers.replica_alias', return_value='replica')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = CustomUser.objects.create_user('admin', user_type='admin')
+        self.client.force_authenticate(self.admin)
+
+    def scoped_reads(self, response_for):
+        scoped = []
+        read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            scoped.append(routers._replica_scope.get())
+            return read(router, model, **hints)
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record):
+            response = response_for()
+        self.assertEqual(response.status_code, 200)
+        return scoped
+
+    def test_report_reads_go_to_the_replica(self):
+        scoped = self.scoped_reads(lambda: self.client.get(reverse('product_reports')))
+        self.assertTrue(scoped)
+        self.assertTrue(all(scoped))
+
+    def test_other_reads_stay_on_the_primary(self):
+        scoped = self.scoped_reads(lambda: self.client.get(reverse('product-list')))
+        self.assertTrue(scoped)
+        self.assertFalse(any(scoped))
+
+    def test_a_write_pins_the_user_to_the_primary(self):
+        response = self.client.post(reverse('category-list'), {'name': 'Snacks'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIn(PIN_HEADER, response)
+
+        # The test client sends the cookie back
+        scoped = self.scoped_reads(lambda: self.client.get(reverse('product_reports')))
+        self.assertFalse(any(scoped))
+        # As does a client echoing the header
+        self.client.cookies.clear()
+        scoped = self.scoped_reads(
+            lambda: self.client.get(reverse('product_reports'), HTTP_X_REPLICA_PIN=response[PIN_HEADER])
+        )
+        self.assertFalse(any(scoped))
+
+    def test_a_write_in_a_batch_pins_the_entries_after_it(self):
+        report = {'url': '/api/reports/products/'}
+        write = {'method': 'POST', 'url': '/api/categories/', 'body': {'name': 'Snacks'}}
+        batch = lambda *requests: self.client.post(reverse('batch'), {'requests': list(requests)}, format='json')
+        scoped = self.scoped_reads(lambda: batch(report))
+        self.assertTrue(scoped)
+        self.assertTrue(all(scoped))
+        # The report after the write reads the primary, as the write's own pin would make it
+        scoped = self.scoped_reads(lambda: batch(write, report))
+        self.assertTrue(scoped)
+        self.assertFalse(any(scoped))
+        self.assertEqual(Category.objects.get().name, 'Snacks')
+
+    def test_reads_do_not_pin(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertNotIn(PIN_HEADER, response)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_histograms_are_cumulative(self):
+        metrics = MetricsRegistry()
+        metrics.observe('http_request_db_queries', (('route', 'r'),), 3)
+        metrics.observe('http_request_db_queries', (('route', 'r'),), 30)
+        histogram = metrics.histograms[('http_request_db_queries', (('route', 'r'),))]
+        self.assertEqual(histogram['buckets'], [0, 0, 1, 1, 1, 2, 2, 2, 2])
+        self.assertEqual((histogram['sum'], histogram['count']), (33, 2))
+
+    def test_snapshots_merge_into_a_sum(self):
+        one, two = MetricsRegistry(), MetricsRegistry()
+        for metrics, queries in ((one, 1), (two, 100)):
+            metrics.inc('http_requests_total', (('route', 'r'),), 2)
+            metrics.observe('http_request_db_queries', (('route', 'r'),), queries)
+        one.merge(json.loads(json.dumps(two.snapshot())))
+        self.assertEqual(one.counters[('http_requests_total', (('route', 'r'),))], 4)
+        histogram = one.histograms[('http_request_db_queries', (('route', 'r'),))]
+        self.assertEqual(histogram['buckets'], [1, 1, 1, 1, 1, 1, 2, 2, 2])
+        self.assertEqual(histogram['count'], 2)
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+
+    def requests_total(self, route, status='200'):
+        counters, _ = collect()
+        return counters.get(('http_requests_total', (('route', route), ('method', 'GET'), ('status', status))), 0)
+
+    def test_requests_are_recorded_by_route(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))
+        self.assertEqual(self.requests_total('product-list'), 2)
+        _, histograms = collect()
+        self.assertEqual(histograms[('http_request_db_queries', (('route', 'product-list'),))]['count'], 2)
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_requests_total{route="product-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{route="product-list"} 2', body)
+        self.assertEqual(self.requests_total('metrics'), 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse('product-list'))
+        self.assertEqual(self.requests_total('product-list'), 0)
+
+    @override_settings(METRICS_QUERY_BUDGETS={'product-list': 0})
+    def test_requests_over_their_query_budget_are_counted(self):
+        with self.assertLogs('inventory_backend.metrics', 'WARNING'):
+            self.client.get(reverse('product-list'))
+        counters, _ = collect()
+        self.assertEqual(counters[('http_requests_over_query_budget_total', (('route', 'product-list'),))], 1)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.9'], METRICS_TOKEN='scrape-me')
+    def test_scraping_is_limited_to_the_allowlist_or_the_token(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.9').status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200
+        )
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer guess').status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN=None)
+    def test_no_token_configured_lets_no_one_in_by_header(self):
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+
+
+class MultiprocessMetricsTests(SimpleTestCase):
+    """Snapshots of several workers; pids 100 and 200 play a live and an exited one."""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(METRICS_MULTIPROC_DIR=self.directory))
+        self.enterContext(
+            mock.patch('inventory_backend.metrics.pid_alive', side_effect=lambda pid: pid in (100, os.getpid()))
+        )
+
+    def write(self, pid, requests, absorbed=()):
+        metrics = MetricsRegistry()
+        metrics.inc('http_requests_total', (('route', 'r'),), requests)
+        metrics.absorbed.update(absorbed)
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as fh:
+            json.dump(metrics.snapshot(), fh)
+
+    def total(self):
+        counters, _ = collect()
+        return counters.get(('http_requests_total', (('route', 'r'),)), 0)
+
+    def test_workers_are_summed(self):
+        self.write(100, 3)
+        registry.inc('http_requests_total', (('route', 'r'),), 2)
+        self.assertEqual(self.total(), 5)
+
+    def test_exited_workers_are_taken_over_at_startup(self):
+        self.write(100, 3)
+        self.write(200, 4)
+        self.assertEqual(self.total(), 7)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['100.json', f'{os.getpid()}.json'])
+        self.assertEqual(registry.counters[('http_requests_total', (('route', 'r'),))], 4)
+        self.assertEqual(registry.absorbed, set())
+
+        # Only at startup: a later exit waits for the next worker to start
+        self.write(200, 1)
+        self.assertEqual(self.total(), 8)
+        self.assertIn('200.json', os.listdir(self.directory))
+
+    def test_a_snapshot_left_under_a_reused_pid_is_kept(self):
+        self.write(os.getpid(), 6)
+        registry.inc('http_requests_total', (('route', 'r'),), 1)
+        self.assertEqual(self.total(), 7)
+
+    def test_absorbed_snapshots_are_not_counted_twice(self):
+        # A worker died after writing its snapshot but before deleting 200.json
+        self.write(100, 7, absorbed=[200])
+        self.write(200, 4)
+        registry.last_flush = 1.0
+        self.assertEqual(self.total(), 7)
+
+
+class DateWindowTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('clerk'))
+        day = date(2024, 1, 1)
+        for number, moment in enumerate([
+            day_start(day) - timedelta(microseconds=1), day_start(day),
+            day_start(day) + timedelta(hours=23, minutes=59), day_start(day + timedelta(days=1)),
+        ]):
+            sale = Sale.objects.create(sale_number=f'S-{number}', total_amount=1, final_amount=1)
+            Sale.objects.filter(id=sale.id).update(created_at=moment)
+
+    def test_one_day_window_covers_exactly_that_local_day(self):
+        response = self.client.get(reverse('sale-list'), {'start_date': '2024-01-01', 'end_date': '2024-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(sale['sale_number'] for sale in response.data['results']), ['S-1', 'S-2'])
+
+    def test_bad_dates_are_rejected_with_the_parameter_name(self):
+        for name, kwargs in (
+            ('sale-list', {}), ('product_reports', {}), ('download_report', {'report_type': 'sales'}),
+        ):
+            with self.subTest(name):
+                response = self.client.get(
+                    reverse(name, kwargs=kwargs), {'start_date': '2024-13-01', 'end_date': '2024-01-01'},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('start_date', response.data)
+
+
+class ProfilerTestMixin:
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(PROFILER_DIR=directory))
+        self.directory = directory
+
+    def bearer(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {VersionedRefreshToken.for_user(user).access_token}'}
+
+    def profiled_request(self, user, mode='cprofile'):
+        return self.client.get(reverse('product-list'), HTTP_X_PROFILE=mode, **self.bearer(user))
+
+
+class ProfilerTests(ProfilerTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = CustomUser.objects.create_user('admin', password='x', user_type='admin')
+        self.worker = CustomUser.objects.create_user('worker', password='x', user_type='worker')
+
+    def test_unprofiled_requests_write_nothing(self):
+        response = self.client.get(reverse('product-list'), **self.bearer(self.admin))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_non_admins_are_not_profiled(self):
+        response = self.profiled_request(self.worker)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_cprofile_capture_with_sql_log(self):
+        response = self.profiled_request(self.admin)
+        profile_id = response['X-Profile-Id']
+
+        detail = self.client.get(reverse('profile_detail', args=[profile_id]), **self.bearer(self.admin))
+        self.assertEqual(detail.data['mode'], 'cprofile')
+        self.assertEqual(detail.data['status'], 200)
+        self.assertGreater(detail.data['query_count'], 0)
+        self.assertIn('products_product', detail.data['queries'][-1]['sql'])
+
+        download = self.client.get(reverse('profile_download', args=[profile_id]), **self.bearer(self.admin))
+        path = os.path.join(self.directory, 'downloaded.prof')
+        with open(path, 'wb') as fh:
+            fh.write(b''.join(download.streaming_content))
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+    def test_sampling_capture_via_query_parameter(self):
+        response = self.client.get(
+            reverse('product-list'), {'_profile': 'sampling'}, **self.bearer(self.admin)
+        )
+        download = self.client.get(
+            reverse('profile_download', args=[response['X-Profile-Id']]), **self.bearer(self.admin)
+        )
+        document = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(document['profiles'][0]['type'], 'sampled')
+
+    @override_settings(PROFILER_RETENTION=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        ids = [self.profiled_request(self.admin)['X-Profile-Id'] for _ in range(3)]
+        listed = self.client.get(reverse('profile_list'), **self.bearer(self.admin)).data['profiles']
+        self.assertEqual([profile['id'] for profile in listed], ids[:0:-1])
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_profiles_are_admin_only(self):
+        profile_id = self.profiled_request(self.admin)['X-Profile-Id']
+        for url in (reverse('profile_list'), reverse('profile_detail', args=[profile_id])):
+            self.assertEqual(self.client.get(url, **self.bearer(self.worker)).status_code, 403)
+
+
+class ProfilerQueryBudgetTests(ProfilerTestMixin, QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('profile-list', 'profile_list', budget=0),
+        Endpoint('profile-detail', 'profile_detail', budget=0,
+                 kwargs=lambda case: {'profile_id': case.profile_id}),
+        Endpoint('profile-download', 'profile_download', budget=0,
+                 kwargs=lambda case: {'profile_id': case.profile_id}),
+    ]
+
+    def seed(self, count):
+        super().seed(count)
+        self.profile_id = self.profiled_request(self.user)['X-Profile-Id']
+
+
+class BatchQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('batch', 'batch', budget=10, method='POST', data={'requests': [
+            {'url': '/api/auth/me/'}, {'url': '/api/categories/'}, {'url': '/api/products/'},
+            {'url': '/api/sales/'},
+        ]}),
+    ]
+
+
+BUDGET_TESTS = [
+    AuthQueryBudgetTests, ProductQueryBudgetTests, SaleQueryBudgetTests, ReportQueryBudgetTests,
+    ProfilerQueryBudgetTests, ChangefeedQueryBudgetTests, PromotionQueryBudgetTests, BatchQueryBudgetTests,
+]
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('till', password='x')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Drinks')
+
+    def batch(self, *requests, **extra):
+        response = self.client.post(reverse('batch'), {'requests': list(requests)}, format='json', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['responses']
+
+    def test_startup_calls_in_one_round_trip(self):
+        me, categories, missing = self.batch(
+            {'id': 'me', 'url': '/api/auth/me/'},
+            {'url': '/api/categories/'},
+            {'url': '/api/nothing-here/'},
+        )
+        self.assertEqual((me['id'], me['status'], me['body']['username']), ('me', 200, 'till'))
+        self.assertEqual(categories['id'], '1')
+        self.assertEqual([row['name'] for row in categories['body']['results']], ['Drinks'])
+        self.assertEqual(missing['status'], 404)
+
+    def test_failures_stay_in_their_entry_and_writes_are_seen_by_later_reads(self):
+        bad, created, listed = self.batch(
+            {'method': 'POST', 'url': '/api/sales/create_sale/', 'body': {'items': []}},
+            {'method': 'POST', 'url': '/api/categories/', 'body': {'name': 'Snacks'}},
+            {'url': '/api/categories/'},
+        )
+        self.assertEqual(bad['status'], 400)
+        self.assertIn('items', bad['body'])
+        self.assertEqual(created['status'], 201)
+        self.assertEqual(created['body']['name'], 'Snacks')
+        self.assertEqual(listed['body']['count'], 2)
+
+    def test_conditional_headers_are_per_entry(self):
+        first, = self.batch({'url': '/api/products/'})
+        etag = first['headers']['ETag']
+        again, = self.batch({'url': '/api/products/', 'headers': {'If-None-Match': etag}})
+        self.assertEqual((again['status'], again['body']), (304, None))
+
+    def test_entries_are_json_whatever_the_batch_accepts(self):
+        accepts = ['text/html', 'text/html, application/json;q=0.5']
+        if msgpack is not None:
+            accepts.append('application/msgpack')
+        for accept in accepts:
+            categories, = self.batch({'url': '/api/categories/'}, HTTP_ACCEPT=accept)
+            self.assertEqual(categories['status'], 200, accept)
+            self.assertEqual(categories['body']['count'], 1)
+
+    def test_streams_and_downloads_are_refused(self):
+        stream, download = self.batch({'url': '/api/changes/stream/'}, {'url': '/api/reports/download/inventory/'})
+        self.assertEqual((stream['status'], download['status']), (400, 400))
+
+    def test_batches_are_validated(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(reverse('batch'), {'requests': []}, format='json').status_code, 401)
+        self.client.force_authenticate(self.user)
+        for requests in ([], [{'url': '/api/batch/'}], [{'url': '/admin/'}], [{'url': '/api/me/'}] * 21):
+            response = self.client.post(reverse('batch'), {'requests': requests}, format='json')
+            self.assertEqual(response.status_code, 400, requests[:1])
+
+
+@override_settings(BATCH_READ_WORKERS=3)
+class ConcurrentBatchTests(APITransactionTestCase):
+    def test_reads_run_on_worker_threads(self):
+        user = CustomUser.objects.create_user('till', password='x', user_type='admin')
+        self.client.force_authenticate(user)
+        Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+        requests = [
+            {'url': '/api/products/'},
+            {'url': '/api/categories/'},
+            {'method': 'POST', 'url': '/api/categories/', 'body': {'name': 'Snacks'}},
+            {'url': '/api/categories/'},
+            {'url': '/api/auth/me/'},
+        ]
+        responses = self.client.post(reverse('batch'), {'requests': requests}, format='json').json()['responses']
+        self.assertEqual([entry['status'] for entry in responses], [200, 200, 201, 200, 200])
+        self.assertEqual(responses[0]['body']['results'][0]['name'], 'Cola')
+        self.assertEqual([entry['body']['count'] for entry in (responses[1], responses[3])], [0, 1])
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+        for index in range(30):
+            Product.objects.create(name=f'Item {index}', sku=f'ITEM-{index}', price='2.00', cost_price='1.00')
+
+    def test_gzip_when_accepted(self):
+        plain = self.client.get(reverse('product-list'))
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+    def test_identity_when_not_accepted_or_small(self):
+        for encoding in ('', 'gzip;q=0', 'identity'):
+            response = self.client.get(reverse('product-list'), HTTP_ACCEPT_ENCODING=encoding)
+            self.assertFalse(response.has_header('Content-Encoding'), encoding)
+        response = self.client.get(reverse('get_current_user'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streams_are_not_compressed(self):
+        with override_settings(CHANGEFEED_STREAM_SECONDS=0):
+            response = self.client.get(reverse('changefeed_stream'), {'after': 0}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_encoding_choice_follows_weights_then_preference(self):
+        self.assertEqual(accepted_weights('gzip;q=0.5, br, *;q=0'), {'gzip': 0.5, 'br': 1.0, '*': 0.0})
+        encodings = [('zstd', None), ('br', None), ('gzip', None)]
+        choice = lambda header: (choose_encoding(header, encodings) or (None,))[0]
+        self.assertEqual(choice('gzip, br, zstd'), 'zstd')
+        self.assertEqual(choice('gzip, br;q=0.9'), 'gzip')
+        self.assertEqual(choice('*'), 'zstd')
+        self.assertEqual(choice('deflate'), None)
+        self.assertEqual(available_encodings()[-1][0], 'gzip')
+
+
+def render_both(fast, queryset):
+    """
+    Render ``queryset`` through ``fast.serializer_class`` with DRF's renderer
+    and through the values() fast path with the configured renderer.
+    """
+    expected = JSONRenderer().render(fast.serializer_class(queryset, many=True).data)
+    actual = ORJSONRenderer().render(fast.serialize(fast.values(queryset)))
+    return expected, actual
+
+
+class FastPathSerializerTests(APITestCase):
+    def setUp(self):
+        DataSeeder(categories=2, products=6, sales=10, years=7 / 365, seed=3, prefix='FAST').run()
+        orphan = Product.objects.create(
+            name='Caf\u00e9 \u2028 \u201cspecial\u201d', sku='ORPHAN-1', price='0.10', cost_price='0.05',
+            current_stock=2,
+        )
+        StockTransaction.objects.create(product=orphan, transaction_type='adjustment', quantity=1)
+
+    def test_product_output_is_byte_identical(self):
+        queryset = Product.objects.select_related('category').order_by('id')
+        expected, actual = render_both(ProductListSerializer, queryset)
+        self.assertEqual(actual, expected)
+
+    def test_stock_transaction_output_is_byte_identical(self):
+        queryset = StockTransaction.objects.select_related('product', 'created_by').order_by('-created_at')
+        expected, actual = render_both(StockTransactionListSerializer, queryset)
+        self.assertEqual(actual, expected)
+
+    def test_sale_output_is_byte_identical(self):
+        product = Product.objects.first()
+        anonymous = Sale.objects.create(
+            sale_number='NO-CASHIER', total_amount='3.30', final_amount='3.30', notes='Till \u2029 note'
+        )
+        SaleItem.objects.create(sale=anonymous, product=product, quantity=3, unit_price=Decimal('1.10'))
+        Sale.objects.create(sale_number='EMPTY', total_amount=0, final_amount=0)
+
+        queryset = Sale.objects.select_related('cashier').prefetch_related('items__product').order_by('-created_at')
+        expected, actual = render_both(SaleListSerializer, queryset)
+        self.assertEqual(actual, expected)
+
+
+class MessagePackTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('till', user_type='admin'))
+        Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_round_trip(self):
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get(reverse('product-list')).content))
+
+        body = msgpack.packb({'name': 'Snacks', 'description': ''})
+        response = self.client.post(reverse('category-list'), body, content_type='application/msgpack',
+                                    HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(msgpack.unpackb(response.content)['name'], 'Snacks')
+
+    @skipIf(msgpack, 'msgpack is installed')
+    def test_not_offered_without_msgpack(self):
+        response = self.client.get(reverse('product-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 406)
+
+
+class QueryBudgetCoverageTests(SimpleTestCase):
+    def test_every_route_declares_a_query_budget(self):
+        covered = {endpoint.route for case in BUDGET_TESTS for endpoint in case.endpoints}
+        missing = named_routes(get_resolver().url_patterns) - covered - UNBUDGETED_ROUTES
+        self.assertFalse(missing, f'Routes without a query budget test: {sorted(missing)}')
+
+
+class LargeTableAdminTests(TestCase):
+    changelists = [
+        'admin:pos_sale_changelist', 'admin:pos_saleitem_changelist',
+        'admin:products_stocktransaction_changelist', 'admin:products_stocktransfer_changelist',
+        'admin:products_product_changelist', 'admin:changefeed_changeevent_changelist',
+    ]
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser('root', 'root@example.com', 'root-password')
+        self.client.force_login(self.admin)
+
+    def seed(self, sales, prefix):
+        DataSeeder(categories=2, products=10, sales=sales, years=1, cashiers=2, prefix=prefix).run()
+
+    def changelist_queries(self, name, query=''):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(name) + query)
+        self.assertEqual(response.status_code, 200, name)
+        return [entry['sql'] for entry in context.captured_queries]
+
+    def test_changelists_do_not_grow_with_the_tables(self):
+        self.seed(5, 'SMALL')
+        small = {name: len(self.changelist_queries(name)) for name in self.changelists}
+        self.seed(60, 'LARGE')
+        large = {name: len(self.changelist_queries(name)) for name in self.changelists}
+        self.assertEqual(small, large)
+
+    def test_changelist_counts_are_bounded(self):
+        self.seed(5, 'SEED')
+        for name in self.changelists:
+            counts = [sql for sql in self.changelist_queries(name) if 'COUNT(' in sql]
+            self.assertTrue(counts, name)
+            for sql in counts:
+                self.assertIn('LIMIT', sql, name)
+
+    def test_date_hierarchy_drills_down_without_scanning(self):
+        self.seed(20, 'SEED')
+        first = StockTransaction.objects.order_by('created_at').first().created_at
+        name = 'admin:products_stocktransaction_changelist'
+        for query in ('', f'?created_at__year={first.year}',
+                      f'?created_at__year={first.year}&created_at__month={first.month}'):
+            for sql in self.changelist_queries(name, query):
+                self.assertNotIn('DISTINCT', sql, query)
+        response = self.client.get(reverse(name) + f'?created_at__year={first.year}')
+        self.assertContains(response, f'created_at__month={first.month}')
+
+    def test_paginator_estimates_past_the_exact_limit(self):
+        self.seed(20, 'SEED')
+        paginator = EstimatedCountPaginator(StockTransaction.objects.order_by('pk'), 5)
+        paginator.exact_limit = 10
+        # No planner estimate on SQLite: the count stops at the limit
+        self.assertEqual(paginator.count, 10)
+        none = StockTransaction.objects.filter(quantity__lt=0).order_by('pk')
+        self.assertEqual(EstimatedCountPaginator(none, 5).count, 0)
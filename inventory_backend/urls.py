@@ -3,19 +3,33 @@ from django.urls import path, include
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenRefreshView
 from accounts.views import create_initial_users, login, get_current_user
-from products.views import CategoryViewSet, ProductViewSet, StockTransactionViewSet
+from products.views import (
+    CategoryViewSet, LocationViewSet, ProductViewSet, ReservationViewSet, StockTransactionViewSet,
+    StockTransferViewSet,
+)
 from pos.views import SaleViewSet
+from promotions.views import PromotionViewSet
 from reports.views import ProductReportView, DownloadReportView
+from changefeed.views import poll as changefeed_poll, stream as changefeed_stream
+from .batch import batch
+from .metrics import metrics_view
+from .profiling import profile_detail, profile_download, profile_list
 
 router = routers.DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'stock-transactions', StockTransactionViewSet)
+router.register(r'locations', LocationViewSet)
+router.register(r'transfers', StockTransferViewSet)
+router.register(r'reservations', ReservationViewSet, basename='reservation')
 router.register(r'sales', SaleViewSet)
+router.register(r'promotions', PromotionViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
+    path('api/batch/', batch, name='batch'),
     
     # Authentication
     path('api/auth/create-initial-users/', create_initial_users, name='create_initial_users'),
@@ -27,4 +41,13 @@ urlpatterns = [
     path('api/reports/products/', ProductReportView.as_view(), name='product_reports'),
     path('api/reports/products/<int:product_id>/', ProductReportView.as_view(), name='single_product_report'),
     path('api/reports/download/<str:report_type>/', DownloadReportView.as_view(), name='download_report'),
+    
+    # Stock and catalog change feed
+    path('api/changes/', changefeed_poll, name='changefeed_poll'),
+    path('api/changes/stream/', changefeed_stream, name='changefeed_stream'),
+    
+    # Request profiles
+    path('api/profiles/', profile_list, name='profile_list'),
+    path('api/profiles/<str:profile_id>/', profile_detail, name='profile_detail'),
+    path('api/profiles/<str:profile_id>/download/', profile_download, name='profile_download'),
 ]
\ No newline at end of file
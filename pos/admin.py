@@ -1,21 +1,84 @@
 from django.contrib import admin
-from .models import Sale, SaleItem
+from django.db.models import Q
+from inventory_backend.admin import LargeTableAdmin
+from products.models import Product
+from .models import ReceiptTemplate, Refund, RefundItem, Sale, SaleItem
 
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
     extra = 0
-    readonly_fields = ['total_price']
+    readonly_fields = ['total_price', 'returned_quantity']
+    autocomplete_fields = ['product']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
 
 @admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
-    list_display = ['sale_number', 'total_amount', 'final_amount', 'cashier', 'created_at']
-    list_filter = ['created_at', 'cashier']
+class SaleAdmin(LargeTableAdmin):
+    list_display = ['sale_number', 'total_amount', 'final_amount', 'refunded_amount', 'status', 'cashier', 'location', 'created_at']
+    list_select_related = ['cashier', 'location']
+    list_filter = ['status', 'location', 'cashier']
+    date_hierarchy = 'created_at'
     search_fields = ['sale_number']
-    readonly_fields = ['created_at', 'updated_at']
+    # Returns and voids go through the API so stock and refunds stay in step
+    readonly_fields = ['status', 'refunded_amount', 'created_at', 'updated_at']
+    autocomplete_fields = ['cashier', 'location']
     inlines = [SaleItemInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Sale numbers are unique; an exact match uses their index where a
+        # substring search would scan every sale
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(sale_number=search_term), False
+
 @admin.register(SaleItem)
-class SaleItemAdmin(admin.ModelAdmin):
+class SaleItemAdmin(LargeTableAdmin):
     list_display = ['sale', 'product', 'quantity', 'unit_price', 'total_price']
-    list_filter = ['sale__created_at']
-    search_fields = ['sale__sale_number', 'product__name']
\ No newline at end of file
+    list_select_related = ['sale', 'product']
+    date_hierarchy = 'sale__created_at'
+    search_fields = ['sale__sale_number', 'product__name', 'product__sku']
+    autocomplete_fields = ['sale', 'product']
+
+    def get_search_results(self, request, queryset, search_term):
+        # A sale number, or else a product: both reach the items through an
+        # index instead of joining every item to its sale
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if Sale.objects.filter(sale_number=search_term).exists():
+            return queryset.filter(sale__sale_number=search_term), False
+        products = Product.objects.filter(Q(name__icontains=search_term) | Q(sku__iexact=search_term))
+        return queryset.filter(product__in=products.values('id')), False
+
+class RefundItemInline(admin.TabularInline):
+    model = RefundItem
+    extra = 0
+    can_delete = False
+    readonly_fields = ['sale_item', 'product', 'quantity', 'unit_price', 'total_price']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'sale_item__product')
+
+@admin.register(Refund)
+class RefundAdmin(LargeTableAdmin):
+    list_display = ['sale_number', 'kind', 'amount', 'location', 'created_by', 'created_at']
+    list_select_related = ['location', 'created_by']
+    list_filter = ['kind', 'location']
+    date_hierarchy = 'created_at'
+    search_fields = ['sale_number']
+    readonly_fields = ['sale', 'sale_number', 'kind', 'amount', 'location', 'created_by', 'created_at']
+    inlines = [RefundItemInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(sale_number=search_term), False
+
+@admin.register(ReceiptTemplate)
+class ReceiptTemplateAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'width', 'updated_at']
+    list_select_related = ['location']
+    autocomplete_fields = ['location']
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pos.models import Sale
+from pos.seeding import DataSeeder
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog, sale history and stock ledger for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--sales', type=int, default=10000)
+        parser.add_argument('--years', type=float, default=2, help='Length of the sale history.')
+        parser.add_argument('--max-items', type=int, default=5, help='Largest basket size.')
+        parser.add_argument('--cashiers', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert.')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for repeatable data sets.')
+        parser.add_argument('--prefix', default='SEED', help='Prefix for generated names, SKUs and sale numbers.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if Sale.objects.filter(sale_number__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Data with prefix "{prefix}" already exists; pass a different --prefix.')
+
+        seeder = DataSeeder(
+            categories=options['categories'],
+            products=options['products'],
+            sales=options['sales'],
+            years=options['years'],
+            max_items=options['max_items'],
+            cashiers=options['cashiers'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            prefix=prefix,
+            log=lambda message: self.stdout.write(message) if options['verbosity'] > 1 else None,
+        )
+        started = time.perf_counter()
+        counts = seeder.run()
+        elapsed = time.perf_counter() - started
+
+        summary = ', '.join(f'{value} {name.replace("_", " ")}' for name, value in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {summary} in {elapsed:.1f}s'))
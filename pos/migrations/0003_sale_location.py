@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_default_location(apps, schema_editor):
+    Location = apps.get_model('products', 'Location')
+    Sale = apps.get_model('pos', 'Sale')
+    location = Location.objects.filter(code=settings.DEFAULT_LOCATION_CODE).first()
+    if location is not None:
+        Sale.objects.filter(location__isnull=True).update(location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0002_sale_created_index'),
+        ('products', '0004_locations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='products.location'),
+        ),
+        migrations.RunPython(set_default_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pos', '0005_saleitem_promotions'),
+        ('products', '0005_stocktransaction_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('header', models.TextField(blank=True)),
+                ('footer', models.TextField(blank=True)),
+                ('text_template', models.TextField(blank=True)),
+                ('html_template', models.TextField(blank=True)),
+                ('width', models.PositiveSmallIntegerField(default=42, validators=[django.core.validators.MinValueValidator(24)])),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='receipt_template', to='products.location')),
+            ],
+        ),
+    ]
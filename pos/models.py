@@ -1,19 +1,34 @@
 from django.db import models
 from django.core.validators import MinValueValidator
-from products.models import Product
+from products.models import Location, Product
 from accounts.models import CustomUser
 
 class Sale(models.Model):
+    STATUSES = (
+        ('completed', 'Completed'),
+        ('partially_returned', 'Partially returned'),
+        ('returned', 'Returned'),
+        ('voided', 'Voided'),
+    )
+    
     sale_number = models.CharField(max_length=50, unique=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     final_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     cashier = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='sales')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='sales')
     notes = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default='completed')
+    refunded_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='sale_created_idx'),
+        ]
+    
     def __str__(self):
         return f"Sale #{self.sale_number} - ${self.final_amount}"
 
@@ -23,10 +38,79 @@ class SaleItem(models.Model):
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     total_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    # Promotion discount on the line; total_price stays quantity x unit_price
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    promotion = models.ForeignKey('promotions.Promotion', on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='sale_items')
+    returned_quantity = models.PositiveIntegerField(default=0)
+    
+    @property
+    def returnable_quantity(self):
+        return self.quantity - self.returned_quantity
     
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.unit_price
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.quantity}x {self.product.name} - ${self.total_price}"
\ No newline at end of file
+        return f"{self.quantity}x {self.product.name} - ${self.total_price}"
+
+class Refund(models.Model):
+    """
+    Money and stock given back for a sale. Refunds outlive their sale in the
+    hot tables: archiving a sale clears the link and keeps ``sale_number``.
+    """
+    KINDS = (
+        ('return', 'Return'),
+        ('void', 'Void'),
+    )
+    
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, related_name='refunds')
+    sale_number = models.CharField(max_length=50)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='refunds')
+    reason = models.TextField(blank=True)
+    created_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='refunds')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='refund_created_idx'),
+            models.Index(fields=['sale_number'], name='refund_sale_number_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} of sale #{self.sale_number} - ${self.amount}"
+
+class RefundItem(models.Model):
+    refund = models.ForeignKey(Refund, on_delete=models.CASCADE, related_name='items')
+    sale_item = models.ForeignKey(SaleItem, on_delete=models.SET_NULL, null=True, related_name='refund_items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    
+    def __str__(self):
+        return f"{self.quantity}x product #{self.product_id} - ${self.total_price}"
+
+class ReceiptTemplate(models.Model):
+    """
+    How a store's receipts look. The row without a location applies to
+    stores that have none of their own. ``text_template`` and
+    ``html_template`` use Django template syntax (see ``pos/receipts.py`` for
+    the context); left blank, the defaults in ``pos/templates/pos/`` are used.
+    """
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='receipt_template')
+    # Lines printed under the store name: address, phone, tax number
+    header = models.TextField(blank=True)
+    footer = models.TextField(blank=True)
+    text_template = models.TextField(blank=True)
+    html_template = models.TextField(blank=True)
+    # Characters per printed line: 42 on 80mm paper, 32 on 58mm
+    width = models.PositiveSmallIntegerField(default=42, validators=[MinValueValidator(24)])
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Receipt for {self.location}" if self.location_id else "Default receipt"
@@ -0,0 +1,275 @@
+"""
+Receipts rendered by the server, so every till prints the same thing.
+
+A store's ``ReceiptTemplate`` (or the default one) is compiled into a
+``Layout`` once per process: the text and HTML templates and the store
+header and footer, already wrapped and centred to the paper width. Layouts
+are memoized under the template row's id and ``updated_at`` and the
+location's name, so editing a template or renaming a store is picked up by
+every process on its next receipt, at the cost of reading one template row.
+Rendering a receipt is then two queries for the sale and a template render.
+
+The text receipt is laid out in fixed-width columns for receipt printers;
+ESC/POS output is that text wrapped in printer commands, and the PDF is the
+same text set in Courier on a page as wide as the paper roll, written
+directly so no PDF library is needed.
+"""
+import json
+import threading
+import textwrap
+from pathlib import Path
+
+from django.db.models import F, Prefetch, Q
+from django.template import Context, Engine
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+
+from .models import ReceiptTemplate, Sale, SaleItem
+
+DEFAULT_WIDTH = 42
+DEFAULT_FOOTER = 'Thank you!'
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates' / 'pos'
+
+# Plain text must not be HTML-escaped
+TEXT_ENGINE = Engine(autoescape=False)
+HTML_ENGINE = Engine()
+
+_layouts = {}
+_lock = threading.Lock()
+MAX_LAYOUTS = 256
+
+
+def default_source(name):
+    return (TEMPLATE_DIR / name).read_text()
+
+
+def wrap_lines(text, width):
+    lines = []
+    for line in text.splitlines():
+        lines.extend(textwrap.wrap(line, width) or [''])
+    return lines
+
+
+def columns(left, right, width):
+    """``left`` and ``right`` on one line of ``width`` characters, ``left`` cut short if needed."""
+    room = width - len(right) - 1
+    if len(left) > room:
+        left = left[:max(room - 1, 0)] + '~'
+    return left.ljust(width - len(right)) + right
+
+
+def money(value):
+    return f'{value:.2f}'
+
+
+class Layout:
+    """A store's compiled templates and its formatted header and footer."""
+
+    def __init__(self, template, location):
+        self.width = template.width if template else DEFAULT_WIDTH
+        text_source = template.text_template if template and template.text_template else None
+        html_source = template.html_template if template and template.html_template else None
+        self.text = TEXT_ENGINE.from_string(text_source or default_source('receipt.txt'))
+        self.html = HTML_ENGINE.from_string(html_source or default_source('receipt.html'))
+
+        header = '\n'.join(filter(None, [location.name if location else '', template.header if template else '']))
+        footer = template.footer if template and template.footer else DEFAULT_FOOTER
+        self.header = header.splitlines()
+        self.footer = footer.splitlines()
+        self.header_rows = [line.center(self.width).rstrip() for line in wrap_lines(header, self.width)]
+        self.footer_rows = [line.center(self.width).rstrip() for line in wrap_lines(footer, self.width)]
+
+
+def layout_for(location):
+    """The memoized ``Layout`` for receipts from ``location``."""
+    stores = Q(location__isnull=True) if location is None else Q(location=location) | Q(location__isnull=True)
+    # The store's own template sorts before the default
+    template = ReceiptTemplate.objects.filter(stores).order_by(F('location_id').asc(nulls_last=True)).first()
+    key = (
+        template and (template.id, template.updated_at),
+        location and (location.id, location.name),
+    )
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = Layout(template, location)
+        with _lock:
+            if len(_layouts) >= MAX_LAYOUTS:
+                _layouts.clear()
+            _layouts[key] = layout
+    return layout
+
+
+def receipt_queryset():
+    return Sale.objects.select_related('cashier', 'location').prefetch_related(
+        Prefetch('items', queryset=SaleItem.objects.select_related('product', 'promotion').order_by('id'))
+    )
+
+
+class Receipt:
+    """One sale laid out for printing; render it with ``text()``, ``html()``, ``pdf()`` or ``escpos()``."""
+
+    def __init__(self, sale, layout=None):
+        self.sale = sale
+        self.layout = layout or layout_for(sale.location)
+
+    def context(self):
+        sale, width = self.sale, self.layout.width
+        created = timezone.localtime(sale.created_at).strftime('%Y-%m-%d %H:%M')
+        cashier = sale.cashier.username if sale.cashier else ''
+        items = []
+        for item in sale.items.all():
+            name = item.product.name
+            promotion = item.promotion.name if item.promotion else ''
+            items.append({
+                'name': name,
+                'quantity': item.quantity,
+                'unit_price': money(item.unit_price),
+                'total': money(item.total_price),
+                'discount': money(item.discount_amount) if item.discount_amount else '',
+                'promotion': promotion,
+                'row': columns(f'{item.quantity} x {name}', money(item.total_price), width),
+                'detail': f'    @ {money(item.unit_price)}' if item.quantity > 1 else '',
+                'discount_row': columns(
+                    f'    {promotion or "Discount"}', f'-{money(item.discount_amount)}', width,
+                ) if item.discount_amount else '',
+            })
+
+        totals = [('Subtotal', money(sale.total_amount))]
+        if sale.discount_amount:
+            totals.append(('Discount', f'-{money(sale.discount_amount)}'))
+        if sale.tax_amount:
+            totals.append(('Tax', money(sale.tax_amount)))
+        totals.append(('Total', money(sale.final_amount)))
+        if sale.refunded_amount:
+            totals.append(('Refunded', f'-{money(sale.refunded_amount)}'))
+
+        return {
+            'sale': sale,
+            'store': sale.location,
+            'width': width,
+            'rule': '-' * width,
+            'header': self.layout.header,
+            'header_rows': self.layout.header_rows,
+            'footer': self.layout.footer,
+            'footer_rows': self.layout.footer_rows,
+            'date': created,
+            'cashier': cashier,
+            'sale_row': columns('Sale', sale.sale_number, width),
+            'date_row': columns(created, cashier, width),
+            'status': '' if sale.status == 'completed' else sale.get_status_display().upper().center(width).rstrip(),
+            'items': items,
+            'totals': totals,
+            'total_rows': [columns(label, amount, width) for label, amount in totals],
+        }
+
+    def text(self):
+        return self.layout.text.render(Context(self.context()))
+
+    def html(self):
+        return self.layout.html.render(Context(self.context()))
+
+    def escpos(self):
+        return escpos(self.text())
+
+    def pdf(self):
+        return text_pdf(self.text(), self.layout.width)
+
+
+# ESC @ resets the printer, ESC t 0 selects code page 437; GS V 66 feeds
+# the paper past the cutter and cuts
+ESCPOS_START = b'\x1b@\x1bt\x00'
+ESCPOS_CUT = b'\x1dVB\x03'
+
+
+def escpos(text):
+    return ESCPOS_START + text.encode('cp437', errors='replace') + ESCPOS_CUT
+
+
+def pdf_string(line):
+    escaped = line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('cp1252', errors='replace') + b')'
+
+
+def text_pdf(text, width, font_size=8, margin=12):
+    """A one-page PDF of ``text`` in Courier, ``width`` characters wide and as tall as it needs."""
+    lines = text.rstrip('\n').split('\n')
+    leading = font_size * 1.25
+    # Courier glyphs are 0.6 em wide
+    page_width = width * font_size * 0.6 + 2 * margin
+    page_height = len(lines) * leading + 2 * margin
+    stream = b'\n'.join([
+        b'BT',
+        b'/F1 %d Tf %.2f TL' % (font_size, leading),
+        # Each ' moves down a line before showing it
+        b'%.2f %.2f Td' % (margin, page_height - margin),
+        *(pdf_string(line) + b" '" for line in lines),
+        b'ET',
+    ])
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+        b'/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>' % (page_width, page_height),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream',
+    ]
+    document = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(document))
+        document += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(document)
+    document += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    document += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    document += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(document)
+
+
+class ReceiptRenderer(BaseRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, Receipt):
+            # Errors, such as an unknown sale, go out as JSON and say so
+            response = (renderer_context or {}).get('response')
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return json.dumps(data, default=str).encode()
+        return self.render_receipt(data)
+
+
+class TextReceiptRenderer(ReceiptRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def render_receipt(self, receipt):
+        return receipt.text().encode()
+
+
+class HTMLReceiptRenderer(ReceiptRenderer):
+    media_type = 'text/html'
+    format = 'html'
+
+    def render_receipt(self, receipt):
+        return receipt.html().encode()
+
+
+class PDFReceiptRenderer(ReceiptRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def render_receipt(self, receipt):
+        return receipt.pdf()
+
+
+class ESCPOSReceiptRenderer(ReceiptRenderer):
+    media_type = 'application/vnd.escpos'
+    format = 'escpos'
+    charset = None
+    render_style = 'binary'
+
+    def render_receipt(self, receipt):
+        return receipt.escpos()
+
+
+RECEIPT_RENDERERS = [TextReceiptRenderer, HTMLReceiptRenderer, PDFReceiptRenderer, ESCPOSReceiptRenderer]
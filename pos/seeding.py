@@ -0,0 +1,205 @@
+"""
+Synthetic catalog, sales and ledger data for load and performance testing.
+
+``DataSeeder`` walks a timeline day by day, emitting sales with realistic
+basket sizes and a long-tail product popularity, the matching sale and
+restock ``StockTransaction`` rows, and finally each product's resulting
+stock, all at the default location. Rows are written with ``bulk_create`` in batches and never pass
+through the model ``save()`` methods.
+"""
+import contextlib
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from products.models import Category, LocationStock, Product, StockTransaction
+from products.stock import default_location
+from .models import Sale, SaleItem
+
+
+@contextlib.contextmanager
+def preserved_timestamps(*models):
+    """
+    Let bulk inserts keep the ``created_at``/``updated_at`` values they were
+    given instead of having ``auto_now``/``auto_now_add`` overwrite them.
+    """
+    saved = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DataSeeder:
+    restock_quantity = 500
+    opening_hour = 8
+    closing_hour = 22
+
+    def __init__(self, categories=20, products=1000, sales=10000, years=2, max_items=5,
+                 cashiers=5, batch_size=5000, seed=1, prefix='SEED', log=None):
+        self.categories = categories
+        self.products = products
+        self.sales = sales
+        self.days = max(1, int(years * 365))
+        self.max_items = max_items
+        self.cashiers = cashiers
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.counts = {'sales': 0, 'sale_items': 0, 'stock_transactions': 0}
+
+    def run(self):
+        with preserved_timestamps(Sale, StockTransaction):
+            self.location_id = default_location().id
+            cashier_ids = self.create_cashiers()
+            products = self.create_catalog()
+            self.create_history(products, cashier_ids)
+        return {'categories': self.categories, 'products': self.products, **self.counts}
+
+    def create_cashiers(self):
+        ids = []
+        for index in range(self.cashiers):
+            user, created = CustomUser.objects.get_or_create(
+                username=f'{self.prefix.lower()}_cashier_{index}', defaults={'user_type': 'worker'}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            ids.append(user.id)
+        return ids
+
+    def create_catalog(self):
+        categories = Category.objects.bulk_create(
+            Category(name=f'{self.prefix} Category {index}') for index in range(self.categories)
+        )
+        batch = []
+        for index in range(self.products):
+            price = Decimal(self.rng.randrange(100, 20000)) / 100
+            batch.append(Product(
+                name=f'{self.prefix} Product {index}',
+                sku=f'{self.prefix}-{index:07d}',
+                category=self.rng.choice(categories) if categories else None,
+                price=price,
+                cost_price=(price * Decimal('0.6')).quantize(Decimal('0.01')),
+                low_stock_threshold=self.rng.choice((5, 10, 20)),
+            ))
+        products = []
+        for start in range(0, len(batch), self.batch_size):
+            products.extend(Product.objects.bulk_create(batch[start:start + self.batch_size]))
+        self.log(f'Created {len(categories)} categories and {len(products)} products')
+        return products
+
+    def create_history(self, products, cashier_ids):
+        if not products:
+            return
+        # Long-tail popularity: a few bestsellers, many slow movers
+        cum_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(products))))
+        stock = {product.id: 0 for product in products}
+        start_day = timezone.localdate() - timedelta(days=self.days)
+        opening = timezone.make_aware(datetime.combine(start_day, time(self.opening_hour)))
+
+        pending = {'sales': [], 'items': [], 'transactions': []}
+        for product in products:
+            self.restock(pending, product, stock, opening, cashier_ids[0] if cashier_ids else None)
+
+        per_day, remainder = divmod(self.sales, self.days)
+        number = 0
+        for day_index in range(self.days):
+            day = start_day + timedelta(days=day_index)
+            day_open = timezone.make_aware(datetime.combine(day, time(self.opening_hour)))
+            seconds_open = (self.closing_hour - self.opening_hour) * 3600
+            count = per_day + (1 if day_index < remainder else 0)
+
+            for offset in sorted(self.rng.randrange(seconds_open) for _ in range(count)):
+                created_at = day_open + timedelta(seconds=offset)
+                cashier_id = self.rng.choice(cashier_ids) if cashier_ids else None
+                basket = self.rng.choices(products, cum_weights=cum_weights, k=self.rng.randint(1, self.max_items))
+                self.add_sale(pending, number, basket, stock, created_at, cashier_id)
+                number += 1
+                if len(pending['items']) >= self.batch_size:
+                    self.flush(pending)
+            if day_index % 30 == 29:
+                self.log(f'Generated {number} sales through {day}')
+        self.flush(pending)
+
+        for product in products:
+            product.current_stock = stock[product.id]
+        Product.objects.bulk_update(products, ['current_stock'], batch_size=1000)
+        LocationStock.objects.bulk_create(
+            (
+                LocationStock(product_id=product.id, location_id=self.location_id, quantity=stock[product.id])
+                for product in products
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def restock(self, pending, product, stock, created_at, user_id):
+        previous = stock[product.id]
+        stock[product.id] = previous + self.restock_quantity
+        pending['transactions'].append(StockTransaction(
+            product_id=product.id, location_id=self.location_id, transaction_type='purchase', quantity=self.restock_quantity,
+            previous_stock=previous, new_stock=stock[product.id], unit_price=product.cost_price,
+            total_amount=product.cost_price * self.restock_quantity, created_by_id=user_id,
+            notes='Seeded restock', created_at=created_at,
+        ))
+
+    def add_sale(self, pending, number, basket, stock, created_at, cashier_id):
+        sale_number = f'{self.prefix}-{number:09d}'
+        total = Decimal('0.00')
+        lines = []
+        for product in basket:
+            quantity = self.rng.choice((1, 1, 1, 2, 2, 3))
+            if stock[product.id] - quantity < product.low_stock_threshold:
+                # Stamped with the sale itself: rows are written in timeline
+                # order, so (created_at, id) replays every product's ledger
+                # even when it is restocked between two lines of one basket
+                self.restock(pending, product, stock, created_at, cashier_id)
+            line_total = product.price * quantity
+            total += line_total
+            lines.append((product, quantity, line_total))
+
+            previous = stock[product.id]
+            stock[product.id] = previous - quantity
+            pending['transactions'].append(StockTransaction(
+                product_id=product.id, location_id=self.location_id, transaction_type='sale', quantity=quantity,
+                previous_stock=previous, new_stock=stock[product.id], unit_price=product.price,
+                total_amount=line_total, created_by_id=cashier_id,
+                notes=f'Sale #{sale_number}', created_at=created_at,
+            ))
+
+        pending['sales'].append(Sale(
+            sale_number=sale_number, total_amount=total, final_amount=total,
+            cashier_id=cashier_id, location_id=self.location_id, created_at=created_at, updated_at=created_at,
+        ))
+        sale_index = len(pending['sales']) - 1
+        pending['items'].extend((sale_index, line) for line in lines)
+
+    def flush(self, pending):
+        with transaction.atomic():
+            sales = Sale.objects.bulk_create(pending['sales'])
+            SaleItem.objects.bulk_create(
+                SaleItem(
+                    sale_id=sales[sale_index].id, product_id=product.id, quantity=quantity,
+                    unit_price=product.price, total_price=line_total,
+                )
+                for sale_index, (product, quantity, line_total) in pending['items']
+            )
+            StockTransaction.objects.bulk_create(pending['transactions'])
+
+        self.counts['sales'] += len(pending['sales'])
+        self.counts['sale_items'] += len(pending['items'])
+        self.counts['stock_transactions'] += len(pending['transactions'])
+        for rows in pending.values():
+            rows.clear()
@@ -1,7 +1,10 @@
 from rest_framework import serializers
 from django.db import transaction
-from .models import Sale, SaleItem
-from products.models import Product, StockTransaction
+from .models import Refund, RefundItem, Sale, SaleItem
+from accounts.permissions import is_admin
+from products.models import Product
+from products.serializers import CartField
+from inventory_backend.fastpath import ValuesSerializer
 
 class SaleItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -18,7 +21,26 @@ class SaleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = '__all__'
-        read_only_fields = ['sale_number', 'created_at', 'updated_at']
+        read_only_fields = ['sale_number', 'status', 'refunded_amount', 'created_at', 'updated_at']
+
+class RefundItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RefundItem
+        fields = '__all__'
+
+class RefundSerializer(serializers.ModelSerializer):
+    items = RefundItemSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Refund
+        fields = '__all__'
+
+class SaleItemListSerializer(ValuesSerializer):
+    serializer_class = SaleItemSerializer
+
+class SaleListSerializer(ValuesSerializer):
+    serializer_class = SaleSerializer
+    nested = {'items': (SaleItemListSerializer, 'sale')}
 
 class CartItemSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
@@ -29,24 +51,50 @@ class CreateSaleSerializer(serializers.Serializer):
     tax_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
     discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, default=0)
     notes = serializers.CharField(required=False, allow_blank=True)
+    location_id = serializers.IntegerField(required=False)
+    # The till's cart; its stock reservations are used up by the sale
+    cart = CartField(required=False)
     
     def validate_items(self, value):
         if not value:
             raise serializers.ValidationError("At least one item is required.")
         return value
     
+    def validate_discount_amount(self, value):
+        # Promotions are priced by the server; a discount on top is an override
+        request = self.context.get('request')
+        if value and not (request and is_admin(request.user)):
+            raise serializers.ValidationError("Only admins can give a manual discount.")
+        return value
+    
     def validate(self, data):
         items = data['items']
         
-        # Check product availability
-        for item in items:
-            try:
-                product = Product.objects.get(id=item['product_id'])
-                if product.current_stock < item['quantity']:
-                    raise serializers.ValidationError(
-                        f"Insufficient stock for {product.name}. Available: {product.current_stock}"
-                    )
-            except Product.DoesNotExist:
-                raise serializers.ValidationError(f"Product with ID {item['product_id']} does not exist.")
+        # Check the products exist; stock is checked when the sale locks it
+        product_ids = {item['product_id'] for item in items}
+        found = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(f"Product with ID {missing[0]} does not exist.")
         
-        return data
\ No newline at end of file
+        return data
+
+class ReturnItemSerializer(serializers.Serializer):
+    sale_item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class ReturnSaleSerializer(serializers.Serializer):
+    # Leave out items to return everything not returned yet
+    items = ReturnItemSerializer(many=True, required=False)
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one item is required.")
+        item_ids = [item['sale_item_id'] for item in value]
+        if len(set(item_ids)) < len(item_ids):
+            raise serializers.ValidationError("Each sale item can only be listed once.")
+        return value
+
+class VoidSaleSerializer(serializers.Serializer):
+    reason = serializers.CharField(required=False, allow_blank=True, default='')
@@ -1,3 +1,322 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+
+from inventory_backend.testing import Endpoint, QueryBudgetMixin
+from products.models import Location, LocationStock, Product, StockTransaction
+from products.stock import default_location
+from promotions.models import Promotion
+from reports.views import ledger_summary
+from .models import ReceiptTemplate, Refund, Sale, SaleItem
+from .receipts import layout_for
+from .seeding import DataSeeder
+
+
+class SaleQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('sale-list', 'sale-list', budget=3),
+        Endpoint('sale-list-window', 'sale-list', budget=3, query=lambda case: case.window()),
+        Endpoint('sale-detail', 'sale-detail', budget=2,
+                 kwargs=lambda case: {'pk': case.first_id(Sale)}),
+        Endpoint('sale-create', 'sale-create-sale', budget=19, method='POST', status=201,
+                 data=lambda case: {'items': [{'product_id': case.first_id(Product), 'quantity': 1}]}),
+        Endpoint('sale-receipt', 'sale-receipt', budget=3,
+                 kwargs=lambda case: {'pk': case.first_id(Sale)}, query={'format': 'txt'}),
+        Endpoint('sale-return', 'sale-return', budget=17, method='POST', status=201,
+                 kwargs=lambda case: {'pk': case.completed_sale('-id')}, data={}),
+        Endpoint('sale-void', 'sale-void', budget=17, method='POST', status=201,
+                 kwargs=lambda case: {'pk': case.completed_sale('id')}, data={'reason': 'Wrong basket'}),
+    ]
+
+    def seed(self, count):
+        super().seed(count)
+        # A rule change makes the next checkout recompile the promotions
+        Promotion.objects.create(name=f'Storewide {count}', kind='percentage', value=5)
+
+    def completed_sale(self, order):
+        return Sale.objects.filter(status='completed').order_by(order).values_list('id', flat=True).first()
+
+
+class LocationSaleTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+        self.store = default_location()
+        self.other = Location.objects.create(name='Uptown', code='UP')
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+        # Product totals follow each commit
+        with self.captureOnCommitCallbacks(execute=True):
+            for location, quantity in ((self.store, 2), (self.other, 10)):
+                StockTransaction.objects.create(
+                    product=self.product, location=location, transaction_type='purchase', quantity=quantity,
+                )
+
+    def sell(self, location, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('sale-create-sale'), {
+                'location_id': location.id, 'items': [{'product_id': self.product.id, 'quantity': quantity}],
+            }, format='json')
+
+    def test_sale_takes_stock_from_its_location_only(self):
+        response = self.sell(self.other, 3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['location'], self.other.id)
+        self.assertEqual(
+            dict(self.product.location_stocks.values_list('location__code', 'quantity')), {'MAIN': 2, 'UP': 7}
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 9)
+
+    def test_sale_is_refused_when_its_location_is_short(self):
+        response = self.sell(self.store, 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at MAIN. Available: 2', response.data['error'])
+        self.assertFalse(Sale.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 12)
+
+
+class ReturnTests(APITestCase):
+    def setUp(self):
+        # An admin, who may also give manual discounts
+        self.client.force_authenticate(CustomUser.objects.create_user('manager', user_type='admin'))
+        self.store = default_location()
+        self.products = [
+            Product.objects.create(name=f'Item {index}', sku=f'ITEM-{index}', price='2.00', cost_price='1.00')
+            for index in range(40)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.products:
+                StockTransaction.objects.create(
+                    product=product, location=self.store, transaction_type='purchase', quantity=10,
+                )
+
+    def sell(self, products, quantity=3, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('sale-create-sale'), {
+                'items': [{'product_id': product.id, 'quantity': quantity} for product in products], **extra,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def give_back(self, sale, action='return', **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse(f'sale-{action}', kwargs={'pk': sale['id']}), data, format='json')
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.current_stock, product.location_stocks.get(location=self.store).quantity
+
+    def test_partial_then_full_return(self):
+        # 6.00 of goods, 0.60 tax, 1.00 discount: 5.60 paid
+        sale = self.sell(self.products[:1], tax_amount='0.60', discount_amount='1.00')
+        item = sale['items'][0]
+        response = self.give_back(sale, items=[{'sale_item_id': item['id'], 'quantity': 1}], reason='Damaged')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['refund']['amount'], '1.87')
+        self.assertEqual(response.data['sale']['status'], 'partially_returned')
+        self.assertEqual(response.data['sale']['items'][0]['returned_quantity'], 1)
+        self.assertEqual(self.stock(self.products[0]), (8, 8))
+
+        response = self.give_back(sale)
+        self.assertEqual(response.status_code, 201)
+        # The last refund takes whatever is left, so the refunds add up exactly
+        self.assertEqual(response.data['refund']['amount'], '3.73')
+        self.assertEqual(response.data['sale']['status'], 'returned')
+        self.assertEqual(response.data['sale']['refunded_amount'], '5.60')
+        self.assertEqual(self.stock(self.products[0]), (10, 10))
+
+        summary = ledger_summary(self.products[0].transactions.all())
+        self.assertEqual((summary['total_sold'], summary['total_returned'], summary['net_movement']), (3, 3, 10))
+
+    def test_return_refunds_the_promotion_price(self):
+        promotion = Promotion.objects.create(name='Half price', kind='percentage', value=50)
+        promotion.products.add(self.products[0])
+        # 3 x 2.00 at half price and 2.00 at full price: 5.00 paid
+        sale = self.client.post(reverse('sale-create-sale'), {'items': [
+            {'product_id': self.products[0].id, 'quantity': 3},
+            {'product_id': self.products[1].id, 'quantity': 1},
+        ]}, format='json').data
+        self.assertEqual(sale['final_amount'], '5.00')
+        self.assertEqual(sale['items'][0]['promotion'], promotion.id)
+        response = self.give_back(sale, items=[{'sale_item_id': sale['items'][0]['id'], 'quantity': 1}])
+        self.assertEqual(response.data['refund']['amount'], '1.00')
+
+    def test_over_return_is_refused_and_changes_nothing(self):
+        sale = self.sell(self.products[:1])
+        response = self.give_back(sale, items=[{'sale_item_id': sale['items'][0]['id'], 'quantity': 4}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Returnable: 3', response.data['error'])
+        self.assertFalse(Refund.objects.exists())
+        self.assertEqual(self.stock(self.products[0]), (7, 7))
+
+    def test_void_reverses_everything_once(self):
+        sale = self.sell(self.products[:2])
+        response = self.give_back(sale, 'void', reason='Wrong customer')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sale']['status'], 'voided')
+        self.assertEqual(response.data['refund']['kind'], 'void')
+        self.assertEqual(len(response.data['refund']['items']), 2)
+        self.assertEqual(self.stock(self.products[1]), (10, 10))
+        self.assertEqual(self.give_back(sale, 'void').status_code, 400)
+        self.assertEqual(self.give_back(sale).status_code, 400)
+
+    def test_returned_sale_cannot_be_voided(self):
+        sale = self.sell(self.products[:2])
+        self.give_back(sale, items=[{'sale_item_id': sale['items'][0]['id'], 'quantity': 1}])
+        response = self.give_back(sale, 'void')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('can no longer be voided', response.data['error'])
+
+    def test_return_ignores_the_date_window(self):
+        sale = self.sell(self.products[:1])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('sale-return', kwargs={'pk': sale['id']}) + '?start_date=2000-01-01&end_date=2000-01-02',
+                {}, format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['sale']['status'], 'returned')
+
+    def test_sales_cannot_be_edited_around_a_return(self):
+        sale = self.sell(self.products[:1])
+        self.give_back(sale, items=[{'sale_item_id': sale['items'][0]['id'], 'quantity': 1}])
+        url = reverse('sale-detail', kwargs={'pk': sale['id']})
+        response = self.client.patch(url, {'status': 'completed', 'refunded_amount': '0.00'}, format='json')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertEqual(self.give_back(sale, 'void').status_code, 400)
+        self.assertEqual(Sale.objects.get(id=sale['id']).refunded_amount, Decimal('2.00'))
+
+    def test_large_basket_costs_no_more_queries(self):
+        counts = []
+        for products in (self.products[:2], self.products[2:]):
+            sale = self.sell(products)
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.give_back(sale).status_code, 201)
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+
+
+class ReceiptTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+        self.store = default_location()
+        self.product = Product.objects.create(name='Cola (can)', sku='COLA-1', price='1.50', cost_price='0.80')
+        StockTransaction.objects.create(
+            product=self.product, location=self.store, transaction_type='purchase', quantity=10,
+        )
+        promotion = Promotion.objects.create(name='Cola week', kind='percentage', value=10)
+        promotion.products.add(self.product)
+        self.sale = self.client.post(reverse('sale-create-sale'), {
+            'items': [{'product_id': self.product.id, 'quantity': 2}],
+        }, format='json').data
+
+    def receipt(self, format):
+        response = self.client.get(reverse('sale-receipt', kwargs={'pk': self.sale['id']}), {'format': format})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_text_receipt(self):
+        response = self.receipt('txt')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0].strip(), 'Main store')
+        self.assertIn(f"{'2 x Cola (can)':<38}3.00", lines)
+        self.assertIn(f"{'    Cola week':<37}-0.30", lines)
+        self.assertIn(f"{'Total':<38}2.70", lines)
+        self.assertTrue(all(len(line) <= 42 for line in lines))
+
+    def test_html_pdf_and_escpos(self):
+        html = self.receipt('html').content.decode()
+        self.assertIn('<td>2 x Cola (can)</td>', html)
+        pdf = self.receipt('pdf')
+        self.assertEqual(pdf['Content-Type'], 'application/pdf')
+        self.assertTrue(pdf.content.startswith(b'%PDF-1.4') and pdf.content.endswith(b'%EOF\n'))
+        self.assertIn(rb'(2 x Cola \(can\)', pdf.content)
+        escpos = self.receipt('escpos').content
+        self.assertTrue(escpos.startswith(b'\x1b@') and escpos.endswith(b'\x1dVB\x03'))
+        self.assertIn(b'Cola week', escpos)
+
+    def test_store_template_overrides_the_default(self):
+        ReceiptTemplate.objects.create(header='Default header', footer='Come again')
+        self.assertIn('Default header', self.receipt('txt').content.decode())
+        template = ReceiptTemplate.objects.create(location=self.store, header='12 High St', width=32,
+                                                  text_template='{{ header_rows.1 }}|{{ total_rows|last }}')
+        self.assertEqual(self.receipt('txt').content.decode(), f"{'12 High St':^32}".rstrip() + f"|{'Total':<28}2.70")
+
+        template.text_template = ''
+        template.save()
+        text = self.receipt('txt').content.decode()
+        # The store's own row replaces the default entirely
+        self.assertIn('Thank you!'.center(32).rstrip(), text)
+        self.assertNotIn('Default header', text)
+
+    def test_layouts_are_compiled_once(self):
+        self.assertIs(layout_for(self.store), layout_for(self.store))
+        ReceiptTemplate.objects.create(footer='Bye')
+        self.assertEqual(layout_for(self.store).footer, ['Bye'])
+
+    def test_unknown_sale(self):
+        response = self.client.get(reverse('sale-receipt', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+        for receipt_format in ('txt', 'pdf', 'escpos'):
+            response = self.client.get(reverse('sale-receipt', kwargs={'pk': 0}), {'format': receipt_format})
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertIn('detail', response.json())
+
+
+class SeedDataTests(APITestCase):
+    def seed(self, **options):
+        out = StringIO()
+        options = {'categories': 3, 'products': 12, 'sales': 200, 'years': 10 / 365, 'max_items': 4,
+                   'cashiers': 2, 'batch_size': 50, **options}
+        call_command('seed_data', stdout=out, **options)
+        return out.getvalue()
+
+    def test_seeds_the_requested_data(self):
+        out = self.seed()
+        self.assertEqual(Product.objects.filter(sku__startswith='SEED-').count(), 12)
+        self.assertEqual(Sale.objects.filter(sale_number__startswith='SEED-').count(), 200)
+        self.assertIn('200 sales', out)
+        self.assertIn(f'{SaleItem.objects.count()} sale items', out)
+        self.assertIn(f'{StockTransaction.objects.count()} stock transactions', out)
+        self.assertFalse(Sale.objects.filter(items__isnull=True).exists())
+        for sale in Sale.objects.annotate(lines=Sum('items__total_price')):
+            self.assertEqual(sale.total_amount, sale.lines)
+
+    def test_the_ledger_matches_the_stock(self):
+        # Few products and many sales, so products restock inside a basket
+        self.seed(products=3, sales=1500)
+        levels = dict(LocationStock.objects.filter(location=default_location()).values_list('product_id', 'quantity'))
+        for product in Product.objects.all():
+            ledger = list(StockTransaction.objects.filter(product=product).order_by('created_at', 'id'))
+            self.assertEqual(ledger[0].previous_stock, 0)
+            for before, after in zip(ledger, ledger[1:]):
+                self.assertEqual(after.previous_stock, before.new_stock)
+            for row in ledger:
+                change = row.quantity if row.transaction_type == 'purchase' else -row.quantity
+                self.assertEqual(row.new_stock, row.previous_stock + change)
+                self.assertGreaterEqual(row.new_stock, 0)
+            self.assertEqual(ledger[-1].new_stock, product.current_stock)
+            self.assertEqual(levels[product.id], product.current_stock)
+
+            summary = ledger_summary(StockTransaction.objects.filter(product=product))
+            self.assertEqual(summary['net_movement'], product.current_stock)
+
+    def test_data_sets_are_repeatable_and_prefixed(self):
+        self.seed(seed=3, prefix='ONE')
+        self.seed(seed=3, prefix='TWO')
+        one = list(Sale.objects.filter(sale_number__startswith='ONE-').order_by('id').values_list('final_amount'))
+        two = list(Sale.objects.filter(sale_number__startswith='TWO-').order_by('id').values_list('final_amount'))
+        self.assertEqual(one, two)
+        with self.assertRaises(CommandError):
+            self.seed(prefix='ONE')
@@ -3,26 +3,37 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from datetime import datetime
 import random
 import string
 from .models import Sale, SaleItem
-from products.models import Product, StockTransaction
-from .serializers import SaleSerializer, CreateSaleSerializer
+from products.models import Product
+from products.stock import InsufficientStock, get_location, record_movements
+from inventory_backend.dates import filter_by_date_window
+from inventory_backend.fastpath import FastListMixin
+from promotions.engine import Quote
+from .receipts import RECEIPT_RENDERERS, Receipt, receipt_queryset
+from .returns import InvalidReturn, reverse_sale
+from .serializers import (
+    SaleSerializer, SaleListSerializer, CreateSaleSerializer, RefundSerializer, ReturnSaleSerializer,
+    VoidSaleSerializer,
+)
 
-class SaleViewSet(viewsets.ModelViewSet):
-    queryset = Sale.objects.all().prefetch_related('items')
+class SaleViewSet(FastListMixin, viewsets.ModelViewSet):
+    queryset = Sale.objects.all().select_related('cashier').prefetch_related(
+        Prefetch('items', queryset=SaleItem.objects.select_related('product'))
+    )
     serializer_class = SaleSerializer
+    list_serializer_class = SaleListSerializer
     permission_classes = [IsAuthenticated]
+    # Sales are only created, returned and voided through their actions
+    http_method_names = ['get', 'post', 'head', 'options']
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date and end_date:
-            queryset = queryset.filter(created_at__date__range=[start_date, end_date])
+        queryset = filter_by_date_window(super().get_queryset(), self.request)
             
         return queryset.order_by('-created_at')
     
@@ -33,65 +44,93 @@ class SaleViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def create_sale(self, request):
-        serializer = CreateSaleSerializer(data=request.data)
+        serializer = CreateSaleSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             try:
                 with transaction.atomic():
                     items_data = serializer.validated_data['items']
+                    location = get_location(serializer.validated_data.get('location_id'))
+                    products = Product.objects.in_bulk([item['product_id'] for item in items_data])
                     
-                    # Calculate totals
-                    total_amount = 0
-                    sale_items = []
-                    
+                    lines = []
                     for item_data in items_data:
-                        product = get_object_or_404(Product, id=item_data['product_id'])
-                        item_total = product.price * item_data['quantity']
-                        total_amount += item_total
-                        
-                        sale_items.append({
-                            'product': product,
-                            'quantity': item_data['quantity'],
-                            'unit_price': product.price,
-                            'total_price': item_total
-                        })
+                        product = products.get(item_data['product_id'])
+                        if product is None:
+                            raise Http404(f"Product with ID {item_data['product_id']} does not exist.")
+                        lines.append((product, item_data['quantity']))
                     
-                    # Calculate final amount
-                    final_amount = total_amount + serializer.validated_data['tax_amount'] - serializer.validated_data['discount_amount']
+                    # Prices and promotions come from the server, like a quote
+                    quote = Quote(
+                        lines,
+                        tax_amount=serializer.validated_data['tax_amount'],
+                        manual_discount=serializer.validated_data['discount_amount'],
+                    )
                     
                     # Create sale
                     sale = Sale.objects.create(
                         sale_number=self.generate_sale_number(),
-                        total_amount=total_amount,
-                        tax_amount=serializer.validated_data['tax_amount'],
-                        discount_amount=serializer.validated_data['discount_amount'],
-                        final_amount=final_amount,
+                        total_amount=quote.total_amount,
+                        tax_amount=quote.tax_amount,
+                        discount_amount=quote.discount_amount,
+                        final_amount=quote.final_amount,
                         cashier=request.user,
+                        location=location,
                         notes=serializer.validated_data.get('notes', '')
                     )
                     
-                    # Create sale items and update stock
-                    for item_data in sale_items:
-                        SaleItem.objects.create(
-                            sale=sale,
-                            product=item_data['product'],
-                            quantity=item_data['quantity'],
-                            unit_price=item_data['unit_price'],
-                            total_price=item_data['total_price']
-                        )
-                        
-                        # Create stock transaction for sale
-                        StockTransaction.objects.create(
-                            product=item_data['product'],
-                            transaction_type='sale',
-                            quantity=item_data['quantity'],
-                            unit_price=item_data['unit_price'],
-                            created_by=request.user,
-                            notes=f"Sale #{sale.sale_number}"
+                    # Create sale items
+                    SaleItem.objects.bulk_create(
+                        SaleItem(
+                            sale=sale, product=line.product, quantity=line.quantity, unit_price=line.unit_price,
+                            total_price=line.total_price, discount_amount=line.discount_amount,
+                            promotion_id=line.promotion_id,
                         )
+                        for line in quote.lines
+                    )
+                    
+                    # Take the stock out of this location only; raises if any
+                    # line is short and rolls the whole sale back
+                    record_movements(location, [
+                        (line.product, 'sale', line.quantity, line.unit_price, f"Sale #{sale.sale_number}")
+                        for line in quote.lines
+                    ], request.user, cart=serializer.validated_data.get('cart'))
                     
+                    sale = self.get_queryset().get(id=sale.id)
                     return Response(SaleSerializer(sale).data, status=status.HTTP_201_CREATED)
                     
             except Exception as e:
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['get'], renderer_classes=RECEIPT_RENDERERS)
+    def receipt(self, request, pk=None):
+        """The sale's receipt as text, HTML, PDF or ESC/POS (Accept header or ?format=txt|html|pdf|escpos)."""
+        sale = get_object_or_404(receipt_queryset(), pk=pk)
+        return Response(Receipt(sale))
+    
+    @action(detail=True, methods=['post'], url_path='return', url_name='return')
+    def return_items(self, request, pk=None):
+        serializer = ReturnSaleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data.get('items')
+        quantities = None if items is None else {item['sale_item_id']: item['quantity'] for item in items}
+        return self.record_refund(pk, quantities, 'return', serializer.validated_data['reason'])
+    
+    @action(detail=True, methods=['post'])
+    def void(self, request, pk=None):
+        serializer = VoidSaleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.record_refund(pk, None, 'void', serializer.validated_data['reason'])
+    
+    def record_refund(self, pk, quantities, kind, reason):
+        try:
+            refund = reverse_sale(pk, quantities, self.request.user, kind, reason)
+        except (InvalidReturn, InsufficientStock) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Not get_queryset(): the refund stands whatever date window the query string asks for
+        sale = super().get_queryset().get(id=pk)
+        return Response({
+            'refund': RefundSerializer(refund).data,
+            'sale': SaleSerializer(sale).data,
+        }, status=status.HTTP_201_CREATED)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.db import models
-from .models import Category, Product, StockTransaction
+from inventory_backend.admin import LargeTableAdmin
+from .models import Category, Location, LocationStock, Product, StockReservation, StockTransaction, StockTransfer
 
 class LowStockFilter(admin.SimpleListFilter):
     title = 'low stock status'
@@ -24,20 +25,62 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'created_at']
     search_fields = ['name']
 
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'code', 'kind', 'is_active']
+    list_filter = ['kind', 'is_active']
+    search_fields = ['name', 'code']
+
+class LocationStockInline(admin.TabularInline):
+    model = LocationStock
+    extra = 0
+    can_delete = False
+    # Stock moves through the ledger, not the admin
+    readonly_fields = ['location', 'quantity', 'reserved', 'updated_at']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('location')
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ['name', 'sku', 'category', 'current_stock', 'price', 'stock_status', 'is_active']
+    list_select_related = ['category']
+    ordering = ['name']
     list_filter = ['category', 'is_active', LowStockFilter]
     search_fields = ['name', 'sku']
-    readonly_fields = ['created_at', 'updated_at', 'stock_status']
+    readonly_fields = ['current_stock', 'created_at', 'updated_at', 'stock_status']
+    autocomplete_fields = ['category']
+    inlines = [LocationStockInline]
     
     def stock_status(self, obj):
         return obj.stock_status()
     stock_status.short_description = 'Stock Status'
 
 @admin.register(StockTransaction)
-class StockTransactionAdmin(admin.ModelAdmin):
-    list_display = ['product', 'transaction_type', 'quantity', 'previous_stock', 'new_stock', 'created_at']
-    list_filter = ['transaction_type', 'created_at']
+class StockTransactionAdmin(LargeTableAdmin):
+    list_display = ['product', 'location', 'transaction_type', 'quantity', 'previous_stock', 'new_stock', 'created_at']
+    list_select_related = ['product', 'location']
+    list_filter = ['transaction_type', 'location']
+    date_hierarchy = 'created_at'
     readonly_fields = ['created_at']
-    search_fields = ['product__name', 'product__sku']
\ No newline at end of file
+    autocomplete_fields = ['product', 'location', 'created_by']
+    # The product table is small; matching it first keeps the ledger on its index
+    search_fields = ['product__name', 'product__sku']
+
+@admin.register(StockTransfer)
+class StockTransferAdmin(LargeTableAdmin):
+    list_display = ['product', 'from_location', 'to_location', 'quantity', 'created_by', 'created_at']
+    list_select_related = ['product', 'from_location', 'to_location', 'created_by']
+    list_filter = ['from_location', 'to_location']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['created_at']
+    autocomplete_fields = ['product', 'from_location', 'to_location', 'created_by']
+    search_fields = ['product__name', 'product__sku']
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['cart', 'stock', 'quantity', 'expires_at', 'created_by']
+    list_select_related = ['stock__product', 'stock__location', 'created_by']
+    search_fields = ['cart']
+    # Holds change through the reservations API so stock totals stay in step
+    readonly_fields = ['cart', 'stock', 'quantity', 'expires_at', 'created_by', 'created_at']
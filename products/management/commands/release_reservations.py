@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release open-cart stock reservations that have expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Reservations released per transaction.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired reservations'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['product', 'created_at'], name='stocktx_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['transaction_type', 'created_at'], name='stocktx_type_created_idx'),
+        ),
+    ]
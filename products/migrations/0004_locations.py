@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:41
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_location(apps, schema_editor):
+    """Move all existing stock and ledger rows to the default location."""
+    Location = apps.get_model('products', 'Location')
+    LocationStock = apps.get_model('products', 'LocationStock')
+    Product = apps.get_model('products', 'Product')
+    StockTransaction = apps.get_model('products', 'StockTransaction')
+
+    location, _ = Location.objects.get_or_create(
+        code=settings.DEFAULT_LOCATION_CODE, defaults={'name': 'Main store'}
+    )
+    StockTransaction.objects.filter(location__isnull=True).update(location=location)
+    LocationStock.objects.bulk_create(
+        (
+            LocationStock(product_id=product_id, location=location, quantity=stock)
+            for product_id, stock in Product.objects.values_list('id', 'current_stock').iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_category_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('kind', models.CharField(choices=[('store', 'Store'), ('warehouse', 'Warehouse')], default='store', max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='stocktransaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale'), ('adjustment', 'Adjustment'), ('return', 'Return'), ('transfer_out', 'Transfer out'), ('transfer_in', 'Transfer in')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='products.location'),
+        ),
+        migrations.CreateModel(
+            name='LocationStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='products.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_stocks', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'location'], name='locationstock_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('location', 'product'), name='locationstock_location_product_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('from_location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_out', to='products.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers', to='products.product')),
+                ('to_location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_in', to='products.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='transfer_created_idx')],
+            },
+        ),
+        migrations.RunPython(create_default_location, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
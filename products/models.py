@@ -1,10 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
+from changefeed.outbox import record_product
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
@@ -21,10 +23,18 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set with current_stock after stock movements; updated_at is for catalog edits
+    stock_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     def __str__(self):
         return f"{self.name} (SKU: {self.sku})"
     
+    def save(self, *args, **kwargs):
+        # The change feed event commits or rolls back with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_product(self)
+    
     @property
     def is_low_stock(self):
         return self.current_stock <= self.low_stock_threshold
@@ -34,15 +44,60 @@ class Product(models.Model):
         return "Low Stock" if self.is_low_stock else "Adequate Stock"
     stock_status.short_description = "Stock Status"
 
+class Location(models.Model):
+    KINDS = (
+        ('store', 'Store'),
+        ('warehouse', 'Warehouse'),
+    )
+    
+    name = models.CharField(max_length=100, unique=True)
+    code = models.CharField(max_length=20, unique=True)
+    kind = models.CharField(max_length=20, choices=KINDS, default='store')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+class LocationStock(models.Model):
+    """Stock of one product at one location; ``Product.current_stock`` is the total."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='location_stocks')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    quantity = models.IntegerField(default=0)
+    # Total of the open carts' reservations; see products/reservations.py
+    reserved = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'product'], name='locationstock_location_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'location'], name='locationstock_product_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} @ {self.location.code}: {self.quantity}"
+    
+    @property
+    def available(self):
+        return self.quantity - self.reserved
+
 class StockTransaction(models.Model):
     TRANSACTION_TYPES = (
         ('purchase', 'Purchase'),
         ('sale', 'Sale'),
         ('adjustment', 'Adjustment'),
         ('return', 'Return'),
+        ('transfer_out', 'Transfer out'),
+        ('transfer_in', 'Transfer in'),
     )
+    # Types that take stock out of a location
+    OUTGOING_TYPES = ('sale', 'adjustment', 'transfer_out')
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='transactions')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, related_name='transactions')
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     quantity = models.IntegerField()
     previous_stock = models.IntegerField()
@@ -53,23 +108,81 @@ class StockTransaction(models.Model):
     created_by = models.ForeignKey('accounts.CustomUser', on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stocktx_product_created_idx'),
+            models.Index(fields=['transaction_type', 'created_at'], name='stocktx_type_created_idx'),
+            models.Index(fields=['created_at'], name='stocktx_created_idx'),
+        ]
+    
+    @property
+    def stock_change(self):
+        return -self.quantity if self.transaction_type in self.OUTGOING_TYPES else self.quantity
+    
     def save(self, *args, **kwargs):
-        if not self.previous_stock:
-            self.previous_stock = self.product.current_stock
+        if not self._state.adding:
+            # Ledger rows are history; edits never move stock again
+            return super().save(*args, **kwargs)
         
-        if self.transaction_type in ['sale', 'adjustment']:
-            self.new_stock = self.previous_stock - self.quantity
-        else:  # purchase, return
-            self.new_stock = self.previous_stock + self.quantity
+        from .stock import adjust_totals, default_location, lock_levels
+        
+        with transaction.atomic():
+            if self.location_id is None:
+                self.location = default_location()
+            # Only this location's row is locked; other stores keep selling
+            level = lock_levels(self.location_id, [self.product_id])[self.product_id]
+            self.previous_stock = level.quantity
+            self.new_stock = self.previous_stock + self.stock_change
+            
+            if self.unit_price and self.quantity:
+                self.total_amount = self.unit_price * self.quantity
             
-        if self.unit_price and self.quantity:
-            self.total_amount = self.unit_price * self.quantity
+            super().save(*args, **kwargs)
             
-        super().save(*args, **kwargs)
+            level.quantity = self.new_stock
+            level.save(update_fields=['quantity', 'updated_at'])
+            adjust_totals([self], [level])
         
-        # Update product stock
-        self.product.current_stock = self.new_stock
-        self.product.save()
+        # Keep the in-memory product in step with the row
+        self.product.current_stock += self.stock_change
+    
+    def __str__(self):
+        return f"{self.transaction_type} - {self.product.name} - {self.quantity}"
+
+class StockTransfer(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='transfers')
+    from_location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_out')
+    to_location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_in')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey('accounts.CustomUser', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='transfer_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product.name}: {self.from_location.code} -> {self.to_location.code}"
+
+class StockReservation(models.Model):
+    """Units of one stock row held for an open cart until ``expires_at``."""
+    cart = models.CharField(max_length=64)
+    stock = models.ForeignKey(LocationStock, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    expires_at = models.DateTimeField()
+    created_by = models.ForeignKey('accounts.CustomUser', on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'stock'], name='reservation_cart_stock_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+            models.Index(fields=['stock', 'expires_at'], name='reservation_stock_expires_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.transaction_type} - {self.product.name} - {self.quantity}"
\ No newline at end of file
+        return f"{self.cart}: {self.quantity}x {self.stock.product.name} until {self.expires_at}"
@@ -0,0 +1,184 @@
+"""
+Stock held for open carts.
+
+Tills reserve quantities as items are scanned, so two tills cannot both
+promise the last units and have one checkout fail at the end. A cart holds at
+most one ``StockReservation`` row per stock row (product and location); the
+cart's next scan overwrites it and pushes the expiry of everything the cart
+holds, so the store is only as large as the open cart lines.
+``LocationStock.reserved`` carries the sum of a stock row's reservations and
+is moved with a relative ``UPDATE`` in the transaction that writes them:
+available to sell is ``quantity - reserved`` on the stock row itself, never a
+sum over reservations.
+
+Holds lapse ``STOCK_RESERVATION_SECONDS`` after the cart last touched them.
+``release_expired()`` (the ``release_reservations`` command) walks the
+``expires_at`` index in batches and gives their units back. A reservation or
+sale that comes up short first releases the lapsed holds of only the
+products it is short of, so a sweeper that falls behind never turns a
+customer away. Every change locks the stock rows first, in product id order
+like any stock movement, and only then the reservations under them.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import LocationStock, StockReservation
+from .stock import InsufficientStock, lock_levels
+
+
+def expiry(now=None):
+    return (now or timezone.now()) + timedelta(seconds=settings.STOCK_RESERVATION_SECONDS)
+
+
+def shift_reserved(changes):
+    """Move ``reserved`` on each stock row id in ``changes`` by its amount, in one ``UPDATE``."""
+    # Rows moving by the same amount share a branch; a sweep touching
+    # hundreds of rows has only a handful of distinct amounts
+    by_change = {}
+    for stock_id, change in sorted(changes.items()):
+        if change:
+            by_change.setdefault(change, []).append(stock_id)
+    if by_change:
+        LocationStock.objects.filter(id__in=[stock_id for ids in by_change.values() for stock_id in ids]).update(
+            reserved=F('reserved') + Case(
+                *(When(id__in=ids, then=Value(change)) for change, ids in sorted(by_change.items())),
+                default=Value(0), output_field=IntegerField(),
+            ),
+        )
+
+
+def drop(holds, levels):
+    """
+    Delete ``holds`` and give their units back to ``levels``, locked stock
+    rows keyed by product id whose ``reserved`` is updated in place. Returns
+    the number of units released.
+    """
+    holds = list(holds)
+    if not holds:
+        return 0
+    StockReservation.objects.filter(id__in=[hold.id for hold in holds]).delete()
+    changes = {}
+    for hold in holds:
+        changes[hold.stock_id] = changes.get(hold.stock_id, 0) - hold.quantity
+    shift_reserved(changes)
+    by_id = {level.id: level for level in levels.values()}
+    for stock_id, change in changes.items():
+        if stock_id in by_id:
+            by_id[stock_id].reserved += change
+    return -sum(changes.values())
+
+
+def lock_cart(location_id, cart, product_ids=()):
+    """
+    Lock the stock rows ``cart`` holds at a location together with those of
+    ``product_ids``. Returns the rows keyed by product id and the cart's
+    reservations keyed by stock row id.
+    """
+    held = StockReservation.objects.filter(cart=cart, stock__location_id=location_id)
+    levels = lock_levels(location_id, {*product_ids, *held.values_list('stock__product_id', flat=True)})
+    holds = {hold.stock_id: hold for hold in held.select_for_update(of=('self',))}
+    return levels, holds
+
+
+def release_lapsed(levels, wanted, cart=None, now=None):
+    """
+    Release the expired holds of other carts on the locked ``levels`` that
+    cannot cover ``wanted``, a mapping of product id to units. Runs no query
+    unless some product is short while others hold it.
+    """
+    short = [
+        levels[product_id].id for product_id, quantity in wanted.items()
+        if levels[product_id].reserved > 0 and levels[product_id].available < quantity
+    ]
+    if not short:
+        return 0
+    lapsed = StockReservation.objects.filter(stock_id__in=short, expires_at__lte=now or timezone.now())
+    return drop(lapsed.exclude(cart=cart) if cart else lapsed, levels)
+
+
+@transaction.atomic
+def reserve(location, cart, quantities, user=None):
+    """
+    Hold ``quantities``, a mapping of product id to units, for ``cart`` at
+    ``location`` in place of what it held of those products (0 lets a
+    product go), and renew the expiry of everything the cart holds there.
+    Raises ``InsufficientStock`` if the units are sold or held by other carts.
+    """
+    levels, holds = lock_cart(location.id, cart, quantities)
+    now = timezone.now()
+    changes = {}
+    for product_id, quantity in quantities.items():
+        hold = holds.get(levels[product_id].id)
+        changes[product_id] = quantity - (hold.quantity if hold else 0)
+    release_lapsed(levels, changes, cart, now)
+    for product_id, change in sorted(changes.items()):
+        level = levels[product_id]
+        if change > 0 and level.available < change:
+            raise InsufficientStock(
+                f"Insufficient stock for {level.product.name} at {location.code}. "
+                f"Available: {max(level.available, 0)}"
+            )
+
+    expires_at = expiry(now)
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(cart=cart, stock=levels[product_id], quantity=quantity, expires_at=expires_at,
+                             created_by=user)
+            for product_id, quantity in sorted(quantities.items()) if quantity
+        ],
+        update_conflicts=True, unique_fields=['cart', 'stock'], update_fields=['quantity', 'expires_at'],
+    )
+    dropped = [levels[product_id].id for product_id, quantity in quantities.items() if not quantity]
+    if dropped:
+        StockReservation.objects.filter(cart=cart, stock_id__in=dropped).delete()
+    # Scanning anything keeps the whole cart alive
+    if holds:
+        StockReservation.objects.filter(cart=cart, stock_id__in=holds).update(expires_at=expires_at)
+    shift_reserved({levels[product_id].id: change for product_id, change in changes.items()})
+    for product_id, change in changes.items():
+        levels[product_id].reserved += change
+    return levels
+
+
+@transaction.atomic
+def release_cart(location, cart):
+    """Let go of everything ``cart`` holds at ``location``; returns the units released."""
+    levels, holds = lock_cart(location.id, cart)
+    return drop(holds.values(), levels)
+
+
+def take_cart(location_id, cart, product_ids):
+    """
+    ``lock_levels()`` for checking out ``cart``: its holds are released in the
+    same transaction, so the units it held are available to its own sale.
+    """
+    levels, holds = lock_cart(location_id, cart, product_ids)
+    drop(holds.values(), levels)
+    return levels
+
+
+def release_expired(batch_size=500, now=None):
+    """Release every hold that lapsed by ``now``, ``batch_size`` at a time; returns how many."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at')
+            .values_list('id', 'stock__location_id', 'stock__product_id')[:batch_size]
+        )
+        by_location = {}
+        for hold_id, location_id, product_id in batch:
+            by_location.setdefault(location_id, {})[hold_id] = product_id
+        for location_id, holds in sorted(by_location.items()):
+            with transaction.atomic():
+                levels = lock_levels(location_id, holds.values())
+                # A cart may have renewed them before the lock
+                lapsed = list(StockReservation.objects.select_for_update().filter(id__in=holds, expires_at__lte=now))
+                drop(lapsed, levels)
+                released += len(lapsed)
+        if len(batch) < batch_size:
+            return released
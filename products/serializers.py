@@ -1,21 +1,38 @@
 from rest_framework import serializers
-from .models import Category, Product, StockTransaction
+from inventory_backend.fastpath import ValuesSerializer
+from .models import Category, Location, LocationStock, Product, StockReservation, StockTransaction, StockTransfer
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+class LocationStockSerializer(serializers.ModelSerializer):
+    location_code = serializers.CharField(source='location.code', read_only=True)
+    
+    class Meta:
+        model = LocationStock
+        fields = ['location', 'location_code', 'quantity']
+
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     is_low_stock = serializers.BooleanField(read_only=True)
+    stock_levels = LocationStockSerializer(source='location_stocks', many=True, read_only=True)
     
     class Meta:
         model = Product
         fields = '__all__'
+        # Stock only moves through the ledger (restock, sales, transfers)
+        read_only_fields = ['current_stock']
 
 class StockTransactionSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
+    location_code = serializers.CharField(source='location.code', read_only=True)
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     
     class Meta:
@@ -23,8 +40,79 @@ class StockTransactionSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['previous_stock', 'new_stock', 'created_by', 'created_at']
 
+class LocationStockListSerializer(ValuesSerializer):
+    serializer_class = LocationStockSerializer
+
+class ProductListSerializer(ValuesSerializer):
+    serializer_class = ProductSerializer
+    nested = {'stock_levels': (LocationStockListSerializer, 'product')}
+    computed = {
+        'is_low_stock': (
+            ('current_stock', 'low_stock_threshold'),
+            lambda row: row['current_stock'] <= row['low_stock_threshold'],
+        ),
+    }
+
+class StockTransactionListSerializer(ValuesSerializer):
+    serializer_class = StockTransactionSerializer
+
 class RestockSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
     unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
-    notes = serializers.CharField(required=False, allow_blank=True)
\ No newline at end of file
+    notes = serializers.CharField(required=False, allow_blank=True)
+    location_id = serializers.IntegerField(required=False)
+
+class StockTransferSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    from_location_code = serializers.CharField(source='from_location.code', read_only=True)
+    to_location_code = serializers.CharField(source='to_location.code', read_only=True)
+    created_by_name = serializers.CharField(source='created_by.username', read_only=True)
+    
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+        read_only_fields = ['created_by', 'created_at']
+    
+    def validate(self, data):
+        if data['from_location'] == data['to_location']:
+            raise serializers.ValidationError("Choose two different locations.")
+        return data
+
+class StockTransferListSerializer(ValuesSerializer):
+    serializer_class = StockTransferSerializer
+
+# Cart ids come from the tills and appear in reservation URLs
+CART_PATTERN = r'[\w.-]+'
+
+class CartField(serializers.RegexField):
+    def __init__(self, **kwargs):
+        super().__init__(rf'^{CART_PATTERN}$', max_length=64, **kwargs)
+
+class ReservationItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    # 0 lets go of the product
+    quantity = serializers.IntegerField(min_value=0)
+
+class ReserveSerializer(serializers.Serializer):
+    cart = CartField()
+    location_id = serializers.IntegerField(required=False)
+    items = ReservationItemSerializer(many=True, allow_empty=False)
+    
+    def validate_items(self, value):
+        product_ids = [item['product_id'] for item in value]
+        if len(set(product_ids)) < len(product_ids):
+            raise serializers.ValidationError("Each product can only be listed once.")
+        found = set(Product.objects.filter(id__in=product_ids, is_active=True).values_list('id', flat=True))
+        missing = sorted(set(product_ids) - found)
+        if missing:
+            raise serializers.ValidationError(f"Product with ID {missing[0]} does not exist.")
+        return value
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField(source='stock.product_id', read_only=True)
+    available = serializers.IntegerField(source='stock.available', read_only=True)
+    
+    class Meta:
+        model = StockReservation
+        fields = ['product', 'quantity', 'available', 'expires_at']
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from changefeed.outbox import record_product_deleted
+from inventory_backend.caching import bump_version
+from .models import Category, Location, LocationStock, Product
+
+CATALOG_CACHE = 'catalog'
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+# Products list their stock levels with the location code
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    bump_version(CATALOG_CACHE)
+
+
+@receiver(post_save, sender=Product)
+def place_opening_stock(sender, instance, created, raw=False, **kwargs):
+    # Stock a product was created with belongs to the default location
+    if created and not raw and instance.current_stock:
+        from .stock import default_location
+
+        LocationStock.objects.create(
+            product=instance, location=default_location(), quantity=instance.current_stock,
+        )
+
+
+@receiver(post_delete, sender=Product)
+def publish_product_deleted(sender, instance, **kwargs):
+    # Deletion signals run inside the delete's transaction
+    record_product_deleted(instance.id)
+
+
+@receiver(pre_delete, sender=Category)
+def touch_category_products(sender, instance, **kwargs):
+    # SET_NULL clears the category with a plain UPDATE; bump the timestamps
+    # so product validators see the change
+    Product.objects.filter(category=instance).update(updated_at=timezone.now())
@@ -0,0 +1,174 @@
+"""
+Per-location stock movements.
+
+Stock is held in one ``LocationStock`` row per product and location, and
+``Product.current_stock`` carries the total across locations. A movement
+locks only the rows of the location it touches, in product id order, so
+checkouts in different stores never wait on each other's stock rows and
+concurrent baskets cannot deadlock. Product rows are shared by every store,
+so a movement never writes them: once it commits, one ``UPDATE`` sets the
+totals of the products it moved to the sum of their stock rows, along with
+``stock_updated_at``. Being recomputed rather than moved, a total that
+missed its refresh is corrected by the product's next movement. Catalog
+edits and stock movements touch different timestamps, so a sale neither
+counts as a catalog change nor drops the cached catalog. Every movement
+also writes its change feed events in the same transaction, with totals
+summed from the stock rows.
+
+Sales only sell what open carts have not reserved (see reservations.py); a
+sale for a cart releases that cart's holds under the same locks first.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from changefeed.outbox import record_stock
+from .models import Location, LocationStock, Product, StockTransaction, StockTransfer
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def default_location():
+    """The location used when a request does not name one."""
+    location, _ = Location.objects.get_or_create(
+        code=settings.DEFAULT_LOCATION_CODE, defaults={'name': 'Main store'}
+    )
+    return location
+
+
+def get_location(location_id):
+    if location_id is None:
+        return default_location()
+    return Location.objects.get(id=location_id, is_active=True)
+
+
+def lock_levels(location_id, product_ids):
+    """
+    Lock and return the ``LocationStock`` rows of ``product_ids`` at a
+    location, keyed by product id, creating empty rows where needed.
+    """
+    product_ids = sorted(set(product_ids))
+    levels = lock_existing_levels(location_id, product_ids)
+    if len(levels) < len(product_ids):
+        LocationStock.objects.bulk_create(
+            [
+                LocationStock(location_id=location_id, product_id=product_id)
+                for product_id in product_ids if product_id not in levels
+            ],
+            ignore_conflicts=True,
+        )
+        levels = lock_existing_levels(location_id, product_ids)
+    return levels
+
+
+def lock_existing_levels(location_id, product_ids):
+    levels = LocationStock.objects.select_for_update().filter(
+        location_id=location_id, product_id__in=product_ids,
+    ).order_by('product_id')
+    return {level.product_id: level for level in levels}
+
+
+def stock_totals(product_ids):
+    """Each product's stock summed over its locations, keyed by product id."""
+    return dict(
+        LocationStock.objects.filter(product_id__in=product_ids).order_by().values('product_id')
+        .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+
+def refresh_totals(product_ids):
+    """Set ``current_stock`` of ``product_ids`` to the sum of their stock rows."""
+    summed = LocationStock.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('quantity'),
+    ).values('total')
+    Product.objects.filter(id__in=product_ids).update(
+        current_stock=Coalesce(Subquery(summed), 0), stock_updated_at=timezone.now(),
+    )
+
+
+def adjust_totals(transactions, levels):
+    """
+    Publish the new ``levels`` and product totals to the change feed, and
+    refresh the products' ``current_stock`` once the transaction commits.
+    """
+    product_ids = sorted({entry.product_id for entry in transactions})
+    record_stock(levels, stock_totals(product_ids))
+    # The movement is committed by then; a failed refresh is logged, and the
+    # next movement of the product sets its total again
+    transaction.on_commit(partial(refresh_totals, product_ids), robust=True)
+
+
+def record_movements(location, movements, user=None, cart=None):
+    """
+    Apply ``movements``, a list of ``(product, transaction_type, quantity,
+    unit_price, notes)``, at ``location`` and write their ledger rows.
+    Raises ``InsufficientStock`` if an outgoing movement would take a
+    product's stock at the location below zero, or a sale would take units
+    other carts hold. A sale for ``cart`` consumes the cart's reservations.
+    Call inside a transaction.
+    """
+    transactions, levels = move_stock(location, movements, user, cart)
+    adjust_totals(transactions, levels)
+    return transactions
+
+
+def move_stock(location, movements, user, cart=None):
+    """Location side of ``record_movements()``; returns the ledger rows and the changed levels."""
+    from .reservations import release_lapsed, take_cart
+
+    product_ids = [product.id for product, *_ in movements]
+    levels = take_cart(location.id, cart, product_ids) if cart else lock_levels(location.id, product_ids)
+    sold = {}
+    for product, transaction_type, quantity, *_ in movements:
+        if transaction_type == 'sale':
+            sold[product.id] = sold.get(product.id, 0) + quantity
+    release_lapsed(levels, sold, cart)
+    now = timezone.now()
+    transactions = []
+    for product, transaction_type, quantity, unit_price, notes in movements:
+        level = levels[product.id]
+        entry = StockTransaction(
+            product=product, location=location, transaction_type=transaction_type, quantity=quantity,
+            unit_price=unit_price, total_amount=unit_price * quantity if unit_price else None,
+            previous_stock=level.quantity, created_by=user, notes=notes,
+        )
+        entry.new_stock = level.quantity + entry.stock_change
+        # Other carts' holds are off limits to sales, not to adjustments or transfers
+        held = level.reserved if transaction_type == 'sale' else 0
+        if entry.stock_change < 0 and entry.new_stock < held:
+            raise InsufficientStock(
+                f"Insufficient stock for {product.name} at {location.code}. "
+                f"Available: {max(level.quantity - held, 0)}"
+            )
+        level.quantity, level.updated_at = entry.new_stock, now
+        transactions.append(entry)
+
+    StockTransaction.objects.bulk_create(transactions)
+    changed = [levels[product_id] for product_id in {entry.product_id for entry in transactions}]
+    LocationStock.objects.bulk_update(changed, ['quantity', 'updated_at'])
+    return transactions, changed
+
+
+@transaction.atomic
+def transfer_stock(product, from_location, to_location, quantity, user=None, notes=''):
+    """Move stock between two locations; the product total does not change."""
+    transfer = StockTransfer.objects.create(
+        product=product, from_location=from_location, to_location=to_location,
+        quantity=quantity, created_by=user, notes=notes,
+    )
+    note = notes or f'Transfer #{transfer.id}'
+    # Lock the two locations in id order, like every other movement
+    transactions, levels = [], []
+    for location in sorted((from_location, to_location), key=lambda location: location.id):
+        transaction_type = 'transfer_out' if location == from_location else 'transfer_in'
+        moved, changed = move_stock(location, [(product, transaction_type, quantity, None, note)], user)
+        transactions += moved
+        levels += changed
+    adjust_totals(transactions, levels)
+    return transfer
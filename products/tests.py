@@ -1,3 +1,389 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+
+from inventory_backend.caching import get_version
+from inventory_backend.testing import Endpoint, QueryBudgetMixin
+from .models import Category, Location, LocationStock, Product, StockReservation, StockTransaction, StockTransfer
+from .reservations import release_expired, reserve
+from .signals import CATALOG_CACHE
+from .stock import default_location, record_movements, transfer_stock
+
+
+class ProductQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('category-list', 'category-list', budget=3),
+        Endpoint('category-detail', 'category-detail', budget=1,
+                 kwargs=lambda case: {'pk': case.first_id(Category)}),
+        Endpoint('product-list', 'product-list', budget=4),
+        Endpoint('product-list-low-stock', 'product-list', budget=4, query={'low_stock': 'true'}),
+        Endpoint('product-detail', 'product-detail', budget=2,
+                 kwargs=lambda case: {'pk': case.first_id(Product)}),
+        Endpoint('product-restock', 'product-restock', budget=12, method='POST',
+                 data=lambda case: {'product_id': case.first_id(Product), 'quantity': 5, 'unit_price': '1.00'}),
+        Endpoint('stocktransaction-list', 'stocktransaction-list', budget=2),
+        Endpoint('stocktransaction-list-product', 'stocktransaction-list', budget=2,
+                 query=lambda case: {'product': case.first_id(Product)}),
+        Endpoint('stocktransaction-detail', 'stocktransaction-detail', budget=1,
+                 kwargs=lambda case: {'pk': case.first_id(StockTransaction)}),
+        Endpoint('location-list', 'location-list', budget=2),
+        Endpoint('location-detail', 'location-detail', budget=1,
+                 kwargs=lambda case: {'pk': case.first_id(Location)}),
+        Endpoint('stocktransfer-list', 'stocktransfer-list', budget=2),
+        Endpoint('stocktransfer-list-location', 'stocktransfer-list', budget=2,
+                 query=lambda case: {'location': case.first_id(Location)}),
+        Endpoint('stocktransfer-detail', 'stocktransfer-detail', budget=1,
+                 kwargs=lambda case: {'pk': case.first_id(StockTransfer)}),
+        Endpoint('stocktransfer-create', 'stocktransfer-list', budget=16, method='POST', status=201,
+                 data=lambda case: {
+                     'product': case.first_id(Product), 'from_location': case.first_id(Location),
+                     'to_location': case.warehouse.id, 'quantity': 1,
+                 }),
+        Endpoint('reservation-create', 'reservation-list', budget=11, method='POST',
+                 data=lambda case: {'cart': case.cart, 'items': [
+                     {'product_id': product_id, 'quantity': 1} for product_id in case.stocked[:2]
+                 ]}),
+        Endpoint('reservation-detail', 'reservation-detail', budget=2, kwargs=lambda case: {'cart': case.cart}),
+        Endpoint('reservation-release', 'reservation-detail', budget=8, method='DELETE', status=204,
+                 kwargs=lambda case: {'cart': case.cart}),
+    ]
+
+    def seed(self, count):
+        super().seed(count)
+        # Put part of the catalog under its threshold so the low-stock filter returns rows
+        Product.objects.filter(id__in=Product.objects.order_by('-id').values('id')[:count // 2 + 1]).update(
+            low_stock_threshold=F('current_stock')
+        )
+        # Spread stock over a second location
+        self.warehouse, _ = Location.objects.get_or_create(code='WH', defaults={'name': 'Warehouse', 'kind': 'warehouse'})
+        main = default_location()
+        for product in Product.objects.order_by('-id')[:count]:
+            transfer_stock(product, main, self.warehouse, 2)
+        # An open cart already holding one product
+        self.stocked = list(LocationStock.objects.filter(location=main, quantity__gte=5).order_by(
+            '-quantity', 'product_id',
+        ).values_list('product_id', flat=True)[:2])
+        self.cart = f'till-{self.seeded}'
+        reserve(main, self.cart, {self.stocked[0]: 1})
+
+
+class CatalogConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(CustomUser.objects.create_user('clerk'))
+        self.category = Category.objects.create(name='Drinks')
+        self.product = Product.objects.create(
+            name='Cola', sku='COLA-1', category=self.category, price='1.50', cost_price='0.80'
+        )
+        Product.objects.create(name='Water', sku='WATER-1', price='1.00', cost_price='0.40')
+        self.url = reverse('product-list')
+
+    def test_current_etag_gets_304_from_the_validator_query_alone(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unchanged_page_is_served_from_the_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+
+    def test_product_write_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.product.price = '2.00'
+        self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['price'], '2.00')
+
+    def test_category_changes_reach_product_pages(self):
+        etag = self.client.get(self.url)['ETag']
+        self.category.name = 'Soft drinks'
+        self.category.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['results'][0]['category_name'], 'Soft drinks')
+
+        self.category.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('category_name', response.data['results'][0])
+
+    def test_stock_movements_change_the_etag_but_not_the_catalog(self):
+        categories = reverse('category-list')
+        self.client.get(categories)
+        etag = self.client.get(self.url)['ETag']
+        version = get_version(CATALOG_CACHE)
+        updated_at = self.product.updated_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransaction.objects.create(product=self.product, transaction_type='purchase', quantity=4)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['current_stock'], 4)
+        self.assertEqual(get_version(CATALOG_CACHE), version)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.updated_at, updated_at)
+        with self.assertNumQueries(1):
+            self.client.get(categories)
+
+    def test_location_changes_reach_product_pages(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransaction.objects.create(product=self.product, transaction_type='purchase', quantity=4)
+        detail = reverse('product-detail', args=[self.product.pk])
+        etags = {url: self.client.get(url)['ETag'] for url in (self.url, detail)}
+        location = default_location()
+        location.code = 'FRONT'
+        location.save()
+        for url, etag in etags.items():
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock_levels'][0]['location_code'], 'FRONT')
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['stock_levels'][0]['location_code'], 'FRONT')
+
+    def test_deleted_and_deactivated_products_leave_the_list(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        since = http_date(timezone.now().timestamp() + 60)
+
+        self.product.is_active = False
+        self.product.save()
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']}, {'HTTP_IF_MODIFIED_SINCE': since}):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([product['sku'] for product in response.data['results']], ['WATER-1'])
+
+        Product.objects.get(sku='WATER-1').delete()
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']}, {'HTTP_IF_MODIFIED_SINCE': since}):
+            response = self.client.get(self.url, **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['results'], [])
+
+    def test_detail_supports_conditional_get(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+
+class LocationStockTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(CustomUser.objects.create_user('clerk'))
+        self.store = default_location()
+        self.warehouse = Location.objects.create(name='Warehouse', code='WH', kind='warehouse')
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+
+    def levels(self):
+        return dict(self.product.location_stocks.values_list('location__code', 'quantity'))
+
+    def restock(self, location, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('product-restock'), {
+                'product_id': self.product.id, 'location_id': location.id, 'quantity': quantity,
+                'unit_price': '0.80',
+            })
+
+    def transfer(self, from_location, to_location, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('stocktransfer-list'), {
+                'product': self.product.id, 'from_location': from_location.id, 'to_location': to_location.id,
+                'quantity': quantity,
+            })
+
+    def test_restock_adds_to_one_location_and_the_total(self):
+        response = self.restock(self.warehouse, 30)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(level['location_code'], level['quantity']) for level in response.data['stock_levels']], [('WH', 30)]
+        )
+        # Outside a test's transaction the response already carries the new total
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 30)
+        entry = StockTransaction.objects.get(product=self.product)
+        self.assertEqual((entry.location, entry.previous_stock, entry.new_stock), (self.warehouse, 0, 30))
+
+    def test_transfer_moves_stock_between_locations(self):
+        self.restock(self.warehouse, 30)
+        response = self.transfer(self.warehouse, self.store, 12)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.levels(), {'WH': 18, 'MAIN': 12})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 30)
+        self.assertEqual(
+            sorted(StockTransaction.objects.filter(transaction_type__startswith='transfer')
+                   .values_list('transaction_type', 'location__code', 'new_stock')),
+            [('transfer_in', 'MAIN', 12), ('transfer_out', 'WH', 18)],
+        )
+
+    def test_transfer_cannot_take_more_than_the_source_holds(self):
+        self.restock(self.store, 5)
+        response = self.transfer(self.store, self.warehouse, 6)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Available: 5', response.data['error'])
+        self.assertEqual(self.levels(), {'MAIN': 5})
+        self.assertFalse(StockTransfer.objects.exists())
+
+    def test_movements_leave_product_rows_to_the_commit(self):
+        self.restock(self.store, 5)
+        with self.captureOnCommitCallbacks() as callbacks, transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                record_movements(self.warehouse, [(self.product, 'purchase', 7, None, '')])
+        self.assertFalse([query for query in captured if query['sql'].startswith('UPDATE "products_product"')])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 5)
+
+        callbacks[0]()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.current_stock, 12)
+        self.assertIsNotNone(self.product.stock_updated_at)
+
+    def test_opening_stock_lands_in_the_default_location(self):
+        product = Product.objects.create(name='Water', sku='WATER-1', price='1.00', cost_price='0.40', current_stock=7)
+        self.assertEqual(list(product.location_stocks.values_list('location__code', 'quantity')), [('MAIN', 7)])
+
+
+class LocationTests(APITestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user('manager', user_type='admin')
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+        self.store = default_location()
+
+    def test_workers_can_read_but_not_change_locations(self):
+        self.assertEqual(self.client.get(reverse('location-list')).status_code, 200)
+        response = self.client.post(reverse('location-list'), {'name': 'Uptown', 'code': 'UP'})
+        self.assertEqual(response.status_code, 403)
+        url = reverse('location-detail', args=[self.store.pk])
+        self.assertEqual(self.client.patch(url, {'is_active': False}).status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        self.assertTrue(Location.objects.filter(pk=self.store.pk, is_active=True).exists())
+
+    def test_admins_manage_locations(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse('location-list'), {'name': 'Uptown', 'code': 'UP'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.delete(reverse('location-detail', args=[response.data['id']])).status_code, 204)
+
+    def test_locations_with_history_cannot_be_deleted(self):
+        product = Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+        StockTransaction.objects.create(product=product, location=self.store, transaction_type='purchase', quantity=3)
+        self.client.force_authenticate(self.admin)
+        response = self.client.delete(reverse('location-detail', args=[self.store.pk]))
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('deactivate it instead', response.data['error'])
+        self.assertTrue(Location.objects.filter(pk=self.store.pk).exists())
+
+
+class ReservationTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('till'))
+        self.store = default_location()
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='1.50', cost_price='0.80')
+        StockTransaction.objects.create(
+            product=self.product, location=self.store, transaction_type='purchase', quantity=5,
+        )
+
+    def reserve(self, cart, quantity, product=None):
+        return self.client.post(reverse('reservation-list'), {
+            'cart': cart, 'items': [{'product_id': (product or self.product).id, 'quantity': quantity}],
+        }, format='json')
+
+    def sell(self, quantity, **extra):
+        return self.client.post(reverse('sale-create-sale'), {
+            'items': [{'product_id': self.product.id, 'quantity': quantity}], **extra,
+        }, format='json')
+
+    def level(self):
+        return LocationStock.objects.get(product=self.product, location=self.store)
+
+    def expire(self, cart):
+        StockReservation.objects.filter(cart=cart).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_holds_reduce_what_other_carts_and_sales_can_take(self):
+        response = self.reserve('till-1', 4)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(item['product'], item['quantity'], item['available']) for item in response.data['items']],
+            [(self.product.id, 4, 1)],
+        )
+        response = self.reserve('till-2', 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Available: 1', response.data['error'])
+        self.assertEqual(self.sell(2).status_code, 400)
+        self.assertEqual(self.sell(1).status_code, 201)
+        self.assertEqual((self.level().quantity, self.level().reserved), (4, 4))
+
+    def test_rescanning_replaces_the_hold_and_zero_lets_go(self):
+        self.reserve('till-1', 2)
+        self.reserve('till-1', 5)
+        self.assertEqual(self.level().reserved, 5)
+        response = self.reserve('till-1', 0)
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(self.level().reserved, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_scanning_renews_the_whole_cart(self):
+        other = Product.objects.create(name='Water', sku='WATER-1', price='1.00', cost_price='0.40', current_stock=3)
+        self.reserve('till-1', 1)
+        self.expire('till-1')
+        self.reserve('till-1', 1, product=other)
+        self.assertFalse(StockReservation.objects.filter(expires_at__lte=timezone.now()).exists())
+
+    def test_release_and_read_a_cart(self):
+        self.reserve('till-1', 3)
+        url = reverse('reservation-detail', kwargs={'cart': 'till-1'})
+        self.assertEqual(self.client.get(url).data['items'][0]['quantity'], 3)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).data['items'], [])
+        self.assertEqual(self.level().reserved, 0)
+
+    def test_checkout_uses_up_the_carts_own_holds(self):
+        self.reserve('till-1', 5)
+        self.assertEqual(self.sell(5).status_code, 400)
+        response = self.sell(5, cart='till-1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((self.level().quantity, self.level().reserved), (0, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_expired_holds_give_way_without_the_sweeper(self):
+        self.reserve('till-1', 5)
+        self.expire('till-1')
+        self.assertEqual(self.reserve('till-2', 2).status_code, 200)
+        self.assertEqual(self.sell(3).status_code, 201)
+        self.assertEqual(list(StockReservation.objects.values_list('cart', 'quantity')), [('till-2', 2)])
+        self.assertEqual(self.level().reserved, 2)
+
+    def test_sweeper_releases_only_expired_holds(self):
+        warehouse = Location.objects.create(name='Warehouse', code='WH', kind='warehouse')
+        transfer_stock(self.product, self.store, warehouse, 2)
+        for cart in ('till-1', 'till-2'):
+            self.reserve(cart, 1)
+        self.client.post(reverse('reservation-list'), {
+            'cart': 'wh-1', 'location_id': warehouse.id, 'items': [{'product_id': self.product.id, 'quantity': 2}],
+        }, format='json')
+        self.expire('till-1')
+        self.expire('wh-1')
+        self.assertEqual(release_expired(batch_size=1), 2)
+        self.assertEqual(list(StockReservation.objects.values_list('cart', flat=True)), ['till-2'])
+        self.assertEqual(
+            dict(LocationStock.objects.values_list('location__code', 'reserved')), {'MAIN': 1, 'WH': 0}
+        )
+
+    def test_cart_ids_are_checked(self):
+        response = self.reserve('till 1/x', 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cart', response.data)
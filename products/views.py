@@ -4,24 +4,65 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
+from django.db.models import Prefetch, ProtectedError
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from .models import Category, Product, StockTransaction
+from accounts.permissions import IsAdminOrReadOnly
+from inventory_backend.caching import ConditionalListMixin
+from inventory_backend.fastpath import FastListMixin
+from .models import Category, Location, LocationStock, Product, StockReservation, StockTransaction, StockTransfer
+from .signals import CATALOG_CACHE
+from .reservations import release_cart, reserve
+from .stock import InsufficientStock, get_location, record_movements, transfer_stock
 from .serializers import (
     CategorySerializer, 
+    LocationSerializer,
     ProductSerializer, 
+    ProductListSerializer,
     StockTransactionSerializer,
-    RestockSerializer
+    StockTransactionListSerializer,
+    StockTransferSerializer,
+    StockTransferListSerializer,
+    RestockSerializer,
+    ReserveSerializer,
+    StockReservationSerializer,
+    CART_PATTERN,
 )
 
-class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+STOCK_LEVELS = Prefetch('location_stocks', queryset=LocationStock.objects.select_related('location').order_by('id'))
+
+class CategoryViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    cache_namespace = CATALOG_CACHE
+
+class LocationViewSet(viewsets.ModelViewSet):
+    queryset = Location.objects.order_by('id')
+    serializer_class = LocationSerializer
+    permission_classes = [IsAdminOrReadOnly]
+    
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            # Stock, ledger rows, transfers and sales keep the location; deactivate it instead
+            return Response(
+                {'error': 'This location has stock or history and cannot be deleted; deactivate it instead.'},
+                status=status.HTTP_409_CONFLICT,
+            )
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.filter(is_active=True)
+class ProductViewSet(ConditionalListMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.filter(is_active=True).select_related('category').prefetch_related(
+        STOCK_LEVELS
+    ).order_by('id')
     serializer_class = ProductSerializer
+    list_serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticated]
+    cache_namespace = CATALOG_CACHE
+    conditional_fields = (
+        'updated_at', 'stock_updated_at', 'category__updated_at', 'location_stocks__location__updated_at',
+    )
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -42,30 +83,29 @@ class ProductViewSet(viewsets.ModelViewSet):
             try:
                 with transaction.atomic():
                     product = get_object_or_404(Product, id=serializer.validated_data['product_id'])
+                    location = get_location(serializer.validated_data.get('location_id'))
                     
                     # Create stock transaction
-                    StockTransaction.objects.create(
-                        product=product,
-                        transaction_type='purchase',
-                        quantity=serializer.validated_data['quantity'],
-                        unit_price=serializer.validated_data['unit_price'],
-                        notes=serializer.validated_data.get('notes', ''),
-                        created_by=request.user
-                    )
-                    
-                    # Refresh product data
-                    product.refresh_from_db()
-                    
-                    return Response(ProductSerializer(product).data, status=status.HTTP_200_OK)
-                    
+                    record_movements(location, [(
+                        product,
+                        'purchase',
+                        serializer.validated_data['quantity'],
+                        serializer.validated_data['unit_price'],
+                        serializer.validated_data.get('notes', ''),
+                    )], request.user)
             except Exception as e:
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Refresh product data; the total follows the commit
+            product = Product.objects.select_related('category').prefetch_related(STOCK_LEVELS).get(id=product.id)
+            return Response(ProductSerializer(product).data, status=status.HTTP_200_OK)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class StockTransactionViewSet(viewsets.ModelViewSet):
-    queryset = StockTransaction.objects.all().select_related('product', 'created_by')
+class StockTransactionViewSet(FastListMixin, viewsets.ModelViewSet):
+    queryset = StockTransaction.objects.all().select_related('product', 'location', 'created_by')
     serializer_class = StockTransactionSerializer
+    list_serializer_class = StockTransactionListSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
@@ -75,4 +115,82 @@ class StockTransactionViewSet(viewsets.ModelViewSet):
         if product_id:
             queryset = queryset.filter(product_id=product_id)
             
-        return queryset.order_by('-created_at')
\ No newline at end of file
+        return queryset.order_by('-created_at')
+
+class StockTransferViewSet(FastListMixin, viewsets.ModelViewSet):
+    queryset = StockTransfer.objects.select_related('product', 'from_location', 'to_location', 'created_by')
+    serializer_class = StockTransferSerializer
+    list_serializer_class = StockTransferListSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'head', 'options']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        location_id = self.request.query_params.get('location', None)
+        
+        if location_id:
+            queryset = queryset.filter(
+                models.Q(from_location_id=location_id) | models.Q(to_location_id=location_id)
+            )
+            
+        return queryset.order_by('-created_at', '-id')
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            transfer = transfer_stock(
+                data['product'], data['from_location'], data['to_location'], data['quantity'],
+                user=request.user, notes=data.get('notes', ''),
+            )
+        except InsufficientStock as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        transfer = self.get_queryset().get(id=transfer.id)
+        return Response(self.get_serializer(transfer).data, status=status.HTTP_201_CREATED)
+
+class ReservationViewSet(viewsets.ViewSet):
+    """
+    Stock held for a till's open cart. ``POST`` sets what the cart holds of
+    the listed products and renews its expiry; ``GET`` and ``DELETE`` on the
+    cart id read or release its holds at ``?location=`` (default location
+    when left out).
+    """
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'cart'
+    lookup_value_regex = CART_PATTERN
+    
+    def location(self, location_id):
+        try:
+            return get_location(location_id)
+        except (Location.DoesNotExist, ValueError):
+            raise Http404("Location not found.")
+    
+    def cart_response(self, location, cart, status_code=status.HTTP_200_OK):
+        holds = StockReservation.objects.filter(cart=cart, stock__location=location).select_related(
+            'stock'
+        ).order_by('stock__product_id')
+        return Response({
+            'cart': cart,
+            'location': location.id,
+            'items': StockReservationSerializer(holds, many=True).data,
+        }, status=status_code)
+    
+    def create(self, request):
+        serializer = ReserveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        location = self.location(data.get('location_id'))
+        try:
+            reserve(location, data['cart'], {item['product_id']: item['quantity'] for item in data['items']},
+                    user=request.user)
+        except InsufficientStock as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self.cart_response(location, data['cart'])
+    
+    def retrieve(self, request, cart=None):
+        return self.cart_response(self.location(request.query_params.get('location')), cart)
+    
+    def destroy(self, request, cart=None):
+        release_cart(self.location(request.query_params.get('location')), cart)
+        return Response(status=status.HTTP_204_NO_CONTENT)
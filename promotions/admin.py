@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Promotion
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'value', 'starts_at', 'ends_at', 'priority', 'is_active']
+    list_filter = ['kind', 'is_active']
+    search_fields = ['name']
+    autocomplete_fields = ['products', 'categories']
+    readonly_fields = ['created_at', 'updated_at']
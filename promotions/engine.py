@@ -0,0 +1,247 @@
+"""
+Server-side pricing for checkout and quotes.
+
+Active promotions are compiled into lookup tables keyed by product id and by
+category id, plus the list of rules that apply to every product. A cart line
+only looks at its own product's and category's rules, so the cost of
+pricing a cart does not depend on how many rules exist in total.
+
+For the moment being priced the tables are narrowed to a snapshot of the
+rules in force, and each group of interchangeable rules (same kind, same
+buy/get quantities) is pruned to the ones that can still win: a rule with a
+smaller value and no better priority never gives the best discount. Per
+product, the candidates from its own, its category's and the storewide
+rules are merged once and kept with the snapshot, which lasts until the
+next start, end or daily window boundary of any rule. A cart line then
+evaluates a handful of rules however many exist.
+
+The compiled tables are kept per process and rebuilt when the rules change.
+Like ``ConditionalListMixin`` the version comes from the database (the
+promotion count and newest ``updated_at``), so every process notices a
+change without a shared cache; checking it is one small aggregate per cart.
+Time windows are checked when a cart is priced, so a rule starting later
+needs no rebuild.
+
+Each line gets the single best discount among the rules that apply to it;
+rules do not stack. Equal discounts go to the higher ``priority``, then to
+the older rule.
+"""
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Promotion
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+ZERO = Decimal('0.00')
+
+# rate is value / 100, the share of the price a percentage or free unit takes off
+Rule = namedtuple('Rule', 'id name kind value rate buy get starts_at ends_at daily_start daily_end priority')
+
+PricedLine = namedtuple(
+    'PricedLine', 'product quantity unit_price total_price discount_amount promotion_id promotion_name'
+)
+
+
+class CompiledRules:
+    def __init__(self, by_product, by_category, storewide):
+        self.by_product = by_product
+        self.by_category = by_category
+        self.storewide = storewide
+        self.snapshot = None
+
+    def rules(self):
+        seen = {}
+        for bucket in (*self.by_product.values(), *self.by_category.values(), self.storewide):
+            for rule in bucket:
+                seen[rule.id] = rule
+        return seen.values()
+
+    def at(self, now):
+        """The ``RuleSnapshot`` in force at ``now``."""
+        snapshot = self.snapshot
+        if snapshot is None or not snapshot.covers(now):
+            snapshot = self.snapshot = RuleSnapshot(self, now)
+        return snapshot
+
+
+class RuleSnapshot:
+    def __init__(self, compiled, now):
+        local = timezone.localtime(now)
+        self.valid_from = now
+        self.valid_until = next_change(compiled.rules(), local)
+
+        def in_force(bucket):
+            return [rule for rule in bucket if in_window(rule, now, local.time())]
+
+        self.by_product = {key: in_force(bucket) for key, bucket in compiled.by_product.items()}
+        self.by_category = {key: in_force(bucket) for key, bucket in compiled.by_category.items()}
+        self.storewide = in_force(compiled.storewide)
+        self.merged = {}
+
+    def covers(self, now):
+        return self.valid_from <= now and (self.valid_until is None or now < self.valid_until)
+
+    def candidates(self, product_id, category_id):
+        key = (product_id, category_id)
+        candidates = self.merged.get(key)
+        if candidates is None:
+            candidates = self.merged[key] = prune([
+                *self.by_product.get(product_id, ()), *self.by_category.get(category_id, ()), *self.storewide,
+            ])
+        return candidates
+
+
+def prune(rules):
+    """
+    The rules that can give the best discount for some line: within a group
+    of rules whose discount grows with ``value``, a rule is only kept when
+    it would win a tie against every rule with a larger value.
+    """
+    kept, best = [], {}
+    for rule in sorted(set(rules), key=lambda rule: (-rule.value, -rule.priority, rule.id)):
+        group = (rule.kind, rule.buy, rule.get)
+        rank = (rule.priority, -rule.id)
+        if group not in best or rank > best[group]:
+            best[group] = rank
+            kept.append(rule)
+    return tuple(kept)
+
+
+def next_change(rules, local):
+    """The first moment after ``local`` at which any rule starts or stops applying."""
+    changes = []
+    for rule in rules:
+        changes.extend(moment for moment in (rule.starts_at, rule.ends_at) if moment and moment > local)
+        for boundary in (rule.daily_start, rule.daily_end):
+            if boundary is not None:
+                moment = local.replace(
+                    hour=boundary.hour, minute=boundary.minute, second=boundary.second,
+                    microsecond=boundary.microsecond,
+                )
+                changes.append(moment if moment > local else moment + timedelta(days=1))
+    return min(changes, default=None)
+
+
+_compiled = (None, None)
+_lock = threading.Lock()
+
+
+def rules_version():
+    return tuple(Promotion.objects.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+
+
+def compile_rules(now=None):
+    """Active rules that have not ended, in lookup tables."""
+    now = now or timezone.now()
+    promotions = Promotion.objects.filter(is_active=True).filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+    rules = {
+        row['id']: Rule(
+            row['id'], row['name'], row['kind'], row['value'], row['value'] / HUNDRED, row['buy_quantity'], row['get_quantity'],
+            row['starts_at'], row['ends_at'], row['daily_start'], row['daily_end'], row['priority'],
+        )
+        for row in promotions.values(
+            'id', 'name', 'kind', 'value', 'buy_quantity', 'get_quantity', 'starts_at', 'ends_at',
+            'daily_start', 'daily_end', 'priority',
+        )
+    }
+    by_product, by_category, scoped = {}, {}, set()
+    if rules:
+        links = (
+            (by_product, Promotion.products.through.objects.filter(promotion_id__in=rules)
+             .values_list('promotion_id', 'product_id')),
+            (by_category, Promotion.categories.through.objects.filter(promotion_id__in=rules)
+             .values_list('promotion_id', 'category_id')),
+        )
+        for table, pairs in links:
+            for rule_id, key in pairs:
+                table.setdefault(key, []).append(rules[rule_id])
+                scoped.add(rule_id)
+
+    def ordered(bucket):
+        return tuple(sorted(bucket, key=lambda rule: (-rule.priority, rule.id)))
+
+    return CompiledRules(
+        {key: ordered(bucket) for key, bucket in by_product.items()},
+        {key: ordered(bucket) for key, bucket in by_category.items()},
+        ordered(rule for rule_id, rule in rules.items() if rule_id not in scoped),
+    )
+
+
+def active_rules():
+    """The compiled rules, rebuilt only when the promotions changed."""
+    global _compiled
+    version = rules_version()
+    compiled_version, rules = _compiled
+    if compiled_version != version:
+        with _lock:
+            rules = compile_rules()
+            _compiled = (version, rules)
+    return rules
+
+
+def in_window(rule, now, local_time):
+    if rule.starts_at is not None and now < rule.starts_at:
+        return False
+    if rule.ends_at is not None and now >= rule.ends_at:
+        return False
+    if rule.daily_start is None:
+        return True
+    if rule.daily_start <= rule.daily_end:
+        return rule.daily_start <= local_time < rule.daily_end
+    return local_time >= rule.daily_start or local_time < rule.daily_end
+
+
+def rule_discount(rule, quantity, unit_price):
+    if rule.kind == 'percentage':
+        discount = unit_price * quantity * rule.rate
+    elif rule.kind == 'fixed':
+        discount = (rule.value if rule.value < unit_price else unit_price) * quantity
+    else:
+        free_units = quantity // (rule.buy + rule.get) * rule.get
+        if not free_units:
+            return ZERO
+        discount = free_units * unit_price * rule.rate
+    return discount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_lines(lines, now=None, rules=None):
+    """
+    Price ``lines``, a list of ``(product, quantity)``, at the products'
+    current prices with the best promotion for each line.
+    """
+    now = now or timezone.now()
+    snapshot = (rules or active_rules()).at(now)
+    priced = []
+    for product, quantity in lines:
+        unit_price = product.price
+        best, best_discount = None, ZERO
+        for rule in snapshot.candidates(product.id, product.category_id):
+            discount = rule_discount(rule, quantity, unit_price)
+            if discount > best_discount or (
+                discount and discount == best_discount and (rule.priority, best.id) > (best.priority, rule.id)
+            ):
+                best, best_discount = rule, discount
+        priced.append(PricedLine(
+            product, quantity, unit_price, unit_price * quantity, best_discount,
+            best.id if best else None, best.name if best else None,
+        ))
+    return priced
+
+
+class Quote:
+    """A priced cart and its totals, as checkout will record them."""
+
+    def __init__(self, lines, tax_amount=0, manual_discount=0, now=None):
+        self.lines = price_lines(lines, now)
+        self.tax_amount = tax_amount
+        self.manual_discount = manual_discount
+        self.total_amount = sum((line.total_price for line in self.lines), Decimal('0.00'))
+        self.promotion_discount = sum((line.discount_amount for line in self.lines), Decimal('0.00'))
+        self.discount_amount = self.promotion_discount + manual_discount
+        self.final_amount = self.total_amount + tax_amount - self.discount_amount
@@ -0,0 +1,53 @@
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models
+from products.models import Category, Product
+
+class Promotion(models.Model):
+    """
+    A pricing rule for checkout. It applies to the listed products and the
+    products in the listed categories, or to every product when neither is
+    given, between ``starts_at`` and ``ends_at`` and, when set, only between
+    ``daily_start`` and ``daily_end`` local time (which may wrap past
+    midnight).
+    """
+    KINDS = (
+        ('percentage', 'Percentage off'),
+        ('fixed', 'Fixed amount off each unit'),
+        ('buy_x_get_y', 'Buy X get Y'),
+    )
+    
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    # Percent off for percentage rules and for the Y units of buy X get Y
+    # (100 gives them away); amount off each unit for fixed rules
+    value = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    buy_quantity = models.PositiveIntegerField(default=0)
+    get_quantity = models.PositiveIntegerField(default=0)
+    products = models.ManyToManyField(Product, blank=True, related_name='promotions')
+    categories = models.ManyToManyField(Category, blank=True, related_name='promotions')
+    starts_at = models.DateTimeField(null=True, blank=True)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    daily_start = models.TimeField(null=True, blank=True)
+    daily_end = models.TimeField(null=True, blank=True)
+    # Breaks ties between rules giving the same discount
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        errors = {}
+        if self.kind in ('percentage', 'buy_x_get_y') and self.value is not None and self.value > 100:
+            errors['value'] = 'A percentage cannot be over 100.'
+        if self.kind == 'buy_x_get_y' and not (self.buy_quantity and self.get_quantity):
+            errors['get_quantity'] = 'Buy X get Y rules need both quantities.'
+        if self.starts_at and self.ends_at and self.ends_at <= self.starts_at:
+            errors['ends_at'] = 'The end must be after the start.'
+        if (self.daily_start is None) != (self.daily_end is None):
+            errors['daily_end'] = 'Give both ends of the daily window or neither.'
+        if errors:
+            raise ValidationError(errors)
@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from .models import Promotion
+
+class PromotionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Promotion
+        fields = '__all__'
+        read_only_fields = ['created_at', 'updated_at']
+    
+    def validate(self, data):
+        # Run the model's checks on the promotion as it will be saved
+        attrs = {name: value for name, value in data.items() if name not in ('products', 'categories')}
+        if self.instance is not None:
+            attrs = {
+                **{field.attname: getattr(self.instance, field.attname) for field in Promotion._meta.concrete_fields},
+                **attrs,
+            }
+        promotion = Promotion(**attrs)
+        try:
+            promotion.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.message_dict)
+        return data
+
+class QuoteLineSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(source='product.id')
+    product_name = serializers.CharField(source='product.name')
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    promotion_id = serializers.IntegerField(allow_null=True)
+    promotion_name = serializers.CharField(allow_null=True)
+
+class QuoteSerializer(serializers.Serializer):
+    items = QuoteLineSerializer(source='lines', many=True)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    promotion_discount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    manual_discount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tax_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    final_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
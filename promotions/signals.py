@@ -0,0 +1,19 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Promotion
+
+
+@receiver(m2m_changed, sender=Promotion.products.through)
+@receiver(m2m_changed, sender=Promotion.categories.through)
+def touch_promotion(sender, instance, action, reverse, pk_set, **kwargs):
+    # Moves the rules version, which only looks at updated_at, when the
+    # products or categories a rule covers change
+    if not action.startswith('post_'):
+        return
+    promotions = Promotion.objects.filter(pk__in=pk_set or ()) if reverse else Promotion.objects.filter(pk=instance.pk)
+    if reverse and action == 'post_clear':
+        # The cleared ids are gone by now; touch every rule
+        promotions = Promotion.objects.all()
+    promotions.update(updated_at=timezone.now())
@@ -0,0 +1,189 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from inventory_backend.testing import Endpoint, QueryBudgetMixin
+from pos.models import SaleItem
+from products.models import Category, Product, StockTransaction
+from products.stock import default_location
+from . import engine
+from .engine import active_rules, compile_rules, price_lines
+from .models import Promotion
+
+
+class PromotionQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('promotion-list', 'promotion-list', budget=4),
+        Endpoint('promotion-detail', 'promotion-detail', budget=3,
+                 kwargs=lambda case: {'pk': case.first_id(Promotion)}),
+        Endpoint('promotion-quote', 'promotion-quote', budget=6, method='POST',
+                 data=lambda case: {'items': [{'product_id': case.first_id(Product), 'quantity': 3}]}),
+    ]
+
+    def seed(self, count):
+        super().seed(count)
+        products = Product.objects.order_by('-id')[:count]
+        for index, product in enumerate(products):
+            promotion = Promotion.objects.create(name=f'Rule {self.seeded}-{index}', kind='percentage', value=10)
+            promotion.products.add(product)
+            promotion.categories.add(product.category_id)
+
+
+class EngineTests(TestCase):
+    def setUp(self):
+        self.drinks = Category.objects.create(name='Drinks')
+        self.snacks = Category.objects.create(name='Snacks')
+        self.cola = Product.objects.create(name='Cola', sku='COLA-1', price=Decimal('2.00'),
+                                           cost_price='1.00', category=self.drinks)
+        self.water = Product.objects.create(name='Water', sku='WATER-1', price=Decimal('1.00'),
+                                            cost_price='0.50', category=self.drinks)
+        self.chips = Product.objects.create(name='Chips', sku='CHIPS-1', price=Decimal('3.00'),
+                                            cost_price='1.00', category=self.snacks)
+
+    def rule(self, products=(), categories=(), **fields):
+        promotion = Promotion.objects.create(name=fields.pop('name', 'Rule'), **fields)
+        promotion.products.set(products)
+        promotion.categories.set(categories)
+        return promotion
+
+    def price(self, *lines, now=None):
+        return price_lines(list(lines), now=now)
+
+    def test_percentage_fixed_and_buy_x_get_y(self):
+        self.rule([self.cola], kind='percentage', value=25)
+        self.rule([self.chips], kind='fixed', value='0.50')
+        self.rule([self.water], kind='buy_x_get_y', value=100, buy_quantity=2, get_quantity=1)
+        cola, chips, water = self.price((self.cola, 3), (self.chips, 2), (self.water, 7))
+        self.assertEqual(cola.discount_amount, Decimal('1.50'))
+        self.assertEqual(chips.discount_amount, Decimal('1.00'))
+        # Two free bottles out of seven
+        self.assertEqual(water.discount_amount, Decimal('2.00'))
+
+    def test_fixed_discount_never_exceeds_the_price(self):
+        self.rule([self.water], kind='fixed', value='5.00')
+        self.assertEqual(self.price((self.water, 2))[0].discount_amount, Decimal('2.00'))
+
+    def test_category_and_storewide_rules(self):
+        self.rule(categories=[self.drinks], kind='percentage', value=10)
+        self.rule(kind='fixed', value='0.05')
+        cola, chips = self.price((self.cola, 1), (self.chips, 1))
+        self.assertEqual(cola.discount_amount, Decimal('0.20'))
+        self.assertEqual(chips.discount_amount, Decimal('0.05'))
+
+    def test_best_rule_wins_and_ties_go_to_priority(self):
+        low = self.rule([self.cola], name='Low', kind='percentage', value=10, priority=5)
+        self.rule([self.cola], name='High', kind='percentage', value=20)
+        line = self.price((self.cola, 1))[0]
+        self.assertEqual((line.discount_amount, line.promotion_name), (Decimal('0.40'), 'High'))
+        # 0.40 off the same line either way: the higher priority takes it
+        self.rule([self.cola], name='Flat', kind='fixed', value='0.40', priority=9)
+        self.assertEqual(self.price((self.cola, 1))[0].promotion_name, 'Flat')
+        self.assertNotEqual(self.price((self.cola, 1))[0].promotion_id, low.id)
+
+    def test_time_windows(self):
+        now = timezone.now()
+        self.rule([self.cola], kind='percentage', value=10, starts_at=now + timedelta(hours=1))
+        self.rule([self.chips], kind='percentage', value=10, ends_at=now - timedelta(hours=1))
+        cola, chips = self.price((self.cola, 1), (self.chips, 1), now=now)
+        self.assertEqual((cola.discount_amount, chips.discount_amount), (Decimal('0.00'), Decimal('0.00')))
+        self.assertEqual(self.price((self.cola, 1), now=now + timedelta(hours=2))[0].discount_amount,
+                         Decimal('0.20'))
+
+    def test_daily_window_wraps_past_midnight(self):
+        self.rule([self.cola], kind='percentage', value=50, daily_start=time(22), daily_end=time(2))
+        day = timezone.localtime().date()
+
+        def at(hour):
+            moment = timezone.make_aware(datetime.combine(day, time(hour)))
+            return self.price((self.cola, 1), now=moment)[0].discount_amount
+
+        self.assertEqual([at(21), at(23), at(1), at(12)],
+                         [Decimal('0.00'), Decimal('1.00'), Decimal('1.00'), Decimal('0.00')])
+
+    def test_compiled_rules_price_without_queries(self):
+        for index in range(20):
+            self.rule([self.cola, self.water], name=f'Rule {index}', kind='percentage', value=index)
+        rules = compile_rules()
+        with CaptureQueriesContext(connection) as captured:
+            line = price_lines([(self.cola, 1), (self.chips, 1)], rules=rules)[0]
+        self.assertEqual(len(captured), 0)
+        self.assertEqual(line.promotion_name, 'Rule 19')
+
+    def test_rules_recompile_when_a_rule_changes(self):
+        promotion = self.rule([self.cola], kind='percentage', value=10)
+        first = active_rules()
+        self.assertIs(active_rules(), first)
+        promotion.products.add(self.chips)
+        self.assertIsNot(active_rules(), first)
+        self.assertEqual(self.price((self.chips, 1))[0].discount_amount, Decimal('0.30'))
+        promotion.is_active = False
+        promotion.save()
+        self.assertEqual(self.price((self.chips, 1))[0].discount_amount, Decimal('0.00'))
+
+    def test_prune_keeps_only_rules_that_can_win(self):
+        rules = [
+            engine.Rule(id, f'Rule {id}', 'percentage', Decimal(value), Decimal(value) / 100,
+                        0, 0, None, None, None, None, priority)
+            for id, value, priority in ((1, 20, 0), (2, 10, 0), (3, 5, 3), (4, 20, 0))
+        ]
+        self.assertEqual([rule.id for rule in engine.prune(rules)], [1, 3])
+
+
+class CheckoutPromotionTests(APITestCase):
+    def setUp(self):
+        self.worker = CustomUser.objects.create_user('till')
+        self.client.force_authenticate(self.worker)
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='2.00', cost_price='1.00')
+        StockTransaction.objects.create(
+            product=self.product, location=default_location(), transaction_type='purchase', quantity=20,
+        )
+        self.promotion = Promotion.objects.create(name='Cola deal', kind='buy_x_get_y', value=100,
+                                                  buy_quantity=1, get_quantity=1)
+        self.promotion.products.add(self.product)
+
+    def cart(self, quantity=4, **extra):
+        return {'items': [{'product_id': self.product.id, 'quantity': quantity}], **extra}
+
+    def test_checkout_records_the_quoted_discount(self):
+        quote = self.client.post(reverse('promotion-quote'), self.cart(tax_amount='0.40'), format='json')
+        self.assertEqual(quote.status_code, 200)
+        self.assertEqual(quote.data['promotion_discount'], '4.00')
+        self.assertEqual(quote.data['items'][0]['promotion_name'], 'Cola deal')
+
+        sale = self.client.post(reverse('sale-create-sale'), self.cart(tax_amount='0.40'), format='json')
+        self.assertEqual(sale.status_code, 201)
+        self.assertEqual(
+            (sale.data['total_amount'], sale.data['discount_amount'], sale.data['final_amount']),
+            ('8.00', quote.data['discount_amount'], quote.data['final_amount']),
+        )
+        item = SaleItem.objects.get()
+        self.assertEqual((item.discount_amount, item.promotion), (Decimal('4.00'), self.promotion))
+
+    def test_manual_discounts_are_admin_only(self):
+        response = self.client.post(reverse('sale-create-sale'), self.cart(discount_amount='1.00'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('discount_amount', response.data)
+
+        self.client.force_authenticate(CustomUser.objects.create_user('manager', user_type='admin'))
+        response = self.client.post(reverse('sale-create-sale'), self.cart(discount_amount='1.00'), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['discount_amount'], '5.00')
+
+    def test_rules_are_admin_only_to_change(self):
+        data = {'name': 'Everything', 'kind': 'percentage', 'value': '150'}
+        self.assertEqual(self.client.post(reverse('promotion-list'), data, format='json').status_code, 403)
+        self.assertEqual(self.client.get(reverse('promotion-list')).status_code, 200)
+
+        self.client.force_authenticate(CustomUser.objects.create_user('manager', user_type='admin'))
+        response = self.client.post(reverse('promotion-list'), data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('value', response.data)
+        data['value'] = '10'
+        self.assertEqual(self.client.post(reverse('promotion-list'), data, format='json').status_code, 201)
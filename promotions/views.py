@@ -0,0 +1,29 @@
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from accounts.permissions import IsAdminOrReadOnly
+from pos.serializers import CreateSaleSerializer
+from products.models import Product
+from .engine import Quote
+from .models import Promotion
+from .serializers import PromotionSerializer, QuoteSerializer
+
+class PromotionViewSet(viewsets.ModelViewSet):
+    queryset = Promotion.objects.prefetch_related('products', 'categories').order_by('id')
+    serializer_class = PromotionSerializer
+    permission_classes = [IsAdminOrReadOnly]
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def quote(self, request):
+        """Price a cart the way checkout will, without selling it."""
+        serializer = CreateSaleSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+        products = Product.objects.in_bulk([item['product_id'] for item in items])
+        quote = Quote(
+            [(products[item['product_id']], item['quantity']) for item in items],
+            tax_amount=serializer.validated_data['tax_amount'],
+            manual_discount=serializer.validated_data['discount_amount'],
+        )
+        return Response(QuoteSerializer(quote).data, status=status.HTTP_200_OK)
@@ -1,6 +1,23 @@
+import importlib
+
 from django.apps import AppConfig
+from django.conf import settings
+
+# Imported on first use by the report views; slow to import and large in memory
+HEAVY_MODULES = ('pandas', 'openpyxl')
+
+
+def preload():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
 
 
 class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
+
+    def ready(self):
+        # Workers dedicated to reports can pay the import cost at boot instead
+        # of on their first export
+        if getattr(settings, 'PRELOAD_REPORT_LIBS', False):
+            preload()
@@ -1,3 +1,122 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
 
-# Create your tests here.
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from archive.archiver import HistoryArchiver
+from inventory_backend.dates import day_start
+from inventory_backend.testing import Endpoint, QueryBudgetMixin
+from products.models import Product, StockTransaction
+from .apps import HEAVY_MODULES
+
+
+def product_id(case):
+    return {'product_id': case.first_id(Product)}
+
+
+class ReportQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    endpoints = [
+        Endpoint('report-products', 'product_reports', budget=4),
+        Endpoint('report-products-window', 'product_reports', budget=4, query=lambda case: case.window()),
+        Endpoint('report-single-product', 'single_product_report', budget=6, kwargs=product_id),
+        Endpoint('report-single-product-window', 'single_product_report', budget=7,
+                 kwargs=product_id, query=lambda case: case.window()),
+        Endpoint('download-product', 'download_report', budget=6,
+                 kwargs={'report_type': 'product'}, query=product_id),
+        Endpoint('download-all-products', 'download_report', budget=4, kwargs={'report_type': 'product'}),
+        Endpoint('download-sales-window', 'download_report', budget=3,
+                 kwargs={'report_type': 'sales'}, query=lambda case: case.window()),
+        Endpoint('download-inventory', 'download_report', budget=1, kwargs={'report_type': 'inventory'}),
+    ]
+
+    def seed(self, count):
+        super().seed(count)
+        # Archive the older half of the history so the reports read both tiers
+        HistoryArchiver(day_start(timezone.localdate() - timedelta(days=3))).run()
+
+
+class ProductLedgerReportTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('manager', user_type='admin')
+        self.client.force_authenticate(self.user)
+        self.product = Product.objects.create(name='Cola', sku='COLA-1', price='2.50', cost_price='1.00')
+        for index in range(25):
+            StockTransaction.objects.create(
+                product=self.product, transaction_type='purchase' if index % 2 else 'sale', quantity=1,
+                unit_price=Decimal('1.00'), created_by=self.user,
+            )
+        self.url = reverse('single_product_report', kwargs={'product_id': self.product.id})
+
+    def test_pages_walk_the_whole_ledger_newest_first(self):
+        seen, url, query = [], self.url, {'page_size': 10}
+        while url:
+            # Every page costs the same, however deep
+            with self.assertNumQueries(4):
+                response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 200)
+            seen += response.data['transactions']
+            url, query = response.data['next'], None
+        self.assertEqual(len(seen), 25)
+        dates = [row['date'] for row in seen]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+        self.assertEqual(response.data['summary'], {
+            'total_purchased': 12, 'total_sold': 13, 'total_returned': 0, 'net_movement': -1,
+            'transaction_count': 25, 'opening_stock': 0,
+        })
+
+    def test_window_opens_at_the_stock_before_it(self):
+        older = list(self.product.transactions.order_by('id')[:10])
+        StockTransaction.objects.filter(id__in=[row.id for row in older]).update(
+            created_at=timezone.now() - timedelta(days=10),
+        )
+        start = (timezone.localdate() - timedelta(days=5)).isoformat()
+        summary = self.client.get(self.url, {'start_date': start}).data['summary']
+        self.assertEqual(summary['opening_stock'], older[-1].new_stock)
+        latest = self.product.transactions.latest('id')
+        self.assertEqual(summary['opening_stock'] + summary['net_movement'], latest.new_stock)
+
+    def test_window_outside_the_ledger_is_empty(self):
+        response = self.client.get(self.url, {'start_date': '2000-01-01', 'end_date': '2000-01-02'})
+        self.assertEqual(response.data['transactions'], [])
+        self.assertEqual(response.data['summary']['transaction_count'], 0)
+        self.assertIsNone(response.data['next'])
+
+    def test_unknown_product_and_bad_cursor_are_not_found(self):
+        missing = reverse('single_product_report', kwargs={'product_id': self.product.id + 1})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'zzz'}).status_code, 404)
+
+    def test_download_streams_summary_and_every_row(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(
+            reverse('download_report', kwargs={'report_type': 'product'}), {'product_id': self.product.id},
+        )
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Summary', 'Transactions'])
+        self.assertEqual(workbook['Transactions'].max_row, 26)
+        self.assertIn(('Total Sold', 13), list(workbook['Summary'].values))
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_startup_does_not_import_report_libraries(self):
+        code = (
+            'import sys, django; django.setup(); import inventory_backend.urls; '
+            f'print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))'
+        )
+        completed = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'inventory_backend.settings', 'PRELOAD_REPORT_LIBS': '0'},
+        )
+        self.assertEqual(completed.stdout.strip(), '')
@@ -1,16 +1,120 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.http import HttpResponse
-from django.db.models import Sum, Count, F, DecimalField
-from django.db.models.functions import TruncDate
-from datetime import datetime, timedelta
-import pandas as pd
+from django.http import HttpResponse, FileResponse
+from django.shortcuts import get_object_or_404
+from django.db.models import Sum, Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from io import BytesIO
+import heapq
+import tempfile
+from itertools import chain
 from products.models import Product, StockTransaction
-from pos.models import Sale, SaleItem
+from pos.models import Sale
+from archive.history import archive_horizon, reaches_archive, rollup_totals
+from archive.models import ArchivedSale
+from inventory_backend.dates import date_window, filter_by_date_window
+from inventory_backend.routers import ReplicaReadMixin
+from .pagination import LedgerCursorPagination
 
-class ProductReportView(APIView):
+LEDGER_VALUES = (
+    'id', 'created_at', 'transaction_type', 'quantity', 'unit_price', 'total_amount',
+    'previous_stock', 'new_stock', 'created_by__username', 'notes',
+)
+
+LEDGER_COLUMNS = (
+    'date', 'type', 'quantity', 'unit_price', 'total_amount',
+    'previous_stock', 'new_stock', 'created_by', 'notes',
+)
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def ledger_summary(transactions):
+    """Movement totals for a set of stock transactions, in a single aggregate query."""
+    totals = transactions.aggregate(
+        total_purchased=Sum('quantity', filter=Q(transaction_type='purchase'), default=0),
+        total_sold=Sum('quantity', filter=Q(transaction_type='sale'), default=0),
+        total_returned=Sum('quantity', filter=Q(transaction_type='return'), default=0),
+        transaction_count=Count('id'),
+    )
+    return {
+        'total_purchased': totals['total_purchased'],
+        'total_sold': totals['total_sold'],
+        'total_returned': totals['total_returned'],
+        'net_movement': totals['total_purchased'] - totals['total_sold'] + totals['total_returned'],
+        'transaction_count': totals['transaction_count'],
+    }
+
+
+def add_archived(summary, archived):
+    """Add a product's ``rollup_totals()`` row to its ``ledger_summary()``."""
+    if archived:
+        for key in ('total_purchased', 'total_sold', 'total_returned', 'transaction_count'):
+            summary[key] += archived[key]
+        summary['net_movement'] = summary['total_purchased'] - summary['total_sold'] + summary['total_returned']
+    return summary
+
+
+def opening_stock(product, start, horizon):
+    """
+    A product's stock over all locations just before ``start``. Each location
+    counts the newest ledger row before ``start``, or failing that its newest
+    archive checkpoint, so only windows reaching the archive read archived rows.
+    """
+    if start is None:
+        return 0
+    
+    def newest(rows):
+        return Subquery(
+            rows.filter(location=OuterRef('location'), created_at__lt=start)
+            .order_by('-created_at', '-id').values('new_stock')[:1]
+        )
+    
+    sources = [newest(product.transactions.all())]
+    if reaches_archive(start, horizon):
+        sources.append(newest(product.archived_transactions.all()))
+    sources.append(Subquery(
+        product.stock_checkpoints.filter(location=OuterRef('location'), as_of__lte=start)
+        .order_by('-as_of').values('stock')[:1]
+    ))
+    return product.location_stocks.aggregate(total=Sum(Coalesce(*sources, Value(0)), default=0))['total']
+
+
+def product_ledger(product, request):
+    """
+    The querysets holding a product's ledger rows in the request's date
+    window, hot rows first, and the summary over all of them. Archived rows
+    are only read when the window reaches the archive horizon.
+    """
+    start, end = date_window(request)
+    horizon = archive_horizon()
+    transactions = filter_by_date_window(product.transactions.all(), request)
+    sources = [transactions]
+    summary = ledger_summary(transactions)
+    if reaches_archive(start, horizon):
+        sources.append(filter_by_date_window(product.archived_transactions.all(), request))
+        add_archived(summary, rollup_totals(start, end, product_id=product.id).get(product.id))
+    summary['opening_stock'] = opening_stock(product, start, horizon)
+    return sources, summary
+
+
+def ledger_row(row):
+    """Shape a ``LEDGER_VALUES`` row the way the product report exposes it."""
+    return {
+        'date': row['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+        'type': row['transaction_type'],
+        'quantity': row['quantity'],
+        'unit_price': str(row['unit_price']) if row['unit_price'] else None,
+        'total_amount': str(row['total_amount']) if row['total_amount'] else None,
+        'previous_stock': row['previous_stock'],
+        'new_stock': row['new_stock'],
+        'created_by': row['created_by__username'] or 'System',
+        'notes': row['notes'],
+    }
+
+
+class ProductReportView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, product_id=None):
@@ -22,12 +126,13 @@ class ProductReportView(APIView):
             return self.get_all_products_report(request)
     
     def get_single_product_report(self, request, product_id):
-        product = Product.objects.get(id=product_id)
-        transactions = StockTransaction.objects.filter(product=product).select_related('created_by')
+        product = get_object_or_404(Product, id=product_id)
+        sources, summary = product_ledger(product, request)
         
-        # Calculate summary
-        total_purchased = transactions.filter(transaction_type='purchase').aggregate(Sum('quantity'))['quantity__sum'] or 0
-        total_sold = transactions.filter(transaction_type='sale').aggregate(Sum('quantity'))['quantity__sum'] or 0
+        paginator = LedgerCursorPagination()
+        page = paginator.paginate_querysets(
+            [source.values(*LEDGER_VALUES) for source in sources], request, view=self
+        )
         
         data = {
             'product': {
@@ -37,44 +142,40 @@ class ProductReportView(APIView):
                 'current_stock': product.current_stock,
                 'price': str(product.price),
             },
-            'summary': {
-                'total_purchased': total_purchased,
-                'total_sold': total_sold,
-                'net_movement': total_purchased - total_sold,
-            },
-            'transactions': [
-                {
-                    'date': transaction.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    'type': transaction.transaction_type,
-                    'quantity': transaction.quantity,
-                    'unit_price': str(transaction.unit_price) if transaction.unit_price else None,
-                    'total_amount': str(transaction.total_amount) if transaction.total_amount else None,
-                    'previous_stock': transaction.previous_stock,
-                    'new_stock': transaction.new_stock,
-                    'created_by': transaction.created_by.username if transaction.created_by else 'System',
-                    'notes': transaction.notes,
-                }
-                for transaction in transactions.order_by('-created_at')
-            ]
+            'summary': summary,
+            'transactions': [ledger_row(row) for row in page],
+            'next': paginator.get_next_link(),
         }
         
         return Response(data)
     
     def get_all_products_report(self, request):
-        products = Product.objects.filter(is_active=True)
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
+        products = Product.objects.filter(is_active=True).select_related('category')
         
         # Filter transactions by date if provided
-        transactions = StockTransaction.objects.all()
-        if start_date and end_date:
-            transactions = transactions.filter(created_at__date__range=[start_date, end_date])
+        start, end = date_window(request)
+        transactions = filter_by_date_window(StockTransaction.objects.all(), request)
+        
+        # One grouped aggregate for every product instead of two per product
+        movements = {
+            row['product_id']: row
+            for row in transactions.filter(transaction_type__in=('purchase', 'sale', 'return'))
+            .values('product_id')
+            .annotate(
+                total_purchased=Sum('quantity', filter=Q(transaction_type='purchase'), default=0),
+                total_sold=Sum('quantity', filter=Q(transaction_type='sale'), default=0),
+                total_returned=Sum('quantity', filter=Q(transaction_type='return'), default=0),
+            )
+        }
+        archived = rollup_totals(start, end) if reaches_archive(start, archive_horizon()) else {}
         
         product_data = []
         for product in products:
-            product_transactions = transactions.filter(product=product)
-            total_purchased = product_transactions.filter(transaction_type='purchase').aggregate(Sum('quantity'))['quantity__sum'] or 0
-            total_sold = product_transactions.filter(transaction_type='sale').aggregate(Sum('quantity'))['quantity__sum'] or 0
+            movement = movements.get(product.id, {})
+            archived_movement = archived.get(product.id, {})
+            total_purchased = movement.get('total_purchased', 0) + archived_movement.get('total_purchased', 0)
+            total_sold = movement.get('total_sold', 0) + archived_movement.get('total_sold', 0)
+            total_returned = movement.get('total_returned', 0) + archived_movement.get('total_returned', 0)
             
             product_data.append({
                 'id': product.id,
@@ -85,12 +186,13 @@ class ProductReportView(APIView):
                 'price': str(product.price),
                 'total_purchased': total_purchased,
                 'total_sold': total_sold,
-                'net_movement': total_purchased - total_sold,
+                'total_returned': total_returned,
+                'net_movement': total_purchased - total_sold + total_returned,
             })
         
         return Response({'products': product_data})
 
-class DownloadReportView(APIView):
+class DownloadReportView(ReplicaReadMixin, APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request, report_type):
@@ -107,40 +209,48 @@ class DownloadReportView(APIView):
         product_id = request.GET.get('product_id')
         
         if product_id:
-            # Single product report
-            view = ProductReportView()
-            response = view.get_single_product_report(request, product_id)
-            data = response.data
+            # Single product report, written row by row so large ledgers are
+            # never held in memory
+            product = get_object_or_404(Product, id=product_id)
+            sources, summary = product_ledger(product, request)
             
-            # Create Excel file
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                # Summary sheet
-                summary_data = {
-                    'Metric': ['Product Name', 'SKU', 'Current Stock', 'Total Purchased', 'Total Sold', 'Net Movement'],
-                    'Value': [
-                        data['product']['name'],
-                        data['product']['sku'],
-                        data['product']['current_stock'],
-                        data['summary']['total_purchased'],
-                        data['summary']['total_sold'],
-                        data['summary']['net_movement']
-                    ]
-                }
-                pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-                
-                # Transactions sheet
-                transactions_df = pd.DataFrame(data['transactions'])
-                if not transactions_df.empty:
-                    transactions_df.to_excel(writer, sheet_name='Transactions', index=False)
+            from openpyxl import Workbook
+            
+            workbook = Workbook(write_only=True)
+            summary_sheet = workbook.create_sheet('Summary')
+            summary_sheet.append(['Metric', 'Value'])
+            summary_sheet.append(['Product Name', product.name])
+            summary_sheet.append(['SKU', product.sku])
+            summary_sheet.append(['Current Stock', product.current_stock])
+            summary_sheet.append(['Opening Stock', summary['opening_stock']])
+            summary_sheet.append(['Total Purchased', summary['total_purchased']])
+            summary_sheet.append(['Total Sold', summary['total_sold']])
+            summary_sheet.append(['Total Returned', summary['total_returned']])
+            summary_sheet.append(['Net Movement', summary['net_movement']])
             
+            if summary['transaction_count']:
+                transactions_sheet = workbook.create_sheet('Transactions')
+                transactions_sheet.append(LEDGER_COLUMNS)
+                rows = heapq.merge(
+                    *(
+                        source.order_by('-created_at', '-id').values(*LEDGER_VALUES).iterator(chunk_size=2000)
+                        for source in sources
+                    ),
+                    key=LedgerCursorPagination.position,
+                    reverse=True,
+                )
+                for row in rows:
+                    transactions_sheet.append(list(ledger_row(row).values()))
+            
+            output = tempfile.TemporaryFile()
+            workbook.save(output)
             output.seek(0)
-            response = HttpResponse(
-                output.getvalue(),
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            return FileResponse(
+                output,
+                as_attachment=True,
+                filename=f'product_report_{product_id}.xlsx',
+                content_type=XLSX_CONTENT_TYPE,
             )
-            response['Content-Disposition'] = f'attachment; filename="product_report_{product_id}.xlsx"'
-            return response
         
         else:
             # All products report
@@ -148,6 +258,8 @@ class DownloadReportView(APIView):
             response = view.get_all_products_report(request)
             data = response.data
             
+            import pandas as pd
+            
             df = pd.DataFrame(data['products'])
             output = BytesIO()
             df.to_excel(output, index=False, engine='openpyxl')
@@ -161,15 +273,17 @@ class DownloadReportView(APIView):
             return response
     
     def download_sales_report(self, request):
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        
-        sales = Sale.objects.all()
-        if start_date and end_date:
-            sales = sales.filter(created_at__date__range=[start_date, end_date])
+        start, _ = date_window(request)
+        sources = [Sale.objects.all()]
+        if reaches_archive(start, archive_horizon()):
+            sources.append(ArchivedSale.objects.all())
+        sales = chain.from_iterable(
+            filter_by_date_window(source, request).select_related('cashier').annotate(item_count=Count('items'))
+            for source in sources
+        )
         
         sales_data = []
-        for sale in sales.prefetch_related('items'):
+        for sale in sales:
             sales_data.append({
                 'Sale Number': sale.sale_number,
                 'Date': sale.created_at.strftime('%Y-%m-%d %H:%M:%S'),
@@ -177,10 +291,14 @@ class DownloadReportView(APIView):
                 'Tax Amount': float(sale.tax_amount),
                 'Discount Amount': float(sale.discount_amount),
                 'Final Amount': float(sale.final_amount),
+                'Refunded Amount': float(sale.refunded_amount),
+                'Status': sale.status,
                 'Cashier': sale.cashier.username if sale.cashier else 'N/A',
-                'Number of Items': sale.items.count(),
+                'Number of Items': sale.item_count,
             })
         
+        import pandas as pd
+        
         df = pd.DataFrame(sales_data)
         output = BytesIO()
         df.to_excel(output, index=False, engine='openpyxl')
@@ -210,6 +328,8 @@ class DownloadReportView(APIView):
                 'Last Updated': product.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
             })
         
+        import pandas as pd
+        
         df = pd.DataFrame(inventory_data)
         output = BytesIO()
         df.to_excel(output, index=False, engine='openpyxl')